@@ -1,10 +1,49 @@
+from django import forms
 from django.contrib import admin
-from .models import MedicalQA
+from django.utils.text import smart_split, unescape_string_literal
+from .answer_store import search_answers
+from .models import MedicalQA, PinnedAnswer
+
+class MedicalQAForm(forms.ModelForm):
+    """答案按内容存放在答案表中，表单上仍以文本框编辑答案正文"""
+    answer = forms.CharField(label='答案', widget=forms.Textarea)
+
+    class Meta:
+        model = MedicalQA
+        exclude = ['answer_ref', 'tokens']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['answer'].initial = self.instance.answer
+
+    def save(self, commit=True):
+        self.instance.answer = self.cleaned_data['answer']
+        return super().save(commit)
 
 @admin.register(MedicalQA)
 class MedicalQAAdmin(admin.ModelAdmin):
+    form = MedicalQAForm
     list_display = ['id','title', 'question', 'answer', 'keywords', 'department', 'created_at']
+    list_select_related = ['answer_ref']
     list_filter = ['department', 'created_at']
-    search_fields = ['title', 'question', 'answer', 'keywords']
+    search_fields = ['title', 'question', 'keywords']
     ordering = ['-created_at']
     readonly_fields = ['keywords']
+
+    def get_search_results(self, request, queryset, search_term):
+        """除 search_fields 外还按答案正文搜索，答案正文包含全部搜索词的问答也算命中"""
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        terms = [unescape_string_literal(bit) if bit[:1] in ('"', "'") and bit[-1:] == bit[:1] else bit
+                 for bit in smart_split(search_term)]
+        if terms:
+            results |= queryset.filter(answer_ref_id__in=search_answers(terms))
+        return results, may_have_duplicates
+
+@admin.register(PinnedAnswer)
+class PinnedAnswerAdmin(admin.ModelAdmin):
+    list_display = ['id', 'question', 'qa', 'hits', 'updated_at']
+    list_select_related = ['qa']
+    search_fields = ['key', 'question', 'qa__question']
+    raw_id_fields = ['qa']
+    ordering = ['-hits']
@@ -0,0 +1,189 @@
+import json
+import threading
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from .search_index import snapshot_version, write_snapshot
+
+
+def _normalize_rows(vectors):
+    """按行做L2归一化，零向量保持不变"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LsaIvfIndex:
+    """LSA稠密向量上的IVF近似最近邻索引
+
+    先用截断SVD把TF-IDF空间降到 n_components 维，再用k-means把向量划分到
+    n_lists 个倒排桶。查询时只扫描与查询最接近的 n_probe 个桶，n_probe 越大
+    召回越高、延迟越大。
+
+    快照保存在单独的 ANN_INDEX_DIR，带有拟合时的行id和词表摘要：TF-IDF快照增量合并后
+    行号会变，词表不变，ANN快照仍可使用；TF-IDF快照重新构建、词表变化后需要重新构建。
+    """
+
+    COMPONENTS_FILE = 'components.npy'
+    CENTROIDS_FILE = 'centroids.npy'
+    EMBEDDINGS_FILE = 'embeddings.npy'
+    LIST_OFFSETS_FILE = 'list_offsets.npy'
+    LIST_ROWS_FILE = 'list_rows.npy'
+    ROW_IDS_FILE = 'row_ids.npy'
+    META_FILE = 'meta.json'
+
+    def __init__(self, components, centroids, embeddings, list_offsets, list_rows, row_ids,
+                 vocabulary_digest=None):
+        # SVD投影矩阵 (n_components, n_terms)
+        self.components = components
+        # 桶中心 (n_lists, n_components)
+        self.centroids = centroids
+        # 按桶顺序重排后的归一化向量 (n_rows, n_components)
+        self.embeddings = embeddings
+        # 第 i 个桶对应 list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.list_offsets = list_offsets
+        # 桶内位置 -> TF-IDF矩阵中的行号
+        self.list_rows = list_rows
+        # 行号 -> MedicalQA的id
+        self.row_ids = row_ids
+        # 拟合时TF-IDF快照的词表摘要
+        self.vocabulary_digest = vocabulary_digest
+        # 最近一次 missing_ids 的参数和结果
+        self._missing = (None, None)
+
+    @classmethod
+    def fit(cls, tfidf_index, n_components=128, n_lists=None, random_state=42):
+        """在TF-IDF索引快照上拟合LSA降维和IVF划分"""
+        matrix = tfidf_index.matrix
+        n_rows, n_terms = matrix.shape
+        n_components = max(1, min(n_components, n_terms - 1, n_rows - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+        embeddings = _normalize_rows(svd.fit_transform(matrix)).astype(np.float32)
+
+        # 默认桶数取 sqrt(N)，保证每个桶的大小与桶数相当
+        if n_lists is None:
+            n_lists = int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=random_state,
+                                 batch_size=4096, n_init=3)
+        assignments = kmeans.fit_predict(embeddings)
+        centroids = _normalize_rows(kmeans.cluster_centers_).astype(np.float32)
+
+        list_rows = np.argsort(assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(svd.components_.astype(np.float32), centroids, embeddings[list_rows],
+                   list_offsets, list_rows, np.asarray(tfidf_index.row_ids),
+                   vocabulary_digest=tfidf_index.vocabulary_digest)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def embed(self, query_vec):
+        """把TF-IDF查询向量投影到LSA空间"""
+        embedding = np.asarray(query_vec @ self.components.T, dtype=np.float32)
+        return _normalize_rows(embedding)[0]
+
+    def search_vector(self, query_vec, top_k=5, n_probe=8):
+        """在最接近的 n_probe 个桶内检索，返回 TF-IDF 行号及相似度"""
+        embedding = self.embed(query_vec)
+        if not embedding.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        n_probe = max(1, min(n_probe, self.n_lists))
+        centroid_scores = self.centroids @ embedding
+        probe_lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        positions = np.concatenate([
+            np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in probe_lists
+        ])
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.embeddings[positions] @ embedding
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return self.list_rows[positions[top]], scores[top]
+
+    def search(self, query_vec, top_k=5, n_probe=8):
+        """返回最相似的 top_k 个问答id及相似度"""
+        rows, scores = self.search_vector(query_vec, top_k=top_k, n_probe=n_probe)
+        return self.row_ids[rows].tolist(), scores
+
+    def missing_ids(self, row_ids):
+        """row_ids 中不在ANN快照里的问答id（快照构建之后合并进主索引的记录）"""
+        cached_for, missing = self._missing
+        if cached_for is not row_ids:
+            missing = np.setdiff1d(row_ids, self.row_ids)
+            self._missing = (row_ids, missing)
+        return missing
+
+    def save(self, path):
+        """保存快照：先写入临时目录，再整体替换旧目录"""
+        write_snapshot(path, self._write)
+
+    def _write(self, path):
+        np.save(path / self.COMPONENTS_FILE, self.components)
+        np.save(path / self.CENTROIDS_FILE, self.centroids)
+        np.save(path / self.EMBEDDINGS_FILE, self.embeddings)
+        np.save(path / self.LIST_OFFSETS_FILE, self.list_offsets)
+        np.save(path / self.LIST_ROWS_FILE, self.list_rows)
+        np.save(path / self.ROW_IDS_FILE, self.row_ids)
+        with open(path / self.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'vocabulary_digest': self.vocabulary_digest}, f)
+
+    @classmethod
+    def load(cls, path):
+        """从磁盘加载，向量、桶内行号和行id以只读内存映射打开"""
+        path = Path(path)
+        with open(path / cls.META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(
+            np.load(path / cls.COMPONENTS_FILE),
+            np.load(path / cls.CENTROIDS_FILE),
+            np.load(path / cls.EMBEDDINGS_FILE, mmap_mode='r'),
+            np.load(path / cls.LIST_OFFSETS_FILE),
+            np.load(path / cls.LIST_ROWS_FILE, mmap_mode='r'),
+            np.load(path / cls.ROW_IDS_FILE, mmap_mode='r'),
+            vocabulary_digest=meta.get('vocabulary_digest'),
+        )
+
+
+# 进程级索引实例及其快照版本
+_ann_index = None
+_ann_version = None
+_ann_index_lock = threading.Lock()
+# 快照不存在或不匹配的提示只打印一次
+_missing_reported = False
+
+
+def get_ann_index(tfidf_index):
+    """获取与 tfidf_index 词表一致的近似最近邻索引快照
+
+    快照不存在或词表不一致时返回None，由调用方退回精确检索。快照被重新构建后自动重新加载。
+    拟合SVD和k-means很慢，只由 build_search_index --ann 构建，不在请求中现场拟合。
+    """
+    global _ann_index, _ann_version, _missing_reported
+    ann_dir = Path(settings.ANN_INDEX_DIR)
+    version = snapshot_version(ann_dir)
+    if version != _ann_version:
+        with _ann_index_lock:
+            if version != _ann_version:
+                try:
+                    _ann_index = LsaIvfIndex.load(ann_dir)
+                    print(f"已加载ANN索引快照，共 {_ann_index.n_lists} 个桶")
+                except FileNotFoundError:
+                    _ann_index = None
+                _ann_version = version
+                _missing_reported = False
+    if _ann_index is None or _ann_index.vocabulary_digest != tfidf_index.vocabulary_digest:
+        if not _missing_reported:
+            reason = '不存在' if _ann_index is None else '与当前TF-IDF快照的词表不一致'
+            print(f"ANN索引快照{reason}：{ann_dir}，使用精确检索，"
+                  f"请运行 python manage.py build_search_index --ann")
+            _missing_reported = True
+        return None
+    return _ann_index
@@ -0,0 +1,143 @@
+import base64
+import numpy as np
+from .lexicon import get_lexicon
+from .idf_table import keyword_idf
+from .nlp_cache import entity_tags, posseg
+
+# 词性标注颜色映射（按词性首字母）
+POS_COLORS = {
+    'n': '#ff6b6b',   # 名词-红色
+    'v': '#51cf66',   # 动词-绿色
+    'a': '#339af0',   # 形容词-蓝色
+    'd': '#ffd43b',   # 副词-黄色
+    'r': '#845ef7',   # 代词-紫色
+    'm': '#a8701a',   # 数词-棕色
+    'q': '#868e96',   # 量词-灰色
+    'p': '#a8701a',   # 介词-棕色
+    'c': '#868e96',   # 连词-灰色
+    'u': '#495057',   # 助词-深灰色
+    'w': '#212529'    # 标点-黑色
+}
+
+
+class Annotation:
+    """一次词性标注的结果
+
+    文本只用 jieba.posseg 切分一次（见 nlp_cache.posseg），词性渲染、实体识别、关键词提取和摘要
+    都复用这份结果，不再各自重新分词。
+    """
+
+    def __init__(self, text, pairs):
+        self.text = text
+        # (词, 词性) 列表
+        self.pairs = pairs
+        self._entities = None
+        # 标注实体时使用的词典，词典热更新后本次结果仍与类别、颜色对应
+        self._lexicon = None
+
+    @property
+    def words(self):
+        return [word for word, _ in self.pairs]
+
+    @property
+    def entities(self):
+        """与 pairs 一一对应的医疗实体类别，不是实体的为None"""
+        if self._entities is None:
+            self._lexicon = get_lexicon()
+            self._entities = entity_tags(self.words, self._lexicon)
+        return self._entities
+
+    def keywords(self, topK=10, allowPOS=()):
+        """TF-IDF关键词，计算方式与 jieba.analyse.extract_tags 相同，有语料IDF表时使用语料IDF"""
+        idf_freq, median_idf, stop_words = keyword_idf()
+        allowPOS = frozenset(allowPOS)
+        freq = {}
+        for word, flag in self.pairs:
+            if allowPOS and flag not in allowPOS:
+                continue
+            if len(word.strip()) < 2 or word.lower() in stop_words:
+                continue
+            freq[word] = freq.get(word, 0.0) + 1.0
+        total = sum(freq.values())
+        for word in freq:
+            freq[word] *= idf_freq.get(word, median_idf) / total
+        tags = sorted(freq, key=freq.__getitem__, reverse=True)
+        return tags[:topK] if topK else tags
+
+    def pos_html(self):
+        return ' '.join(f'<span style="color: {POS_COLORS.get(flag[0], "#212529")}" title="{flag}">{word}</span>'
+                        for word, flag in self.pairs)
+
+    def pos_plain(self):
+        return [f'{word}/{flag}' for word, flag in self.pairs]
+
+    def entity_html(self):
+        result = []
+        for (word, _), entity_type in zip(self.pairs, self.entities):
+            if entity_type:
+                color = self._lexicon.rules[entity_type]['color']
+                result.append(f'<span style="color: {color}" title="{entity_type}">{word}</span>')
+            else:
+                result.append(word)
+        return ' '.join(result)
+
+    def entity_plain(self):
+        return [f'{word}[{entity_type}]' if entity_type else word
+                for (word, _), entity_type in zip(self.pairs, self.entities)]
+
+    def compact(self):
+        """紧凑的标注结果，供接口返回和 Document.annotation 存储
+
+        lengths 为各词的字符数（累加即得每个词在原文中的偏移），tags 为各词的词性编号，
+        两者都是小端整数数组的base64编码，lengths 每个数占 length_width 字节，tags 占1字节；
+        entities 为 [词下标, 实体类型编号] 列表。编号对应的名称在 tag_names、entity_types 中，
+        带颜色的HTML由前端渲染（static/js/annotation.js）。
+        """
+        tag_ids = {}
+        tags = np.empty(len(self.pairs), dtype=np.uint8)
+        lengths = np.empty(len(self.pairs), dtype=np.uint32)
+        for i, (word, flag) in enumerate(self.pairs):
+            lengths[i] = len(word)
+            tags[i] = tag_ids.setdefault(flag, len(tag_ids))
+        longest = int(lengths.max()) if len(lengths) else 0
+        length_width = 1 if longest < 1 << 8 else 2 if longest < 1 << 16 else 4
+        lengths = lengths.astype(f'<u{length_width}')
+        entities = self.entities
+        type_ids = {name: i for i, name in enumerate(self._lexicon.rules)}
+        entities = [[i, type_ids[entity_type]] for i, entity_type in enumerate(entities) if entity_type]
+        return {
+            'lengths': base64.b64encode(lengths.tobytes()).decode('ascii'),
+            'length_width': length_width,
+            'tags': base64.b64encode(tags.tobytes()).decode('ascii'),
+            'tag_names': list(tag_ids),
+            'entities': entities,
+            'entity_types': list(type_ids),
+        }
+
+    def entity_spans(self):
+        """实体 -> 出现位置：(类别, 原文) -> 字符偏移列表"""
+        spans = {}
+        position = 0
+        for (word, _), entity_type in zip(self.pairs, self.entities):
+            if entity_type:
+                spans.setdefault((entity_type, word), []).append(position)
+            position += len(word)
+        return spans
+
+    @staticmethod
+    def summary(keywords):
+        """简单摘要：关键词组合"""
+        return '。'.join(keywords)
+
+
+def annotation_legend():
+    """前端渲染紧凑标注结果用的颜色表，每次响应只发送一次"""
+    return {
+        'pos_colors': POS_COLORS,
+        'entity_colors': get_lexicon().colors,
+    }
+
+
+def annotate(text):
+    """对文本做一次分词和词性标注，同一文本的结果从分词缓存中取"""
+    return Annotation(text, posseg(text))
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+def normalize_question(tokens, department=None):
+    """问题归一化：去停用词后的分词结果去重排序，措辞略有不同的问题得到同一个键"""
+    words = sorted(set(token.strip() for token in tokens if token.strip()))
+    return f"{department or ''}|{' '.join(words)}"
+
+
+class AnswerCache:
+    """带过期时间的LRU答案缓存"""
+
+    def __init__(self, max_size=10000, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        # 键 -> (过期时间, 答案)，按最近使用排序
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """命中且未过期时返回答案，否则返回None"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, answer):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, answer)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """语料变更后清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+# 进程级缓存实例
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """获取答案缓存"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL)
+    return _answer_cache
+
+
+def clear_answer_cache():
+    """清空答案缓存，缓存尚未创建时忽略"""
+    if _answer_cache is not None:
+        _answer_cache.clear()
@@ -0,0 +1,76 @@
+import hashlib
+import zlib
+from django.conf import settings
+
+
+def answer_digest(text):
+    """答案正文的SHA-256摘要，作为答案表的主键"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def encode_answer(text, compress=None):
+    """把答案编码为存储用的字节串，返回 (内容, 是否压缩)
+
+    开启 ANSWER_COMPRESSION 时，不短于 ANSWER_COMPRESS_MIN_BYTES 且压缩后
+    确实更小的答案用zlib压缩存储。
+    """
+    data = text.encode('utf-8')
+    if compress is None:
+        compress = settings.ANSWER_COMPRESSION
+    if compress and len(data) >= settings.ANSWER_COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return packed, True
+    return data, False
+
+
+def decode_answer(content, compressed):
+    data = bytes(content)
+    if compressed:
+        data = zlib.decompress(data)
+    return data.decode('utf-8')
+
+
+def store_answers(texts):
+    """把答案写入答案表，内容相同的答案只存一份，返回与 texts 对应的摘要列表"""
+    from .models import AnswerText
+    digests = [answer_digest(text) for text in texts]
+    unique = {}
+    for digest, text in zip(digests, texts):
+        if digest not in unique:
+            content, compressed = encode_answer(text)
+            unique[digest] = AnswerText(digest=digest, content=content, compressed=compressed)
+    AnswerText.objects.bulk_create(unique.values(), batch_size=1000, ignore_conflicts=True)
+    return digests
+
+
+def attach_answers(qa_objects):
+    """把问答对象上新赋值的答案写入答案表并关联，用于 bulk_create 之前"""
+    pending = [qa for qa in qa_objects if qa.pending_answer is not None]
+    if not pending:
+        return
+    digests = store_answers([qa.pending_answer for qa in pending])
+    for qa, digest in zip(pending, digests):
+        qa.answer_ref_id = digest
+        qa.pending_answer = None
+
+
+def fetch_answers(qa_ids):
+    """只取回指定问答的答案正文，返回 问答id -> 答案"""
+    from .models import MedicalQA
+    rows = (MedicalQA.objects
+            .filter(id__in=list(qa_ids))
+            .values_list('id', 'answer_ref__content', 'answer_ref__compressed'))
+    return {qa_id: decode_answer(content, compressed) for qa_id, content, compressed in rows}
+
+
+def search_answers(terms, chunk_size=2000):
+    """答案正文包含全部 terms 的答案摘要集合
+
+    答案可能压缩存储，数据库无法直接匹配正文，只能分批解码后在内存中查找，
+    用于后台管理按答案搜索。
+    """
+    from .models import AnswerText
+    rows = AnswerText.objects.values_list('digest', 'content', 'compressed').iterator(chunk_size=chunk_size)
+    return {digest for digest, content, compressed in rows
+            if all(term in decode_answer(content, compressed) for term in terms)}
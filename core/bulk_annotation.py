@@ -0,0 +1,135 @@
+import codecs
+import csv
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .annotation import annotate
+from .lexicon import get_lexicon
+from .process_pool import pool_context, setup_django
+
+
+def _init_worker():
+    """工作进程初始化：初始化Django后加载医疗词典（同时初始化jieba），之后的分块不再付出这部分开销"""
+    setup_django()
+    get_lexicon()
+
+
+def _annotate_chunk(items, top_k):
+    """在工作进程内标注一块文本：分词、词性、关键词、实体"""
+    results = []
+    for item_id, text in items:
+        annotation = annotate(text)
+        results.append({
+            'id': item_id,
+            'keywords': annotation.keywords(topK=top_k),
+            'annotation': annotation.compact(),
+        })
+    return results
+
+
+# 进程级工作进程池
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_annotation_pool():
+    """获取批量标注用的进程池，进程数默认取CPU核数"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # 工作进程不从Web进程fork，不会继承后台线程持有的锁和数据库连接
+                _pool = ProcessPoolExecutor(max_workers=settings.BULK_ANNOTATION_WORKERS or os.cpu_count(),
+                                            mp_context=pool_context(), initializer=_init_worker)
+    return _pool
+
+
+def _reset_pool(broken):
+    """工作进程异常退出后丢弃进程池，下次使用时重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def read_items(file_obj, fmt):
+    """逐条读取上传的文本，返回 (id, 文本) 的迭代器
+
+    jsonl：每行一个JSON对象（text 字段为文本，可选 id 字段）或一个JSON字符串；
+    csv：content 或 text 列为文本，可选 id 列。未给出 id 时使用从0开始的行号。
+    """
+    lines = codecs.iterdecode(file_obj, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        column = next((name for name in ('content', 'text') if name in (reader.fieldnames or [])), None)
+        if column is None:
+            raise ValueError(f"CSV文件必须包含content列或text列。当前可用列: {', '.join(reader.fieldnames or [])}")
+        for index, row in enumerate(reader):
+            yield row.get('id') or index, row[column] or ''
+        return
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record, dict):
+            yield record.get('id', index), str(record.get('text', ''))
+        else:
+            yield index, str(record)
+        index += 1
+
+
+def annotate_stream(items, top_k=10):
+    """把文本按块分发到进程池标注，按输入顺序逐行产出JSONL
+
+    同时在途的块数限制为进程数的两倍，上传文件不会被一次读入内存。
+    """
+    pool = get_annotation_pool()
+    chunk_size = settings.BULK_ANNOTATION_CHUNK_SIZE
+    max_pending = 2 * (settings.BULK_ANNOTATION_WORKERS or os.cpu_count())
+    pending = deque()
+
+    def submit(chunk):
+        try:
+            future = pool.submit(_annotate_chunk, chunk, top_k)
+        except Exception as e:
+            # 进程池已损坏，这一块按失败输出
+            future = Future()
+            future.set_exception(e)
+        pending.append((future, chunk))
+
+    def drain(future, chunk):
+        try:
+            results = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _reset_pool(pool)
+            results = [{'id': item_id, 'error': str(e) or type(e).__name__} for item_id, _ in chunk]
+        return ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results)
+
+    chunk = []
+    error = None
+    try:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                submit(chunk)
+                chunk = []
+                if len(pending) >= max_pending:
+                    yield drain(*pending.popleft())
+    except (ValueError, csv.Error) as e:
+        # 输入中途格式错误：已读到的文本照常输出，最后一行说明错误
+        error = str(e)
+    if chunk:
+        submit(chunk)
+    while pending:
+        yield drain(*pending.popleft())
+    if error is not None:
+        yield json.dumps({'error': f'输入格式错误：{error}'}, ensure_ascii=False) + '\n'
+
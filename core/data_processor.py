@@ -1,13 +1,12 @@
-import pandas as pd
-import jieba
-import jieba.analyse
+import threading
 from .models import MedicalQA
 from django.db import transaction
+from django.db.models import F
 from pathlib import Path
-from django.db.models import Q
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from .dedup import MinHashDeduplicator
+from .answer_store import attach_answers
+from .annotation import annotate
+from .nlp_cache import posseg
 
 class DataProcessor:
     def __init__(self):
@@ -23,12 +22,8 @@ class DataProcessor:
         }
         # 加载停用词
         self.stopwords = self.load_stopwords()
-        # 初始化TF-IDF向量化器
-        self.vectorizer = TfidfVectorizer()
-        # 缓存TF-IDF矩阵和问题列表
-        self.cached_tfidf_matrix = None
-        self.cached_questions = None
-        self.cache_size = 1000  # 缓存的问题数量限制
+        # 导入时去重的统计信息
+        self.dedup_stats = {'rows_before': 0, 'rows_saved': 0, 'db_bytes_saved': 0, 'index_bytes_saved': 0}
 
     def load_stopwords(self):
         """加载停用词表"""
@@ -39,72 +34,81 @@ class DataProcessor:
             print(f"加载停用词表时发生错误：{str(e)}")
             return set()
 
-    def process_text(self, text):
-        """文本预处理：分词、去停用词"""
+    def process_text(self, text, annotation=None):
+        """文本预处理：分词、去停用词，传入 annotation 时复用其分词结果
+
+        与 annotate 一样用 jieba.posseg 分词，入库的 tokens 与查询的分词结果一致。
+        """
         if not isinstance(text, str):
             return []
-        # 使用jieba分词
-        words = jieba.cut(text)
+        # 同一文本的结果从分词缓存中取
+        words = annotation.words if annotation is not None else [word for word, _ in posseg(text)]
         # 去除停用词
         words = [word for word in words if word not in self.stopwords]
         return words
 
-    def extract_keywords(self, text, topK=10):
-        """提取关键词（去除停用词后）"""
-        # 使用jieba提取关键词，同时考虑停用词
-        keywords = jieba.analyse.extract_tags(
-            text,
-            topK=topK,
-            withWeight=False,
-            allowPOS=('n', 'vn', 'v')
-        )
+    @staticmethod
+    def join_tokens(tokens):
+        """分词结果压缩为空格分隔的字符串存入 MedicalQA.tokens，空白词被丢弃"""
+        return ' '.join(token for token in (t.strip() for t in tokens) if token)
+
+    def stored_tokens(self, question, tokens):
+        """读取入库时保存的分词结果，旧数据没有保存时现场分词"""
+        return tokens.split(' ') if tokens else self.process_text(question)
+
+    def extract_keywords(self, text, topK=10, annotation=None):
+        """提取关键词（去除停用词后），传入 annotation 时复用其分词结果"""
+        if annotation is None:
+            annotation = annotate(text)
+        keywords = annotation.keywords(topK=topK, allowPOS=('n', 'vn', 'v'))
         # 过滤停用词
         keywords = [word for word in keywords if word not in self.stopwords]
         return keywords
 
-    def build_index(self, questions):
-        """构建文本索引，使用缓存机制"""
-        # 如果问题列表与缓存的相同，直接返回缓存的矩阵
-        if (self.cached_questions is not None and 
-            len(questions) <= self.cache_size and 
-            questions == self.cached_questions):
-            return self.cached_tfidf_matrix
+    def collapse_duplicates(self, df, deduplicator):
+        """用MinHash/LSH把问题近似重复的行折叠为第一次出现的那一行
 
-        # 将问题文本转换为TF-IDF向量
-        try:
-            # 限制问题数量
-            if len(questions) > self.cache_size:
-                questions = questions[:self.cache_size]
-            
-            tfidf_matrix = self.vectorizer.fit_transform(questions)
-            
-            # 更新缓存
-            self.cached_tfidf_matrix = tfidf_matrix
-            self.cached_questions = questions
-            
-            return tfidf_matrix
-        except Exception as e:
-            print(f"构建索引时发生错误：{str(e)}")
-            return None
+        保留行的 duplicate_count 列记录被折叠的行数（包含自身），
+        同时累计节省的行数、数据库字节数和检索索引字节数的估计值。
+        返回 (折叠后的数据, earlier)，earlier 为折叠到之前文件中已入库问题的条数，见 add_duplicates。
+        """
+        keep, counts, earlier = deduplicator.collapse(df['ask'].tolist())
+        dropped = df.drop(df.index[keep])
+        collapsed = df.iloc[keep].copy()
+        collapsed['duplicate_count'] = counts
 
-    def search_similar(self, query, tfidf_matrix, top_k=5):
-        """搜索相似问题"""
-        try:
-            # 将查询转换为向量
-            query_vec = self.vectorizer.transform([query])
-            # 计算相似度
-            similarities = cosine_similarity(query_vec, tfidf_matrix)
-            # 获取最相似的问题索引
-            top_indices = np.argsort(similarities[0])[-top_k:]
-            return top_indices[::-1], similarities[0][top_indices[::-1]]
-        except Exception as e:
-            print(f"搜索相似问题时发生错误：{str(e)}")
-            return [], []
+        db_bytes = 0
+        index_bytes = 0
+        for _, row in dropped.iterrows():
+            db_bytes += sum(len(str(row[col]).encode('utf-8')) for col in ('title', 'ask', 'answer'))
+            # TF-IDF和BM25矩阵各占 非零项 * (8字节权重 + 4字节列号)，另加行id和行指针
+            nnz = len(set(self.process_text(str(row['ask']))))
+            index_bytes += nnz * 12 * 2 + 8 + 4 * 2
+        self.dedup_stats['rows_before'] += len(df)
+        self.dedup_stats['rows_saved'] += len(dropped)
+        self.dedup_stats['db_bytes_saved'] += db_bytes
+        self.dedup_stats['index_bytes_saved'] += index_bytes
+        print(f"去重：{len(df)} 行折叠为 {len(collapsed)} 行，"
+              f"节省约 {db_bytes / 1024:.1f} KB 数据、{index_bytes / 1024:.1f} KB 索引")
+        return collapsed, earlier
 
-    def process_csv_file(self, file_path, department):
-        """处理单个CSV文件"""
+    @staticmethod
+    def add_duplicates(earlier, department):
+        """把折叠到之前文件中问题的条数累加到已入库那一行的 duplicate_count"""
+        for question, count in earlier.items():
+            qa_id = (MedicalQA.objects.filter(department=department, question=question)
+                     .order_by('-id').values_list('id', flat=True).first())
+            if qa_id is not None:
+                MedicalQA.objects.filter(id=qa_id).update(duplicate_count=F('duplicate_count') + count)
+
+    def process_csv_file(self, file_path, department, dedup_threshold=None, deduplicator=None):
+        """处理单个CSV文件，指定 dedup_threshold 时先折叠近似重复的问题
+
+        传入 deduplicator 时与它之前处理过的文件一起去重，否则只在文件内去重。
+        """
         try:
             # 读取CSV文件
+            import pandas as pd
             df = pd.read_csv(file_path, encoding='utf-8')
             
             # 清理数据
@@ -119,9 +123,13 @@ class DataProcessor:
                 print(f"错误：{file_path} 缺少必要的列（department, title, ask, answer）")
                 return 0
 
-            # 构建问题索引
-            questions = df['ask'].tolist()
-            tfidf_matrix = self.build_index(questions)
+            earlier = {}
+            if deduplicator is None and dedup_threshold is not None:
+                deduplicator = MinHashDeduplicator(threshold=dedup_threshold)
+            if deduplicator is not None:
+                df, earlier = self.collapse_duplicates(df, deduplicator)
+            else:
+                df['duplicate_count'] = 1
 
             # 批量处理数据
             batch_size = 1000
@@ -130,22 +138,27 @@ class DataProcessor:
 
             for idx, row in df.iterrows():
                 try:
+                    # 分词和词性标注一次，分词结果和关键词都复用
+                    annotation = annotate(str(row['ask']))
                     # 对问题进行分词和去停用词处理
-                    processed_text = self.process_text(str(row['ask']))
+                    processed_text = self.process_text(str(row['ask']), annotation)
                     # 提取关键词
-                    keywords = self.extract_keywords(str(row['ask']))
+                    keywords = self.extract_keywords(str(row['ask']), annotation=annotation)
 
                     qa_objects.append(MedicalQA(
                         title=str(row['title']) if 'title' in row else '',
                         question=str(row['ask']),
                         answer=str(row['answer']),
                         keywords=','.join(keywords),
-                        department=department
+                        tokens=self.join_tokens(processed_text),
+                        department=department,
+                        duplicate_count=int(row['duplicate_count'])
                     ))
 
                     # 当达到批量大小时，执行批量插入
                     if len(qa_objects) >= batch_size:
                         with transaction.atomic():
+                            attach_answers(qa_objects)
                             MedicalQA.objects.bulk_create(qa_objects)
                             total_processed += len(qa_objects)
                             print(f'已处理 {total_processed} 条记录')
@@ -159,20 +172,48 @@ class DataProcessor:
             if qa_objects:
                 try:
                     with transaction.atomic():
+                        attach_answers(qa_objects)
                         MedicalQA.objects.bulk_create(qa_objects)
                         total_processed += len(qa_objects)
                         print(f'已处理 {total_processed} 条记录')
                 except Exception as e:
                     print(f'保存剩余记录时发生错误：{str(e)}')
 
+            self.add_duplicates(earlier, department)
             return total_processed
 
         except Exception as e:
             print(f"处理文件 {file_path} 时发生错误：{str(e)}")
             return 0
 
-    def process_all_data(self):
-        """处理所有数据文件"""
+    def resegment(self, queryset, batch_size=1000):
+        """用当前词典重新分词并提取关键词，按id分批写回 tokens 和 keywords，每批完成后返回累计条数
+
+        bulk_update 不触发信号，也不会修改 updated_at，写回后需要重建索引。
+        """
+        total_updated = 0
+        last_id = 0
+        queryset = queryset.order_by('id')
+        while True:
+            # 按id分批读取，避免一次载入全部记录
+            batch = list(queryset.filter(id__gt=last_id).only('id', 'question')[:batch_size])
+            if not batch:
+                break
+            for qa in batch:
+                annotation = annotate(qa.question)
+                qa.tokens = self.join_tokens(self.process_text(qa.question, annotation))
+                qa.keywords = ','.join(self.extract_keywords(qa.question, annotation=annotation))
+            with transaction.atomic():
+                MedicalQA.objects.bulk_update(batch, ['tokens', 'keywords'])
+            total_updated += len(batch)
+            last_id = batch[-1].id
+            yield total_updated
+
+    def process_all_data(self, dedup_threshold=None):
+        """处理所有数据文件，dedup_threshold 为近似重复判定的Jaccard相似度阈值
+
+        同一科室的全部文件一起去重，不同科室的相同问题各自保留，按科室检索时都能找到。
+        """
         total_processed = 0
 
         for dept_dir, dept_name in self.departments.items():
@@ -181,10 +222,11 @@ class DataProcessor:
                 print(f"警告：目录 {dept_path} 不存在")
                 continue
 
+            deduplicator = MinHashDeduplicator(threshold=dedup_threshold) if dedup_threshold is not None else None
             # 处理该科室下的所有CSV文件
             for csv_file in dept_path.glob('*.csv'):
                 print(f"正在处理 {csv_file}...")
-                count = self.process_csv_file(csv_file, dept_name)
+                count = self.process_csv_file(csv_file, dept_name, deduplicator=deduplicator)
                 total_processed += count
                 print(f"成功处理 {count} 条记录")
 
@@ -194,7 +236,7 @@ class DataProcessor:
     @staticmethod
     def clean_text(text):
         """清理文本数据"""
-        if pd.isna(text) or not isinstance(text, str):
+        if not isinstance(text, str):
             return ""
         # 移除特殊字符和多余的空格
         text = text.strip()
@@ -202,4 +244,19 @@ class DataProcessor:
         text = text.replace('\u200b', '')
         # 移除重复的空格
         text = ' '.join(text.split())
-        return text
\ No newline at end of file
+        return text
+
+
+# 进程级数据处理器，停用词表只读取一次
+_data_processor = None
+_data_processor_lock = threading.Lock()
+
+
+def get_data_processor():
+    """获取共享的数据处理器"""
+    global _data_processor
+    if _data_processor is None:
+        with _data_processor_lock:
+            if _data_processor is None:
+                _data_processor = DataProcessor()
+    return _data_processor
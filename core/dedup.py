@@ -0,0 +1,88 @@
+import re
+import zlib
+import numpy as np
+
+# 梅森素数，用于 (a * x + b) mod p 形式的哈希族
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class MinHashDeduplicator:
+    """基于字符 shingle 的 MinHash/LSH 近似重复检测
+
+    每个问题取长度为 shingle_size 的字符片段，计算 num_perm 个 MinHash 值，
+    再分成 bands 个band做LSH分桶。落入同一个桶的问题才比较签名，估计的
+    Jaccard 相似度不低于 threshold 时视为重复。分桶在多次 collapse 之间保留，
+    同一个实例处理的多个文件一起去重。
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=3, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError('num_perm 必须能被 bands 整除')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # 系数限制在32位内，a * x + b 在 uint64 上不会溢出
+        self.a = rng.integers(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        # 已保留文本的分桶、签名和正文，按所有调用中的累计序号编号
+        self.buckets = {}
+        self.signatures = {}
+        self.texts = {}
+        self.seen = 0
+
+    def shingles(self, text):
+        """去掉空白和标点后取字符 shingle"""
+        text = re.sub(r'[\s\W_]+', '', text or '')
+        if len(text) <= self.shingle_size:
+            return {text} if text else set()
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        """计算 MinHash 签名"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(_MERSENNE_PRIME) & np.uint64(_MAX_HASH)
+        return permuted.min(axis=0)
+
+    def collapse(self, texts):
+        """把近似重复的文本折叠到第一次出现的那一条
+
+        返回 (保留的下标列表, 与之对应的重复次数列表, earlier)，重复次数包含自身。
+        与之前调用中保留的文本重复的，折叠到那一条并计入 earlier（正文 -> 本次折叠的条数）。
+        """
+        keep = []
+        counts = {}
+        earlier = {}
+        offset = self.seen
+        for position, text in enumerate(texts):
+            signature = self.signature(text)
+            bands = [(band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes())
+                     for band in range(self.bands)]
+
+            canonical = None
+            candidates = {self.buckets[key] for key in bands if key in self.buckets}
+            for candidate in sorted(candidates):
+                if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                    canonical = candidate
+                    break
+
+            if canonical is None:
+                keep.append(position)
+                counts[position] = 1
+                self.signatures[offset + position] = signature
+                self.texts[offset + position] = text
+                for key in bands:
+                    self.buckets.setdefault(key, offset + position)
+            elif canonical >= offset:
+                counts[canonical - offset] += 1
+            else:
+                earlier[self.texts[canonical]] = earlier.get(self.texts[canonical], 0) + 1
+        self.seen += len(texts)
+        return keep, [counts[position] for position in keep], earlier
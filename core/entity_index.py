@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models import Q
+from .models import Document, DocumentEntity
+
+SURFACE_MAX_LENGTH = DocumentEntity._meta.get_field('surface').max_length
+
+
+def index_document(document, annotation):
+    """把文档的实体写入倒排索引，替换该文档已有的记录"""
+    postings = [
+        DocumentEntity(document=document, entity_type=entity_type, surface=surface, positions=positions)
+        for (entity_type, surface), positions in annotation.entity_spans().items()
+        if len(surface) <= SURFACE_MAX_LENGTH
+    ]
+    with transaction.atomic():
+        DocumentEntity.objects.filter(document=document).delete()
+        DocumentEntity.objects.bulk_create(postings, batch_size=1000)
+    return len(postings)
+
+
+def parse_term(term):
+    """查询词：'原文' 或 '类别:原文'，返回 (类别或None, 原文)"""
+    entity_type, sep, surface = term.strip().partition(':')
+    if not sep:
+        return None, entity_type
+    return entity_type.strip() or None, surface.strip()
+
+
+def _term_filter(term):
+    entity_type, surface = term
+    lookup = {'surface': surface}
+    if entity_type:
+        lookup['entity_type'] = entity_type
+    return lookup
+
+
+def _documents_with(term):
+    """包含某个实体的文档id子查询，走 (surface, entity_type, document) 索引"""
+    return DocumentEntity.objects.filter(**_term_filter(term)).values('document_id')
+
+
+def search_documents(all_terms=(), any_terms=(), not_terms=(), after=None, limit=20):
+    """按实体的布尔组合检索文档
+
+    all_terms 全部包含、any_terms 至少包含一个、not_terms 都不包含；
+    结果按文档id从新到旧排列，after 为上一页最后一个文档id（键集分页）。
+    返回 (文档列表, 下一页的 after，没有下一页时为None)。
+    """
+    all_terms = [parse_term(term) for term in all_terms if term.strip()]
+    any_terms = [parse_term(term) for term in any_terms if term.strip()]
+    not_terms = [parse_term(term) for term in not_terms if term.strip()]
+    if not all_terms and not any_terms:
+        raise ValueError('至少需要一个 all 或 any 查询词')
+
+    documents = Document.objects.all()
+    for term in all_terms:
+        documents = documents.filter(id__in=_documents_with(term))
+    if any_terms:
+        condition = Q()
+        for term in any_terms:
+            condition |= Q(id__in=_documents_with(term))
+        documents = documents.filter(condition)
+    for term in not_terms:
+        documents = documents.exclude(id__in=_documents_with(term))
+    if after is not None:
+        documents = documents.filter(id__lt=after)
+
+    page = list(documents.order_by('-id').only('id', 'title', 'file_type', 'created_at')[:limit + 1])
+    next_after = page[limit - 1].id if len(page) > limit else None
+    return page[:limit], next_after
+
+
+def matched_positions(documents, terms):
+    """取回当前页文档中查询实体的出现位置：文档id -> [{类别, 原文, 位置}]"""
+    if not documents or not terms:
+        return {}
+    condition = Q()
+    for term in terms:
+        condition |= Q(**_term_filter(parse_term(term)))
+    matches = {}
+    postings = (DocumentEntity.objects
+                .filter(condition, document_id__in=[document.id for document in documents])
+                .values_list('document_id', 'entity_type', 'surface', 'positions'))
+    for document_id, entity_type, surface, positions in postings:
+        matches.setdefault(document_id, []).append(
+            {'entity_type': entity_type, 'surface': surface, 'positions': positions})
+    return matches
@@ -0,0 +1,74 @@
+from collections import deque
+
+
+class EntityMatcher:
+    """医疗实体词典编译成的Aho-Corasick自动机
+
+    与逐个类别做 any(kw in word) 的结果一致：词中包含某类别的任一关键词即属于该类别，
+    同时命中多个类别时取优先级最高的。每个词只需从头到尾扫描一遍，
+    耗时与词长成正比，而与关键词数量无关。
+    """
+
+    def __init__(self, rules):
+        self.categories = list(rules)
+        # 节点 -> {字符: 子节点}
+        self.goto = [{}]
+        # 节点 -> 以该节点结尾的关键词（含失败链上的）中最高的优先级，无则为None
+        self.best = [None]
+        for priority, rule in enumerate(rules.values()):
+            for keyword in rule['keywords']:
+                node = 0
+                for char in keyword:
+                    child = self.goto[node].get(char)
+                    if child is None:
+                        child = len(self.goto)
+                        self.goto[node][char] = child
+                        self.goto.append({})
+                        self.best.append(None)
+                    node = child
+                if self.best[node] is None or priority < self.best[node]:
+                    self.best[node] = priority
+
+        # 广度优先构建失败指针，并把失败链上的输出合并到每个节点
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                inherited = self.best[self.fail[child]]
+                if inherited is not None and (self.best[child] is None or inherited < self.best[child]):
+                    self.best[child] = inherited
+                queue.append(child)
+
+    def match(self, word):
+        """返回词所属的实体类别，不属于任何类别时返回None"""
+        goto = self.goto
+        fail = self.fail
+        best_per_node = self.best
+        node = 0
+        best = None
+        for char in word:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            priority = best_per_node[node]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+                if best == 0:
+                    break
+        return self.categories[best] if best is not None else None
+
+    def tag(self, words):
+        """对分词结果逐词标注实体类别，返回与 words 一一对应的类别列表"""
+        return [self.match(word) for word in words]
+
+
+def get_entity_matcher():
+    """获取当前医疗词典编译好的实体匹配器（词典见 core/lexicon.py）"""
+    from .lexicon import get_lexicon
+    return get_lexicon().matcher
@@ -0,0 +1,99 @@
+import math
+import os
+import struct
+import threading
+import numpy as np
+from django.conf import settings
+
+# 关键词提取时忽略的英文虚词，与 jieba.analyse 的默认停用词相同
+STOP_WORDS = frozenset((
+    'the', 'of', 'is', 'and', 'to', 'in', 'that', 'we', 'for', 'an', 'are',
+    'by', 'be', 'as', 'on', 'with', 'can', 'if', 'from', 'which', 'you', 'it',
+    'this', 'then', 'at', 'have', 'all', 'not', 'one', 'has', 'or',
+))
+
+# 文件头：魔数、版本、词数、文档数、IDF中位数
+MAGIC = b'MIDF'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIf')
+
+
+class IdfTable:
+    """语料IDF表：词 -> IDF，未登录词取中位数"""
+
+    def __init__(self, idf_freq, median_idf, n_docs=0):
+        self.idf_freq = idf_freq
+        self.median_idf = median_idf
+        self.n_docs = n_docs
+
+    def __len__(self):
+        return len(self.idf_freq)
+
+    @classmethod
+    def from_document_frequency(cls, df, n_docs):
+        """由文档频率计算平滑IDF：ln((N+1)/(df+1)) + 1"""
+        idf_freq = {word: math.log((n_docs + 1) / (count + 1)) + 1.0 for word, count in df.items()}
+        median_idf = float(np.median(list(idf_freq.values()))) if idf_freq else 1.0
+        return cls(idf_freq, median_idf, n_docs)
+
+    def save(self, path):
+        """保存为紧凑的二进制文件：文件头 + float32 IDF数组 + 换行分隔的词表"""
+        words = sorted(self.idf_freq)
+        idf = np.array([self.idf_freq[word] for word in words], dtype='<f4')
+        blob = '\n'.join(words).encode('utf-8')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(words), self.n_docs, self.median_idf))
+            f.write(idf.tobytes())
+            f.write(blob)
+        # 写完再替换，正在读取旧文件的进程不受影响
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, n_words, n_docs, median_idf = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'不是可识别的IDF表文件：{path}')
+        start = HEADER.size
+        idf = np.frombuffer(data, dtype='<f4', count=n_words, offset=start)
+        words = data[start + idf.nbytes:].decode('utf-8').split('\n') if n_words else []
+        return cls(dict(zip(words, idf.tolist())), median_idf, n_docs)
+
+
+# 进程级IDF表，None 表示尚未加载，False 表示没有可用的语料IDF表
+_idf_table = None
+_idf_table_lock = threading.Lock()
+
+
+def get_idf_table():
+    """获取语料IDF表，首次调用时从 KEYWORD_IDF_FILE 加载，文件不存在时返回None"""
+    global _idf_table
+    if _idf_table is None:
+        with _idf_table_lock:
+            if _idf_table is None:
+                try:
+                    _idf_table = IdfTable.load(settings.KEYWORD_IDF_FILE)
+                    print(f"语料IDF表加载完成，共 {len(_idf_table)} 个词")
+                except FileNotFoundError:
+                    _idf_table = False
+                except Exception as e:
+                    print(f"加载语料IDF表时发生错误：{str(e)}")
+                    _idf_table = False
+    return _idf_table or None
+
+
+def keyword_idf():
+    """关键词提取用的 (IDF字典, 未登录词IDF, 停用词)
+
+    优先使用 build_idf_table 生成的语料IDF表，没有时退回 jieba 自带的通用IDF。
+    """
+    table = get_idf_table()
+    if table is not None:
+        return table.idf_freq, table.median_idf, STOP_WORDS
+    # 导入 jieba.analyse 时会加载其自带的IDF文件，只在没有语料IDF表时才导入
+    import jieba.analyse
+    tfidf = jieba.analyse.default_tfidf
+    return tfidf.idf_freq, tfidf.median_idf, tfidf.stop_words
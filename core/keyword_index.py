@@ -0,0 +1,148 @@
+import heapq
+import threading
+import numpy as np
+from .models import MedicalQA
+
+
+def _split_keywords(keywords):
+    """keywords 为 DataProcessor.process_csv_file 写入的逗号分隔字符串"""
+    return set(filter(None, (keywords or '').split(',')))
+
+
+class KeywordIndex:
+    """关键词倒排索引：关键词 -> 倒排列表（按创建时间倒序的行号）
+
+    主索引构建后只读；新增或修改的记录写入增量段，删除或被修改的旧记录
+    记入 removed。with_changes 返回共享主索引的新实例，读者无需加锁。
+    """
+
+    def __init__(self):
+        # 关键词 -> 升序排列的行号数组，行号越小表示记录越新
+        self.postings = {}
+        # 行号 -> MedicalQA的id
+        self.qa_ids = np.empty(0, dtype=np.int64)
+        # 行号 -> 创建时间（微秒时间戳），用于与增量段按时间合并
+        self.created = np.empty(0, dtype=np.int64)
+        # 增量段：问答id -> (关键词集合, 创建时间)
+        self.delta = {}
+        # 主索引中已失效的问答id（已删除或已被增量段覆盖），有序数组
+        self.removed = np.empty(0, dtype=np.int64)
+
+    def build(self, rows):
+        """根据 (id, keywords, created_at) 序列构建索引，rows 需已按创建时间倒序排列"""
+        postings = {}
+        qa_ids = []
+        created = []
+        for rank, (qa_id, keywords, created_at) in enumerate(rows):
+            qa_ids.append(qa_id)
+            created.append(_timestamp(created_at))
+            for keyword in _split_keywords(keywords):
+                postings.setdefault(keyword, []).append(rank)
+
+        self.postings = {kw: np.asarray(ranks, dtype=np.int32) for kw, ranks in postings.items()}
+        self.qa_ids = np.asarray(qa_ids, dtype=np.int64)
+        self.created = np.asarray(created, dtype=np.int64)
+        return self
+
+    @classmethod
+    def from_database(cls):
+        """从数据库读取全部问答的关键词构建索引"""
+        rows = (MedicalQA.objects
+                .order_by('-created_at', '-id')
+                .values_list('id', 'keywords', 'created_at')
+                .iterator(chunk_size=5000))
+        return cls().build(rows)
+
+    def with_changes(self, rows=(), removed_ids=()):
+        """返回写入了变更的新索引，rows 为 (id, keywords, created_at) 序列"""
+        index = KeywordIndex()
+        index.postings = self.postings
+        index.qa_ids = self.qa_ids
+        index.created = self.created
+        index.delta = dict(self.delta)
+        for qa_id, keywords, created_at in rows:
+            index.delta[qa_id] = (_split_keywords(keywords), _timestamp(created_at))
+        for qa_id in removed_ids:
+            index.delta.pop(qa_id, None)
+        invalid = np.fromiter(list(index.delta) + list(removed_ids), dtype=np.int64)
+        index.removed = np.union1d(self.removed, invalid)
+        return index
+
+    def recall(self, keywords, limit=300, posting_budget=None):
+        """OR查询：召回包含任一关键词的问答id，命中关键词多的优先，其次越新越优先
+
+        posting_budget 限制每个关键词最多扫描的倒排列表长度（倒排列表按时间倒序，
+        截断后保留最新的记录），使召回耗时不随语料规模增长。
+        """
+        keywords = set(keywords)
+        if not keywords:
+            return []
+        lists = []
+        for keyword in keywords:
+            ranks = self.postings.get(keyword)
+            if ranks is not None:
+                lists.append(ranks[:posting_budget] if posting_budget else ranks)
+
+        candidates = []
+        if lists:
+            ranks, hits = np.unique(np.concatenate(lists), return_counts=True)
+            if len(self.removed):
+                keep = ~np.isin(self.qa_ids[ranks], self.removed)
+                ranks, hits = ranks[keep], hits[keep]
+            # 命中数降序、行号升序（越新越靠前）
+            order = np.lexsort((ranks, -hits))[:limit]
+            ranks, hits = ranks[order], hits[order]
+            candidates = list(zip(hits.tolist(), self.created[ranks].tolist(), self.qa_ids[ranks].tolist()))
+        for qa_id, (kws, created) in self.delta.items():
+            hit = len(kws & keywords)
+            if hit:
+                candidates.append((hit, created, qa_id))
+        return [qa_id for _, _, qa_id in heapq.nlargest(limit, candidates)]
+
+    def __len__(self):
+        return len(self.qa_ids) + len(self.delta)
+
+
+def _timestamp(value):
+    """datetime 转为微秒时间戳"""
+    return int(value.timestamp() * 1_000_000) if value is not None else 0
+
+
+# 进程级索引实例
+_keyword_index = None
+_keyword_index_lock = threading.Lock()
+
+
+def get_keyword_index():
+    """获取关键词倒排索引，首次调用时从数据库构建"""
+    global _keyword_index
+    if _keyword_index is None:
+        with _keyword_index_lock:
+            if _keyword_index is None:
+                _keyword_index = KeywordIndex.from_database()
+                print(f"关键词倒排索引构建完成，共 {len(_keyword_index)} 条记录")
+    # 每个进程（包括预热后fork出的工作进程）首次使用时启动后台更新线程
+    from .live_index import start_index_updater
+    start_index_updater()
+    return _keyword_index
+
+
+def apply_keyword_changes(rows=(), removed_ids=()):
+    """把变更写入增量段并原子替换当前索引，索引尚未加载时忽略"""
+    global _keyword_index
+    with _keyword_index_lock:
+        if _keyword_index is not None:
+            _keyword_index = _keyword_index.with_changes(rows, removed_ids)
+
+
+def rebuild_keyword_index():
+    """从数据库重建主索引并替换，用于把增量段合并进主索引"""
+    global _keyword_index
+    index = KeywordIndex.from_database()
+    with _keyword_index_lock:
+        _keyword_index = index
+
+
+def keyword_delta_size():
+    index = _keyword_index
+    return len(index.delta) if index is not None else 0
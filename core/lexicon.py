@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from django.conf import settings
+import jieba
+from .entity_matcher import EntityMatcher
+
+SNAPSHOT_VERSION = 1
+
+
+def read_rules(path):
+    """读取医疗实体类别文件：类别 -> {'color': 颜色, 'keywords': [关键词]}，按优先级排列"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_user_words(path):
+    """读取jieba用户词典（每行 词 [词频] [词性]），返回 (词, 词频或None, 词性) 列表"""
+    words = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            freq = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+            tag = parts[-1] if len(parts) > 1 and not parts[-1].isdigit() else 'n'
+            words.append((parts[0], freq, tag))
+    return words
+
+
+class Lexicon:
+    """编译好的医疗词典：实体类别及其Aho-Corasick自动机，外加jieba用户词"""
+
+    def __init__(self, rules, user_words, version):
+        self.rules = rules
+        self.matcher = EntityMatcher(rules)
+        # (词, 词频, 词性) 列表，词频在编译时已算好
+        self.user_words = user_words
+        self.version = version
+
+    @property
+    def colors(self):
+        return {name: rule['color'] for name, rule in self.rules.items()}
+
+    @classmethod
+    def compile(cls, rules_path, words_path):
+        """从数据文件编译词典，未给出词频的用户词用 jieba.suggest_freq 计算能切分出来的词频"""
+        rules = read_rules(rules_path)
+        user_words = [(word, freq if freq is not None else jieba.suggest_freq(word, False), tag)
+                      for word, freq, tag in read_user_words(words_path)]
+        digest = hashlib.sha1()
+        for path in (rules_path, words_path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return cls(rules, user_words, digest.hexdigest()[:16])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'snapshot_version': SNAPSHOT_VERSION, 'lexicon': self}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        # 写完再替换，工作进程不会读到写了一半的快照
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('snapshot_version') != SNAPSHOT_VERSION:
+            raise ValueError(f'词典快照版本不匹配，请重新执行 compile_lexicon：{path}')
+        return data['lexicon']
+
+
+# 进程级词典
+_lexicon = None
+_lexicon_mtime = None
+_checked_at = 0.0
+_lexicon_lock = threading.Lock()
+# 加入jieba之前各用户词原有的词频，词从词典中删除时恢复
+_original_freq = {}
+
+
+def _watched_mtime():
+    """快照存在时监视快照，否则监视两个数据文件"""
+    paths = [settings.LEXICON_SNAPSHOT]
+    if not os.path.exists(settings.LEXICON_SNAPSHOT):
+        paths = [settings.LEXICON_RULES_FILE, settings.LEXICON_WORDS_FILE]
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+def _load():
+    if os.path.exists(settings.LEXICON_SNAPSHOT):
+        return Lexicon.load(settings.LEXICON_SNAPSHOT)
+    print("未找到医疗词典快照，直接从数据文件编译（可执行 python manage.py compile_lexicon 生成快照）")
+    return Lexicon.compile(settings.LEXICON_RULES_FILE, settings.LEXICON_WORDS_FILE)
+
+
+def _apply_user_words(old, new):
+    """把用户词的增删同步到jieba词典"""
+    freq_table = jieba.dt.FREQ
+    old_words = {word: (freq, tag) for word, freq, tag in old.user_words} if old is not None else {}
+    new_words = set()
+    for word, freq, tag in new.user_words:
+        new_words.add(word)
+        if old_words.get(word) == (freq, tag):
+            continue
+        if word not in _original_freq:
+            _original_freq[word] = freq_table.get(word, 0)
+        jieba.add_word(word, freq, tag)
+    for word in old_words.keys() - new_words:
+        original = _original_freq.pop(word, 0)
+        if original:
+            jieba.add_word(word, original)
+        else:
+            jieba.del_word(word)
+
+
+def _reload():
+    global _lexicon, _lexicon_mtime, _checked_at
+    mtime = _watched_mtime()
+    if mtime != _lexicon_mtime:
+        lexicon = _load()
+        if _lexicon is None or lexicon.version != _lexicon.version:
+            _apply_user_words(_lexicon, lexicon)
+            if _lexicon is not None:
+                # 词典变了，缓存的分词结果和按分词结果归一化的答案缓存作废；
+                # 库中的分词结果和索引由 compile_lexicon 重新分词后重建（见 resegment_all）
+                from .nlp_cache import clear_nlp_cache
+                from .answer_cache import clear_answer_cache
+                clear_nlp_cache()
+                clear_answer_cache()
+                print(f"医疗词典已更新为 {lexicon.version}")
+            _lexicon = lexicon
+        _lexicon_mtime = mtime
+    _checked_at = time.monotonic()
+
+
+def get_lexicon():
+    """获取医疗词典
+
+    首次调用时加载快照并把用户词加入jieba，之后每隔 LEXICON_CHECK_SECONDS 秒检查一次
+    快照是否被替换，有变化时在一个请求线程里加载新词典后整体替换，其他线程继续使用旧词典。
+    """
+    global _lexicon, _checked_at
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                try:
+                    _reload()
+                    print(f"医疗词典加载完成：{len(_lexicon.rules)} 个实体类别，{len(_lexicon.user_words)} 个用户词")
+                except Exception as e:
+                    print(f"加载医疗词典时发生错误：{str(e)}")
+                    _lexicon = Lexicon({}, [], '')
+                    _checked_at = time.monotonic()
+    elif time.monotonic() - _checked_at >= settings.LEXICON_CHECK_SECONDS:
+        if _lexicon_lock.acquire(blocking=False):
+            try:
+                _reload()
+            except Exception as e:
+                print(f"重新加载医疗词典时发生错误：{str(e)}")
+                _checked_at = time.monotonic()
+            finally:
+                _lexicon_lock.release()
+    return _lexicon
+
+
+def refresh_lexicon():
+    """立即检查快照是否被替换并返回当前词典，不等待 LEXICON_CHECK_SECONDS"""
+    get_lexicon()
+    with _lexicon_lock:
+        try:
+            _reload()
+        except Exception as e:
+            print(f"重新加载医疗词典时发生错误：{str(e)}")
+    return _lexicon
@@ -0,0 +1,529 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import MedicalQA, MedicalQADeletion
+from .data_processor import get_data_processor
+from .search_index import (TfidfIndex, get_tfidf_index, reload_tfidf_index, snapshot_lexicon_version,
+                           snapshot_version, top_k_results)
+from .keyword_index import apply_keyword_changes, rebuild_keyword_index, keyword_delta_size
+from .answer_cache import clear_answer_cache
+
+
+class LiveTfidfIndex:
+    """TF-IDF主索引 + 内存增量段
+
+    新增或修改的问题用主索引的词表和IDF向量化后写入增量段，主索引中对应的
+    旧行被屏蔽，检索时两部分一起打分。实例构建后只读，变更和合并都生成新实例
+    再整体替换，读者无需加锁。主索引词表之外的新词要等下一次全量构建才会生效。
+    """
+
+    def __init__(self, main, delta_ids=None, delta_matrix=None, masked_ids=None, delta_bm25=None,
+                 delta_questions=None):
+        self.main = main
+        n_terms = len(main.idf)
+        # 增量段：行号 -> MedicalQA的id，以及对应的TF-IDF和BM25行向量
+        self.delta_ids = delta_ids if delta_ids is not None else np.empty(0, dtype=np.int64)
+        self.delta_matrix = delta_matrix if delta_matrix is not None else sp.csr_matrix((0, n_terms))
+        self.delta_bm25 = delta_bm25 if delta_bm25 is not None else sp.csr_matrix((0, n_terms))
+        # 增量段各行的问题原文，合并时写入新主索引的字符串池
+        self.delta_questions = delta_questions if delta_questions is not None else []
+        # 主索引中已失效的问答id（已删除或已被增量段覆盖）
+        self.masked_ids = masked_ids if masked_ids is not None else np.empty(0, dtype=np.int64)
+        self.masked_rows = np.flatnonzero(np.isin(main.row_ids, self.masked_ids))
+
+    def with_changes(self, rows=(), removed_ids=()):
+        """返回写入了变更的新实例，rows 为 (id, 分词结果, 问题原文) 序列"""
+        removed_ids = np.asarray(list(removed_ids), dtype=np.int64)
+        # 拉取到更新之后又被删除的记录不再写入增量段
+        rows = [row for row in rows if row[0] not in removed_ids]
+        changed_ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        dropped_ids = np.union1d(changed_ids, removed_ids)
+
+        keep = ~np.isin(self.delta_ids, dropped_ids)
+        blocks = [self.delta_matrix[keep]]
+        blocks.extend(self.main.transform(tokens) for _, tokens, _ in rows)
+        bm25_blocks = [self.delta_bm25[keep]]
+        if self.main.bm25_matrix is not None:
+            bm25_blocks.extend(self.main.bm25_transform(tokens) for _, tokens, _ in rows)
+        else:
+            bm25_blocks.append(sp.csr_matrix((len(rows), len(self.main.idf))))
+        return LiveTfidfIndex(
+            self.main,
+            np.concatenate([self.delta_ids[keep], changed_ids]),
+            sp.vstack(blocks).tocsr(),
+            np.union1d(self.masked_ids, dropped_ids),
+            sp.vstack(bm25_blocks).tocsr(),
+            [q for q, k in zip(self.delta_questions, keep) if k] + [question for _, _, question in rows],
+        )
+
+    def merged_snapshot(self, existing_ids, built_at):
+        """把增量段折叠进新的主索引，同时去掉数据库中已不存在的记录
+
+        返回的索引在本进程内存中，只用于写入新快照，写入后以内存映射的方式重新加载。
+        """
+        keep = np.isin(self.main.row_ids, existing_ids)
+        keep[self.masked_rows] = False
+        delta_keep = np.isin(self.delta_ids, existing_ids)
+        bm25_matrix = None
+        if self.main.bm25_matrix is not None:
+            bm25_matrix = sp.vstack([self.main.bm25_matrix[keep], self.delta_bm25[delta_keep]]).tocsr()
+        questions = None
+        if self.main.questions is not None:
+            questions = self.main.questions.take(np.flatnonzero(keep)).extend(
+                q for q, k in zip(self.delta_questions, delta_keep) if k)
+        main = TfidfIndex(
+            self.main.vocabulary,
+            self.main.idf,
+            sp.vstack([self.main.matrix[keep], self.delta_matrix[delta_keep]]).tocsr(),
+            np.concatenate([self.main.row_ids[keep], self.delta_ids[delta_keep]]),
+            built_at=built_at,
+            bm25_matrix=bm25_matrix,
+            bm25_idf=self.main.bm25_idf,
+            bm25_params=self.main.bm25_params,
+            questions=questions,
+            lexicon_version=self.main.lexicon_version,
+        )
+        return main
+
+    def _delta_scores(self, queries, mode):
+        """增量段得分，queries 为一行或多行查询向量，BM25得分按各查询的上界缩放"""
+        if mode == 'bm25':
+            bounds = self.main.bm25_upper_bounds(queries)
+            return (sp.diags(1 / bounds) @ (queries @ self.delta_bm25.T)).tocsr()
+        return (queries @ self.delta_matrix.T).tocsr()
+
+    def search(self, tokens, top_k=5, mode='tfidf'):
+        """在主索引和增量段上检索，返回最相似的 top_k 个问答id及相似度"""
+        query_vec = self.main.query_vector(tokens, mode)
+        if query_vec.nnz == 0:
+            return [], []
+        similarities = self.main.score(query_vec, mode)
+        similarities[self.masked_rows] = -1.0
+        row_ids = self.main.row_ids
+        if len(self.delta_ids):
+            similarities = np.concatenate([similarities, self._delta_scores(query_vec, mode).toarray().ravel()])
+            row_ids = np.concatenate([row_ids, self.delta_ids])
+        return top_k_results(similarities, row_ids, top_k)
+
+    def rerank(self, tokens, qa_ids, top_k=5, mode='tfidf'):
+        """只对候选问答打分，返回其中最相似的 top_k 个问答id及相似度"""
+        return self.rerank_batch([tokens], [qa_ids], top_k=top_k, mode=mode)[0]
+
+    def rerank_batch(self, token_lists, candidate_lists, top_k=5, mode='tfidf'):
+        """批量重排：全部查询堆叠成一个稀疏矩阵，与各查询候选的并集做一次稀疏矩阵乘法
+
+        每个查询只取自己候选上的得分，返回与 token_lists 一一对应的 (问答id列表, 相似度) 列表。
+        """
+        if not token_lists:
+            return []
+        candidate_lists = [np.unique(np.asarray(qa_ids, dtype=np.int64)) for qa_ids in candidate_lists]
+        union = np.unique(np.concatenate(candidate_lists))
+        queries = sp.vstack([self.main.query_vector(tokens, mode) for tokens in token_lists]).tocsr()
+
+        in_delta = np.isin(union, self.delta_ids)
+        rows, row_ids = self.main.rows_for(union[~in_delta])
+        keep = ~np.isin(row_ids, self.masked_ids)
+        rows, row_ids = rows[keep], row_ids[keep]
+        matrix = self.main.bm25_matrix if mode == 'bm25' else self.main.matrix
+        scores = queries @ matrix[rows].T
+        if mode == 'bm25':
+            scores = sp.diags(1 / self.main.bm25_upper_bounds(queries)) @ scores
+        delta_rows = np.flatnonzero(np.isin(self.delta_ids, union))
+        if len(delta_rows):
+            scores = sp.hstack([scores, self._delta_scores(queries, mode)[:, delta_rows]])
+            row_ids = np.concatenate([row_ids, self.delta_ids[delta_rows]])
+        scores = sp.csr_matrix(scores)
+
+        results = []
+        for i, qa_ids in enumerate(candidate_lists):
+            if queries.indptr[i] == queries.indptr[i + 1] or len(qa_ids) == 0:
+                results.append(([], []))
+                continue
+            columns = np.flatnonzero(np.isin(row_ids, qa_ids))
+            similarities = scores[i].toarray().ravel()[columns]
+            results.append(top_k_results(similarities, row_ids[columns], top_k))
+        return results
+
+    def ann_candidates(self, ann_index, tokens, limit=300, n_probe=8):
+        """ANN召回：LSA向量上最接近的 limit 个问答id
+
+        ANN快照只覆盖构建时的记录，候选之后再加上增量段以及之后合并进主索引的记录，
+        由重排统一打分；已删除或已被增量段覆盖的记录在重排时被屏蔽。
+        """
+        query_vec = self.main.transform(tokens)
+        if query_vec.nnz == 0:
+            return []
+        candidates, _ = ann_index.search(query_vec, top_k=limit, n_probe=n_probe)
+        return np.concatenate([np.asarray(candidates, dtype=np.int64), self.delta_ids,
+                               ann_index.missing_ids(self.main.row_ids)]).tolist()
+
+    def question(self, qa_id):
+        """取出检索结果对应的问题原文，增量段优先"""
+        rows = np.flatnonzero(self.delta_ids == qa_id)
+        if len(rows):
+            return self.delta_questions[rows[-1]]
+        return self.main.question(qa_id)
+
+    def __len__(self):
+        return len(self.main) - len(self.masked_rows) + len(self.delta_ids)
+
+
+class IndexUpdater(threading.Thread):
+    """后台索引更新线程
+
+    每隔 SEARCH_DELTA_POLL_SECONDS 秒按 updated_at 拉取变更的问答、按删除记录拉取
+    删除的问答，写入各索引的增量段；增量段超过 SEARCH_DELTA_MERGE_ROWS 条或存在超过
+    SEARCH_DELTA_MERGE_SECONDS 秒时合并成新的主索引快照。其他进程写入新快照后，
+    本进程在下一次拉取时换上新快照。医疗词典更新后的重建快照由 compile_lexicon 完成，见 sync_lexicon。
+    """
+
+    def __init__(self):
+        super().__init__(name='index-updater', daemon=True)
+        self.processor = get_data_processor()
+        self.watermark = timezone.now()
+        # 与 watermark 时间相同、已经处理过的记录id
+        self.boundary_ids = set()
+        # 删除记录的拉取进度，含义同上
+        self.deleted_watermark = self.watermark
+        self.deleted_boundary_ids = set()
+        self.last_merge = time.monotonic()
+        # 本进程关键词索引所对应的快照词典版本
+        self.lexicon_versions = indexed_lexicon_versions()
+        self.lock = threading.Lock()
+
+    def rewind(self, since):
+        """把拉取起点回退到 since，之后的变更和删除会重新写入增量段"""
+        with self.lock:
+            if since is not None and since < self.watermark:
+                self.watermark = since
+                self.boundary_ids = set()
+            if since is not None and since < self.deleted_watermark:
+                self.deleted_watermark = since
+                self.deleted_boundary_ids = set()
+
+    def run(self):
+        while True:
+            time.sleep(settings.SEARCH_DELTA_POLL_SECONDS)
+            try:
+                self.reload_if_replaced()
+                self.sync_lexicon()
+                self.poll()
+                if self.should_merge():
+                    self.merge()
+            except Exception as e:
+                print(f"更新检索索引时发生错误：{str(e)}")
+            finally:
+                close_old_connections()
+
+    def poll(self):
+        """拉取 watermark 之后更新和删除的记录"""
+        with self.lock:
+            watermark, boundary_ids = self.watermark, self.boundary_ids
+            deleted_watermark, deleted_boundary_ids = self.deleted_watermark, self.deleted_boundary_ids
+        rows = [row for row in (MedicalQA.objects
+                                .filter(updated_at__gte=watermark)
+                                .order_by('updated_at')
+                                .values_list(*CHANGE_FIELDS))
+                if not (row[5] == watermark and row[0] in boundary_ids)]
+        deletions = [row for row in (MedicalQADeletion.objects
+                                     .filter(deleted_at__gte=deleted_watermark)
+                                     .order_by('deleted_at')
+                                     .values_list('id', 'qa_id', 'deleted_at'))
+                     if not (row[2] == deleted_watermark and row[0] in deleted_boundary_ids)]
+        if not rows and not deletions:
+            return
+
+        apply_changes(rows, self.processor, removed_ids=[row[1] for row in deletions])
+        with self.lock:
+            self.watermark, self.boundary_ids = _advance(self.watermark, self.boundary_ids, rows, 5)
+            self.deleted_watermark, self.deleted_boundary_ids = _advance(
+                self.deleted_watermark, self.deleted_boundary_ids, deletions, 2)
+
+    def install(self, main):
+        """换上新的主索引快照：先补上快照构建之后的变更和删除，再整体替换"""
+        global _live_index
+        live = LiveTfidfIndex(main)
+        if main.built_at is not None:
+            rows, removed_ids = changes_since(main.built_at)
+            live = live.with_changes(_token_rows(rows, self.processor), removed_ids)
+        with _live_index_lock:
+            _live_index = live
+        # 补写期间通过信号写入旧实例的变更由下一次拉取补上
+        self.rewind(main.built_at)
+        self.last_merge = time.monotonic()
+
+    def reload_if_replaced(self):
+        """磁盘上的快照已被替换（其他进程合并或重新执行 build_search_index）时换上新快照"""
+        index = _live_index
+        if index is None or index.main.version is None:
+            return
+        version = snapshot_version(settings.SEARCH_INDEX_DIR)
+        if version is None or version == index.main.version:
+            return
+        self.install(reload_tfidf_index())
+        rebuild_keyword_index()
+        clear_answer_cache()
+        print(f"已换上新的检索索引快照，共 {len(_live_index)} 条记录")
+
+    def sync_lexicon(self):
+        """其他进程按新词典重建快照后，重建本进程的关键词索引并清空答案缓存
+
+        重新分词和重建快照由 compile_lexicon 命令离线完成（见 resegment_all），
+        主索引快照由 reload_if_replaced 换上，这里只处理随词典版本变化的进程内状态。
+        """
+        versions = indexed_lexicon_versions()
+        if versions != self.lexicon_versions:
+            self.lexicon_versions = versions
+            rebuild_keyword_index()
+            clear_answer_cache()
+
+    def should_merge(self):
+        index = _live_index
+        delta_size = max(len(index.delta_ids) + len(index.masked_ids) if index else 0,
+                         keyword_delta_size())
+        if delta_size == 0:
+            return False
+        return (delta_size >= settings.SEARCH_DELTA_MERGE_ROWS
+                or time.monotonic() - self.last_merge >= settings.SEARCH_DELTA_MERGE_SECONDS)
+
+    def merge(self):
+        """把增量段合并成新的主索引快照，写入磁盘后以内存映射重新加载并原子替换
+
+        多个工作进程时只有拿到合并锁的进程合并，其他进程随后发现快照被替换并重新加载，
+        各进程仍共享同一份快照的页缓存。按科室分片检索时从数据库重建各科室分片，
+        分片工作进程在下一次查询时换上新快照。
+        """
+        if _live_index is not None or settings.SEARCH_SHARDED:
+            with merge_lock() as acquired:
+                if not acquired:
+                    return
+                # 其他进程可能刚写入新快照，先换上它再合并，不能用旧实例覆盖
+                self.reload_if_replaced()
+                built_at = timezone.now()
+                # 先拉取最新的变更；built_at 之后的变更在换上新快照时补上
+                self.poll()
+                if _live_index is not None:
+                    existing_ids = np.fromiter(
+                        MedicalQA.objects.values_list('id', flat=True).iterator(chunk_size=10000), dtype=np.int64)
+                    # 合并和写入快照不持有 _live_index_lock，期间检索照常使用旧实例
+                    _live_index.merged_snapshot(existing_ids, built_at).save(settings.SEARCH_INDEX_DIR)
+                    self.install(reload_tfidf_index())
+                if settings.SEARCH_SHARDED:
+                    from .shard_search import get_shard_searcher
+                    get_shard_searcher(self.processor).rebuild()
+                # 新快照已不含 built_at 之前删除的记录
+                MedicalQADeletion.objects.filter(deleted_at__lt=built_at).delete()
+        rebuild_keyword_index()
+        clear_answer_cache()
+        self.last_merge = time.monotonic()
+        print(f"检索索引增量合并完成，共 {len(_live_index) if _live_index else 0} 条记录")
+
+
+def _advance(watermark, boundary_ids, rows, column):
+    """处理完 rows 后的拉取进度：最新的时间，以及与之时间相同、已处理过的记录id"""
+    if not rows:
+        return watermark, boundary_ids
+    latest = rows[-1][column]
+    if latest > watermark:
+        watermark, boundary_ids = latest, set()
+    return watermark, boundary_ids | {row[0] for row in rows if row[column] == latest}
+
+
+def indexed_lexicon_versions():
+    """正在使用的快照（主索引或各科室分片）构建时的词典版本集合，旧快照不计入"""
+    if settings.SEARCH_SHARDED:
+        from .shard_search import shard_path
+        paths = [shard_path(department) for department in get_data_processor().departments.values()]
+    else:
+        paths = [settings.SEARCH_INDEX_DIR]
+    return {snapshot_lexicon_version(path) for path in paths} - {None}
+
+
+def resegment_all(processor):
+    """用当前词典重新分词全部问答并重建快照，返回更新的记录数；没拿到合并锁时返回None
+
+    在 compile_lexicon 等离线进程中执行，工作进程的后台线程随后换上新快照。
+    重新分词期间持有合并锁，其他进程不会用旧分词结果合并快照。
+    """
+    with merge_lock() as acquired:
+        if not acquired:
+            return None
+        built_at = timezone.now()
+        total_updated = 0
+        for total_updated in processor.resegment(MedicalQA.objects.all()):
+            pass
+        rebuild_snapshots(processor)
+        MedicalQADeletion.objects.filter(deleted_at__lt=built_at).delete()
+    return total_updated
+
+
+def rebuild_snapshots(processor):
+    """从数据库重建主索引快照（存在时连同ANN快照）或各科室分片"""
+    if snapshot_version(settings.SEARCH_INDEX_DIR) is not None:
+        index = TfidfIndex.build_from_database(processor, k1=settings.BM25_K1, b=settings.BM25_B)
+        index.save(settings.SEARCH_INDEX_DIR)
+        if snapshot_version(settings.ANN_INDEX_DIR) is not None:
+            from .ann_index import LsaIvfIndex
+            previous = LsaIvfIndex.load(settings.ANN_INDEX_DIR)
+            LsaIvfIndex.fit(index, n_components=previous.components.shape[0],
+                            n_lists=previous.n_lists).save(settings.ANN_INDEX_DIR)
+    if settings.SEARCH_SHARDED:
+        from .shard_search import get_shard_searcher
+        get_shard_searcher(processor).rebuild()
+
+
+@contextmanager
+def merge_lock():
+    """跨进程的合并锁：独占创建锁文件，拿到时为True，同一时间只有一个进程写入快照"""
+    index_dir = Path(settings.SEARCH_INDEX_DIR)
+    path = index_dir.with_name(index_dir.name + '.lock')
+    try:
+        # 持有锁的进程异常退出后遗留的锁文件
+        if time.time() - path.stat().st_mtime > MERGE_LOCK_STALE_SECONDS:
+            path.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def changes_since(since):
+    """since 之后更新的问答（CHANGE_FIELDS）和删除的问答id"""
+    rows = list(MedicalQA.objects.filter(updated_at__gte=since).values_list(*CHANGE_FIELDS))
+    removed_ids = list(MedicalQADeletion.objects.filter(deleted_at__gte=since).values_list('qa_id', flat=True))
+    return rows, removed_ids
+
+
+def _token_rows(rows, processor):
+    """CHANGE_FIELDS 行 -> (id, 分词结果, 问题原文)"""
+    return [(row[0], processor.stored_tokens(row[1], row[4]), row[1]) for row in rows]
+
+
+def shard_token_rows(rows, processor):
+    """CHANGE_FIELDS 行 -> (id, 分词结果, 问题原文, 科室)，转发给科室分片"""
+    return [(row[0], processor.stored_tokens(row[1], row[4]), row[1], row[6]) for row in rows]
+
+
+def apply_changes(rows, processor, removed_ids=()):
+    """把变更写入关键词索引、TF-IDF索引和科室分片的增量段
+
+    rows 为 CHANGE_FIELDS 对应的 (id, question, keywords, created_at, tokens, updated_at, department) 序列。
+    """
+    global _live_index
+    rows = list(rows)
+    # 语料变化后缓存的答案可能已经过时
+    clear_answer_cache()
+    apply_keyword_changes([(row[0], row[2], row[3]) for row in rows], removed_ids)
+    if settings.SEARCH_SHARDED:
+        from .shard_search import forward_shard_changes
+        forward_shard_changes(shard_token_rows(rows, processor), removed_ids)
+    if _live_index is None:
+        return
+    tokens = _token_rows(rows, processor)
+    with _live_index_lock:
+        if _live_index is not None:
+            _live_index = _live_index.with_changes(tokens, removed_ids)
+
+
+def notify_changed(instance):
+    """问答保存后立即写入增量段，不必等待下一次拉取"""
+    if _updater is not None:
+        apply_changes([(instance.id, instance.question, instance.keywords, instance.created_at, instance.tokens,
+                        instance.updated_at, instance.department)], _updater.processor)
+
+
+def notify_deleted(qa_id):
+    """问答删除后立即从各索引中屏蔽"""
+    if _updater is not None:
+        apply_changes([], _updater.processor, removed_ids=[qa_id])
+
+
+# 拉取变更时读取的字段
+CHANGE_FIELDS = ('id', 'question', 'keywords', 'created_at', 'tokens', 'updated_at', 'department')
+# 合并锁文件超过这么多秒仍存在，视为持有锁的进程已异常退出
+MERGE_LOCK_STALE_SECONDS = 3600
+
+# 进程级实例
+_live_index = None
+_live_index_lock = threading.Lock()
+_updater = None
+# 启动后台线程的进程，fork出的子进程里没有这个线程，需要重新启动
+_updater_pid = None
+_updater_lock = threading.Lock()
+# 后台线程首次拉取的起点，None 表示从线程启动时开始
+_resume_from = None
+# 为True时不启动后台线程，见 suspend_index_updater
+_updater_suspended = False
+
+
+@contextmanager
+def suspend_index_updater():
+    """在此期间加载索引不启动后台线程
+
+    启动预热在fork出工作进程之前进行，线程不会被子进程继承，父进程里的线程
+    还可能在fork时持有锁，因此线程推迟到各工作进程首次使用索引时再启动。
+    """
+    global _updater_suspended
+    _updater_suspended = True
+    try:
+        yield
+    finally:
+        _updater_suspended = False
+
+
+def start_index_updater():
+    """启动后台索引更新线程（每个进程一个），暂停期间返回None"""
+    global _updater, _updater_pid
+    if _updater_suspended:
+        return None
+    if _updater is None or _updater_pid != os.getpid():
+        with _updater_lock:
+            if _updater is None or _updater_pid != os.getpid():
+                previous = _updater
+                _updater = IndexUpdater()
+                # fork出的子进程从父进程的拉取进度继续
+                since = previous.watermark if previous is not None else _resume_from
+                if since is not None:
+                    _updater.rewind(since)
+                _updater_pid = os.getpid()
+                _updater.start()
+    return _updater
+
+
+def rewind_index_updater(since):
+    """把后台线程的拉取起点回退到 since，线程尚未启动时在启动后生效"""
+    global _resume_from
+    if since is None:
+        return
+    if _resume_from is None or since < _resume_from:
+        _resume_from = since
+    updater = start_index_updater()
+    if updater is not None:
+        updater.rewind(since)
+
+
+def get_live_index(processor, build=False):
+    """获取带增量段的TF-IDF索引，build 的含义见 get_tfidf_index"""
+    global _live_index
+    if _live_index is None:
+        with _live_index_lock:
+            if _live_index is None:
+                main = get_tfidf_index(processor, build=build)
+                _live_index = LiveTfidfIndex(main)
+                # 快照构建之后的变更需要补进增量段
+                rewind_index_updater(main.built_at)
+    return _live_index
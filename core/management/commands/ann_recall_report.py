@@ -0,0 +1,71 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import MedicalQA
+from core.data_processor import DataProcessor
+from core.search_index import get_tfidf_index
+from core.ann_index import get_ann_index
+
+class Command(BaseCommand):
+    help = '对比ANN检索与精确TF-IDF检索的召回率和延迟，用于选择 ANN_N_PROBE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='抽样查询数量')
+        parser.add_argument('--top-k', type=int, default=10, help='计算 recall@k 的k值')
+        parser.add_argument('--n-probe', default='1,2,4,8,16,32',
+                            help='逗号分隔的待评估桶数')
+        parser.add_argument('--seed', type=int, default=42, help='抽样随机种子')
+
+    def handle(self, *args, **options):
+        processor = DataProcessor()
+        index = get_tfidf_index(processor, build=True)
+        ann_index = get_ann_index(index)
+        if ann_index is None:
+            self.stdout.write(self.style.ERROR('ANN索引快照不存在，请先运行 build_search_index --ann'))
+            return
+        top_k = options['top_k']
+
+        # 从语料中随机抽取问题作为查询
+        rng = np.random.default_rng(options['seed'])
+        sample_ids = rng.choice(index.row_ids, size=min(options['queries'], len(index)), replace=False)
+        rows = MedicalQA.objects.filter(id__in=sample_ids.tolist()).values_list('question', 'tokens')
+        queries = [processor.stored_tokens(question, tokens) for question, tokens in rows]
+        queries = [tokens for tokens in queries if index.transform(tokens).nnz > 0]
+        if not queries:
+            self.stdout.write(self.style.ERROR('没有可用的查询'))
+            return
+
+        # 精确检索作为基准
+        exact_results = []
+        exact_latencies = []
+        for tokens in queries:
+            start = time.perf_counter()
+            qa_ids, _ = index.search(tokens, top_k=top_k)
+            exact_latencies.append(time.perf_counter() - start)
+            exact_results.append(set(qa_ids))
+
+        self.stdout.write(
+            f'记录数 {len(index)}，查询数 {len(queries)}，'
+            f'{ann_index.components.shape[0]} 维，{ann_index.n_lists} 个桶'
+        )
+        self.stdout.write(f'{"模式":<12}{"recall@" + str(top_k):>12}{"p50(ms)":>12}{"p99(ms)":>12}')
+        self.stdout.write(self._format_row('exact', 1.0, exact_latencies))
+
+        for n_probe in [int(n) for n in options['n_probe'].split(',') if n.strip()]:
+            recalls = []
+            latencies = []
+            for tokens, expected in zip(queries, exact_results):
+                start = time.perf_counter()
+                qa_ids, _ = ann_index.search(index.transform(tokens), top_k=top_k, n_probe=n_probe)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(expected.intersection(qa_ids)) / max(len(expected), 1))
+            self.stdout.write(self._format_row(f'n_probe={n_probe}', np.mean(recalls), latencies))
+
+        self.stdout.write(self.style.SUCCESS(f'当前配置 ANN_N_PROBE={settings.ANN_N_PROBE}'))
+
+    @staticmethod
+    def _format_row(name, recall, latencies):
+        latencies_ms = np.asarray(latencies) * 1000
+        return (f'{name:<12}{recall:>12.3f}'
+                f'{np.percentile(latencies_ms, 50):>12.3f}{np.percentile(latencies_ms, 99):>12.3f}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from core.data_processor import DataProcessor
+from core.models import MedicalQA
+
+class Command(BaseCommand):
+    help = '为尚未保存分词结果的医疗问答补写 tokens 和 keywords 字段'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批更新的记录数')
+        parser.add_argument('--all', action='store_true',
+                            help='重新分词全部记录（修改停用词表后使用，词典更新由 compile_lexicon 处理）')
+
+    def handle(self, *args, **options):
+        processor = DataProcessor()
+        queryset = MedicalQA.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(tokens='')
+
+        total_updated = 0
+        for total_updated in processor.resegment(queryset, batch_size=options['batch_size']):
+            self.stdout.write(f'已更新 {total_updated} 条记录')
+
+        self.stdout.write(self.style.SUCCESS(f'分词结果补写完成，共 {total_updated} 条记录'))
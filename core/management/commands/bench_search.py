@@ -0,0 +1,55 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from core.models import MedicalQA
+from core.data_processor import DataProcessor
+from core.search_index import get_tfidf_index, top_k_results
+
+class Command(BaseCommand):
+    help = '对比TF-IDF全排序、TF-IDF argpartition 和 BM25 argpartition 三种检索路径的延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='抽样查询数量')
+        parser.add_argument('--top-k', type=int, default=1, help='每个查询返回的结果数')
+        parser.add_argument('--seed', type=int, default=42, help='抽样随机种子')
+
+    def handle(self, *args, **options):
+        processor = DataProcessor()
+        index = get_tfidf_index(processor, build=True)
+        if index.bm25_matrix is None:
+            self.stdout.write(self.style.ERROR('索引快照中没有BM25矩阵，请重新运行 build_search_index'))
+            return
+        top_k = options['top_k']
+
+        rng = np.random.default_rng(options['seed'])
+        sample_ids = rng.choice(index.row_ids, size=min(options['queries'], len(index)), replace=False)
+        rows = MedicalQA.objects.filter(id__in=sample_ids.tolist()).values_list('question', 'tokens')
+        queries = [processor.stored_tokens(question, tokens) for question, tokens in rows]
+
+        def argsort_search(tokens):
+            # 改造前的做法：对全部相似度做全排序
+            query_vec = index.transform(tokens)
+            similarities = index.score(query_vec)
+            top_indices = np.argsort(similarities)[-top_k:][::-1]
+            return index.row_ids[top_indices], similarities[top_indices]
+
+        def tfidf_search(tokens):
+            return top_k_results(index.score(index.transform(tokens)), index.row_ids, top_k)
+
+        def bm25_search(tokens):
+            return index.search(tokens, top_k=top_k, mode='bm25')
+
+        self.stdout.write(f'记录数 {len(index)}，查询数 {len(queries)}，top_k={top_k}')
+        self.stdout.write(f'{"检索路径":<24}{"mean(ms)":>12}{"p50(ms)":>12}{"p99(ms)":>12}')
+        for name, search in [('tfidf + argsort', argsort_search),
+                             ('tfidf + argpartition', tfidf_search),
+                             ('bm25 + argpartition', bm25_search)]:
+            latencies = []
+            for tokens in queries:
+                start = time.perf_counter()
+                search(tokens)
+                latencies.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{name:<24}{np.mean(latencies):>12.3f}'
+                f'{np.percentile(latencies, 50):>12.3f}{np.percentile(latencies, 99):>12.3f}'
+            )
@@ -0,0 +1,54 @@
+import os
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.answer_store import decode_answer
+from core.data_processor import DataProcessor
+from core.idf_table import IdfTable
+from core.models import MedicalQA
+from core.nlp_cache import posseg
+
+class Command(BaseCommand):
+    help = '在全部医疗问答的问题和答案上统计IDF，生成关键词提取用的语料IDF表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.KEYWORD_IDF_FILE), help='IDF表文件')
+        parser.add_argument('--min-df', type=int, default=2,
+                            help='至少出现在多少条问答中的词才写入IDF表，其余按未登录词处理')
+
+    def handle(self, *args, **options):
+        processor = DataProcessor()
+        df = Counter()
+        n_docs = 0
+        # 按答案排序，多个问题共用的答案只分词一次
+        rows = (MedicalQA.objects
+                .order_by('answer_ref_id')
+                .values_list('question', 'tokens', 'answer_ref_id',
+                             'answer_ref__content', 'answer_ref__compressed'))
+        last_digest = None
+        answer_words = set()
+        for question, tokens, digest, content, compressed in rows.iterator(chunk_size=2000):
+            if digest != last_digest:
+                # 与关键词提取一样用 jieba.posseg 分词
+                answer_words = {word.strip() for word, _ in posseg(decode_answer(content, compressed))}
+                last_digest = digest
+            # 每条问答（问题 + 答案）算一篇文档
+            words = set(processor.stored_tokens(question, tokens)) | answer_words
+            # 换行用作词表的分隔符，空白词不计入
+            df.update(word for word in words if word and '\n' not in word)
+            n_docs += 1
+            if n_docs % 10000 == 0:
+                self.stdout.write(f'已统计 {n_docs} 条问答')
+
+        if not n_docs:
+            self.stdout.write(self.style.ERROR('数据库中没有问答数据'))
+            return
+
+        df = {word: count for word, count in df.items() if count >= options['min_df']}
+        table = IdfTable.from_document_frequency(df, n_docs)
+        os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+        table.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'IDF表已保存到 {options["output"]}：{n_docs} 条问答，{len(table)} 个词，'
+            f'大小 {os.path.getsize(options["output"]) / 1024:.1f} KB（重启服务后生效）'
+        ))
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.data_processor import DataProcessor
+from core.search_index import TfidfIndex
+from core.ann_index import LsaIvfIndex
+from core.shard_search import shard_path
+
+class Command(BaseCommand):
+    help = '在全部医疗问答上拟合TF-IDF并保存索引快照'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.SEARCH_INDEX_DIR),
+                            help='索引快照保存目录')
+        parser.add_argument('--ann', action='store_true',
+                            help='同时构建LSA向量上的近似最近邻索引')
+        parser.add_argument('--ann-output', default=str(settings.ANN_INDEX_DIR),
+                            help='ANN索引快照保存目录')
+        parser.add_argument('--components', type=int, default=settings.ANN_COMPONENTS,
+                            help='LSA降维后的维数')
+        parser.add_argument('--lists', type=int, default=None,
+                            help='IVF桶数，默认取 sqrt(记录数)')
+        parser.add_argument('--k1', type=float, default=settings.BM25_K1, help='BM25参数k1')
+        parser.add_argument('--b', type=float, default=settings.BM25_B, help='BM25参数b')
+        parser.add_argument('--shards', action='store_true',
+                            help='构建按科室划分的分片快照，而不是全量快照')
+        parser.add_argument('--department', action='append',
+                            help='只重建指定科室的分片，可重复指定')
+
+    def handle(self, *args, **options):
+        processor = DataProcessor()
+
+        if options['shards']:
+            self.build_shards(processor, options['department'] or processor.departments.values(),
+                              k1=options['k1'], b=options['b'])
+            return
+
+        self.stdout.write(self.style.SUCCESS('开始构建TF-IDF索引...'))
+
+        try:
+            index = TfidfIndex.build_from_database(processor, k1=options['k1'], b=options['b'])
+            index.save(options['output'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'索引构建完成：{len(index)} 条记录，{len(index.vocabulary)} 个词，'
+                    f'已保存到 {options["output"]}'
+                )
+            )
+
+            if options['ann']:
+                self.stdout.write(self.style.SUCCESS('开始构建ANN索引...'))
+                ann_index = LsaIvfIndex.fit(index, n_components=options['components'],
+                                            n_lists=options['lists'])
+                ann_index.save(options['ann_output'])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'ANN索引构建完成：{ann_index.components.shape[0]} 维，{ann_index.n_lists} 个桶'
+                    )
+                )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'构建索引时发生错误：{str(e)}')
+            )
+
+    def build_shards(self, processor, departments, **bm25_options):
+        """逐个科室构建分片快照，运行中的检索进程会自动加载新快照"""
+        for department in departments:
+            try:
+                index = TfidfIndex.build_from_database(processor, department=department, **bm25_options)
+                index.save(shard_path(department))
+                self.stdout.write(
+                    self.style.SUCCESS(f'科室分片 {department} 构建完成：{len(index)} 条记录')
+                )
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'构建科室分片 {department} 时发生错误：{str(e)}')
+                )
@@ -0,0 +1,63 @@
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.data_processor import get_data_processor
+from core.lexicon import Lexicon, refresh_lexicon
+from core.live_index import indexed_lexicon_versions, resegment_all
+
+class Command(BaseCommand):
+    help = ('把医疗实体类别文件和jieba用户词典编译为词典快照，并用新词典重新分词全部问题、重建检索索引；'
+            '运行中的服务会自动加载新词典和新快照')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', default=str(settings.LEXICON_RULES_FILE), help='医疗实体类别文件')
+        parser.add_argument('--words', default=str(settings.LEXICON_WORDS_FILE), help='jieba用户词典')
+        parser.add_argument('--output', default=str(settings.LEXICON_SNAPSHOT), help='词典快照文件')
+        parser.add_argument('--no-resegment', action='store_true',
+                            help='只编译词典快照，不重新分词和重建检索索引')
+        parser.add_argument('--lock-timeout', type=float, default=300,
+                            help='等待其他进程合并索引的最长秒数')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            lexicon = Lexicon.compile(options['rules'], options['words'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'编译医疗词典时发生错误：{str(e)}'))
+            return
+        lexicon.save(options['output'])
+        keywords = sum(len(rule['keywords']) for rule in lexicon.rules.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'词典快照 {lexicon.version} 已保存到 {options["output"]}：'
+            f'{len(lexicon.rules)} 个实体类别、{keywords} 个关键词、{len(lexicon.user_words)} 个用户词，'
+            f'耗时 {time.perf_counter() - started:.2f} 秒'
+        ))
+
+        # 只有服务使用的词典快照需要同步重建索引
+        if options['no_resegment'] or Path(options['output']).resolve() != Path(settings.LEXICON_SNAPSHOT).resolve():
+            return
+        self.resegment(options['lock_timeout'])
+
+    def resegment(self, lock_timeout):
+        """用新词典重新分词全部问题并重建检索索引，快照中记录新的词典版本"""
+        lexicon = refresh_lexicon()
+        if not indexed_lexicon_versions() - {lexicon.version}:
+            self.stdout.write('检索索引已是该词典版本构建的，无需重新分词')
+            return
+
+        started = time.perf_counter()
+        deadline = time.monotonic() + lock_timeout
+        while True:
+            total_updated = resegment_all(get_data_processor())
+            if total_updated is not None:
+                break
+            if time.monotonic() >= deadline:
+                self.stdout.write(self.style.ERROR(
+                    '其他进程正在合并检索索引，请稍后执行 compile_lexicon 重新分词'))
+                return
+            time.sleep(1)
+        self.stdout.write(self.style.SUCCESS(
+            f'重新分词完成，共 {total_updated} 条记录，检索索引已重建，'
+            f'耗时 {time.perf_counter() - started:.2f} 秒'
+        ))
@@ -4,16 +4,30 @@ from core.data_processor import DataProcessor
 class Command(BaseCommand):
     help = '从CSV文件导入医疗问答数据到数据库'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dedup', action='store_true',
+                            help='导入前用MinHash/LSH折叠近似重复的问题，同一科室的全部文件一起去重')
+        parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                            help='近似重复判定的Jaccard相似度阈值')
+
     def handle(self, *args, **options):
         processor = DataProcessor()
         
         self.stdout.write(self.style.SUCCESS('开始导入数据...'))
         
         try:
-            total_processed = processor.process_all_data()
+            dedup_threshold = options['dedup_threshold'] if options['dedup'] else None
+            total_processed = processor.process_all_data(dedup_threshold=dedup_threshold)
             self.stdout.write(
                 self.style.SUCCESS(f'成功导入 {total_processed} 条记录')
             )
+            if options['dedup']:
+                stats = processor.dedup_stats
+                self.stdout.write(
+                    f"去重：原始 {stats['rows_before']} 行，折叠 {stats['rows_saved']} 行，"
+                    f"节省约 {stats['db_bytes_saved'] / 1024:.1f} KB 数据、"
+                    f"{stats['index_bytes_saved'] / 1024:.1f} KB 索引"
+                )
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'导入数据时发生错误：{str(e)}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from core.annotation import annotate
+from core.entity_index import index_document
+from core.models import Document
+
+class Command(BaseCommand):
+    help = '为已分析的文档建立实体倒排索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='重建全部文档的索引（修改医疗词典后使用），默认只处理尚未建立索引的文档')
+
+    def handle(self, *args, **options):
+        queryset = Document.objects.order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(entity_postings__isnull=True)
+
+        total_documents = 0
+        total_postings = 0
+        last_id = 0
+        while True:
+            # 按id分批读取，文档正文可能很长
+            batch = list(queryset.filter(id__gt=last_id).only('id', 'content')[:100])
+            if not batch:
+                break
+            for document in batch:
+                total_postings += index_document(document, annotate(document.content))
+            total_documents += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'已处理 {total_documents} 篇文档')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'实体索引建立完成：{total_documents} 篇文档，{total_postings} 条索引记录'))
@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from core.data_processor import DataProcessor
+from core.models import PinnedAnswer
+from core.query_log import read_query_log
+from core.retrieval import find_answer
+
+class Command(BaseCommand):
+    help = '根据查询日志统计最热门的问题，预先检索出答案来源写入固定答案表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=1000, help='固定答案的问题数')
+        parser.add_argument('--days', type=int, default=7, help='只统计最近多少天的查询')
+        parser.add_argument('--min-hits', type=int, default=2, help='查询次数至少达到多少才固定答案')
+        parser.add_argument('--log', default=str(settings.QUERY_LOG_FILE), help='查询日志文件')
+
+    def handle(self, *args, **options):
+        since = (timezone.now() - timedelta(days=options['days'])).isoformat()
+        counts = Counter()
+        examples = {}
+        try:
+            for _, key, question in read_query_log(options['log'], since=since):
+                counts[key] += 1
+                examples[key] = question
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f"查询日志不存在：{options['log']}"))
+            return
+
+        max_length = PinnedAnswer._meta.get_field('key').max_length
+        hot = [(key, hits) for key, hits in counts.most_common()
+               if hits >= options['min_hits'] and len(key) <= max_length][:options['top']]
+        self.stdout.write(f'共 {sum(counts.values())} 次查询、{len(counts)} 个不同问题，'
+                          f'固定其中 {len(hot)} 个')
+
+        processor = DataProcessor()
+        pinned = []
+        for key, hits in hot:
+            question = examples[key]
+            department = key.split('|', 1)[0] or None
+            keywords = processor.extract_keywords(question, topK=5)
+            # 关键词太少或没有找到答案的问题不固定，留给正常检索
+            if len(keywords) < 2:
+                continue
+            qa_id, _, _ = find_answer(processor, processor.process_text(question), keywords,
+                                      departments=[department] if department else None)
+            if qa_id is None:
+                continue
+            # 只记录答案来源，答案正文在响应时取回
+            pinned.append(PinnedAnswer(key=key, question=question, qa_id=qa_id, hits=hits))
+
+        with transaction.atomic():
+            PinnedAnswer.objects.all().delete()
+            PinnedAnswer.objects.bulk_create(pinned, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'已写入 {len(pinned)} 条固定答案'))
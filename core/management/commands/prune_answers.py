@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from core.models import AnswerText
+
+class Command(BaseCommand):
+    help = '删除答案表中已没有问答引用的答案正文'
+
+    def handle(self, *args, **options):
+        deleted, _ = AnswerText.objects.filter(questions__isnull=True).delete()
+        self.stdout.write(self.style.SUCCESS(f'已删除 {deleted} 条无引用的答案'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalqa',
+            name='duplicate_count',
+            field=models.IntegerField(default=1, verbose_name='重复次数'),
+        ),
+    ]
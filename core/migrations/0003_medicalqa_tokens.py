@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_medicalqa_duplicate_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalqa',
+            name='tokens',
+            field=models.TextField(blank=True, default='', verbose_name='分词结果'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_medicalqa_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PinnedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='归一化问题')),
+                ('question', models.TextField(verbose_name='示例问题')),
+                ('answer', models.TextField(verbose_name='答案')),
+                ('hits', models.IntegerField(default=0, verbose_name='查询次数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '固定答案',
+                'verbose_name_plural': '固定答案',
+                'db_table': 'pinned_answers',
+                'ordering': ['-hits'],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from core.answer_store import answer_digest, encode_answer, decode_answer
+
+
+def move_answers(apps, schema_editor):
+    """把每行的答案正文按摘要写入答案表，相同内容只存一份"""
+    MedicalQA = apps.get_model('core', 'MedicalQA')
+    AnswerText = apps.get_model('core', 'AnswerText')
+    last_id = 0
+    while True:
+        batch = list(MedicalQA.objects.filter(id__gt=last_id).order_by('id').only('id', 'answer')[:1000])
+        if not batch:
+            break
+        answers = {}
+        for qa in batch:
+            qa.answer_ref_id = answer_digest(qa.answer)
+            if qa.answer_ref_id not in answers:
+                content, compressed = encode_answer(qa.answer)
+                answers[qa.answer_ref_id] = AnswerText(digest=qa.answer_ref_id, content=content,
+                                                       compressed=compressed)
+        AnswerText.objects.bulk_create(answers.values(), ignore_conflicts=True)
+        MedicalQA.objects.bulk_update(batch, ['answer_ref'])
+        last_id = batch[-1].id
+
+
+def restore_answers(apps, schema_editor):
+    MedicalQA = apps.get_model('core', 'MedicalQA')
+    last_id = 0
+    while True:
+        batch = list(MedicalQA.objects.filter(id__gt=last_id).order_by('id')
+                     .select_related('answer_ref')[:1000])
+        if not batch:
+            break
+        for qa in batch:
+            qa.answer = decode_answer(qa.answer_ref.content, qa.answer_ref.compressed)
+        MedicalQA.objects.bulk_update(batch, ['answer'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_pinnedanswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerText',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='摘要')),
+                ('content', models.BinaryField(verbose_name='内容')),
+                ('compressed', models.BooleanField(default=False, verbose_name='是否压缩')),
+            ],
+            options={
+                'verbose_name': '答案正文',
+                'verbose_name_plural': '答案正文',
+                'db_table': 'answers',
+            },
+        ),
+        migrations.AddField(
+            model_name='medicalqa',
+            name='answer_ref',
+            field=models.ForeignKey(db_column='answer_digest', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='questions', to='core.answertext', verbose_name='答案'),
+        ),
+        migrations.RunPython(move_answers, restore_answers),
+        # 带上默认值，回滚时才能在已有数据的表上重新加回该列
+        migrations.AlterField(
+            model_name='medicalqa',
+            name='answer',
+            field=models.TextField(default='', verbose_name='答案'),
+        ),
+        migrations.RemoveField(
+            model_name='medicalqa',
+            name='answer',
+        ),
+        migrations.AlterField(
+            model_name='medicalqa',
+            name='answer_ref',
+            field=models.ForeignKey(db_column='answer_digest', on_delete=django.db.models.deletion.PROTECT, related_name='questions', to='core.answertext', verbose_name='答案'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_answertext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='annotation',
+            field=models.JSONField(blank=True, default=dict, verbose_name='标注结果'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_document_annotation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentEntity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(max_length=32, verbose_name='实体类别')),
+                ('surface', models.CharField(max_length=100, verbose_name='实体原文')),
+                ('positions', models.JSONField(default=list, verbose_name='出现位置')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entity_postings', to='core.document')),
+            ],
+            options={
+                'verbose_name': '文档实体索引',
+                'verbose_name_plural': '文档实体索引',
+                'db_table': 'document_entities',
+                'indexes': [models.Index(fields=['surface', 'entity_type', 'document'], name='document_entity_lookup')],
+                'constraints': [models.UniqueConstraint(fields=('document', 'entity_type', 'surface'), name='document_entity_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_documententity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicalQADeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qa_id', models.BigIntegerField(verbose_name='问答ID')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='删除时间')),
+            ],
+            options={
+                'verbose_name': '问答删除记录',
+                'verbose_name_plural': '问答删除记录',
+                'db_table': 'medical_qa_deletions',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def delete_pinned_answers(apps, schema_editor):
+    # 旧的固定答案没有记录来源问答，删除后由 pin_hot_queries 重新生成
+    apps.get_model('core', 'PinnedAnswer').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_medicalqadeletion'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_pinned_answers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pinnedanswer',
+            name='answer',
+        ),
+        migrations.AddField(
+            model_name='pinnedanswer',
+            name='qa',
+            field=models.ForeignKey(default=0, on_delete=django.db.models.deletion.CASCADE, related_name='pins', to='core.medicalqa', verbose_name='答案来源'),
+            preserve_default=False,
+        ),
+    ]
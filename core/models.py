@@ -1,12 +1,35 @@
 from django.db import models
+from .answer_store import decode_answer
+
+class AnswerText(models.Model):
+    """答案正文，按内容的SHA-256摘要去重存储，可选zlib压缩"""
+    digest = models.CharField('摘要', max_length=64, primary_key=True)
+    content = models.BinaryField('内容')
+    compressed = models.BooleanField('是否压缩', default=False)
+
+    class Meta:
+        verbose_name = '答案正文'
+        verbose_name_plural = verbose_name
+        db_table = 'answers'
+
+    @property
+    def text(self):
+        return decode_answer(self.content, self.compressed)
+
+    def __str__(self):
+        return self.text[:50]
 
 class MedicalQA(models.Model):
     """医疗问答数据模型"""
     title = models.CharField('标题', max_length=200, default='')
     question = models.TextField('问题')
-    answer = models.TextField('答案')
+    # 内容相同的答案共用答案表中的一行
+    answer_ref = models.ForeignKey(AnswerText, verbose_name='答案', on_delete=models.PROTECT,
+                                   db_column='answer_digest', related_name='questions')
     keywords = models.TextField('关键词')
+    tokens = models.TextField('分词结果', blank=True, default='')  # 去停用词后的分词结果，空格分隔
     department = models.CharField('科室', max_length=50)
+    duplicate_count = models.IntegerField('重复次数', default=1)  # 导入时折叠的近似重复问题数
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
 
@@ -16,6 +39,53 @@ class MedicalQA(models.Model):
         db_table = 'medical_qa'
         ordering = ['-created_at']
 
+    # 新赋值、尚未写入答案表的答案正文
+    pending_answer = None
+
+    @property
+    def answer(self):
+        """答案正文，新赋值的答案在保存时写入答案表"""
+        if self.pending_answer is not None:
+            return self.pending_answer
+        return self.answer_ref.text if self.answer_ref_id else ''
+
+    @answer.setter
+    def answer(self, text):
+        self.pending_answer = text
+
+    def __str__(self):
+        return self.question[:50]
+
+class MedicalQADeletion(models.Model):
+    """问答删除记录，各工作进程的索引更新线程据此屏蔽已删除的问答"""
+    qa_id = models.BigIntegerField('问答ID')
+    deleted_at = models.DateTimeField('删除时间', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = '问答删除记录'
+        verbose_name_plural = verbose_name
+        db_table = 'medical_qa_deletions'
+
+    def __str__(self):
+        return f'{self.qa_id} - {self.deleted_at}'
+
+class PinnedAnswer(models.Model):
+    """热门问题的预计算检索结果，由 pin_hot_queries 命令根据查询日志生成
+
+    只记录检索到的问答，答案正文在响应时按问答id取回，问答被修改后立即生效，被删除时一并删除。
+    """
+    key = models.CharField('归一化问题', max_length=255, unique=True)
+    question = models.TextField('示例问题')
+    qa = models.ForeignKey(MedicalQA, on_delete=models.CASCADE, related_name='pins', verbose_name='答案来源')
+    hits = models.IntegerField('查询次数', default=0)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '固定答案'
+        verbose_name_plural = verbose_name
+        db_table = 'pinned_answers'
+        ordering = ['-hits']
+
     def __str__(self):
         return self.question[:50]
 
@@ -35,6 +105,8 @@ class Document(models.Model):
     keywords = models.TextField('关键词', blank=True)
     entities = models.TextField('实体识别结果', blank=True)
     pos_tags = models.TextField('词性标注结果', blank=True)
+    # 完整的紧凑标注结果（词偏移、词性编号、实体），格式见 Annotation.compact
+    annotation = models.JSONField('标注结果', default=dict, blank=True)
 
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
 
@@ -47,6 +119,30 @@ class Document(models.Model):
     def __str__(self):
         return self.title
 
+class DocumentEntity(models.Model):
+    """实体到文档的倒排索引：每个文档中每个实体（类别 + 原文）一条，记录出现位置"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='entity_postings')
+    entity_type = models.CharField('实体类别', max_length=32)
+    surface = models.CharField('实体原文', max_length=100)
+    # 实体在文档中的字符偏移列表
+    positions = models.JSONField('出现位置', default=list)
+
+    class Meta:
+        verbose_name = '文档实体索引'
+        verbose_name_plural = verbose_name
+        db_table = 'document_entities'
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'entity_type', 'surface'],
+                                    name='document_entity_unique'),
+        ]
+        indexes = [
+            # 按实体原文（可再限定类别）查文档
+            models.Index(fields=['surface', 'entity_type', 'document'], name='document_entity_lookup'),
+        ]
+
+    def __str__(self):
+        return f'{self.surface}[{self.entity_type}] - {self.document_id}'
+
 class AnalysisResult(models.Model):
     """分析结果模型"""
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='analysis_results')
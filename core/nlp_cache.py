@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from django.conf import settings
+import jieba
+import jieba.posseg
+from .lexicon import get_lexicon
+
+
+def text_digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _entry_size(value):
+    """估算一条缓存结果占用的内存字节数"""
+    size = sys.getsizeof(value)
+    for item in value:
+        size += sys.getsizeof(item)
+        if isinstance(item, (tuple, list)):
+            size += sum(sys.getsizeof(part) for part in item)
+    return size
+
+
+class NlpCache:
+    """分词结果缓存：(词典版本, 文本哈希) -> 分词 / 词性标注 / 实体标注结果
+
+    内存层是按字节数淘汰的LRU；配置了 disk_dir 时，较长文本的结果还会写入磁盘层，
+    进程重启或其他进程遇到同一文本时直接读取。键中带有医疗词典版本，重新编译词典
+    并重启后不会读到按旧词典切分的结果。
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0, disk_min_chars=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = str(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_min_chars = disk_min_chars
+        # (类型, 词典版本, 文本哈希) -> (结果, 字节数)，按最近使用排序
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 磁盘层占用的字节数，首次写入时统计
+        self.disk_bytes = None
+
+    def get(self, kind, text, compute, version=''):
+        """返回 compute(text) 的结果，已缓存时直接返回，version 为计算时使用的词典版本"""
+        key = (kind, version, text_digest(text))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        use_disk = self.disk_dir is not None and len(text) >= self.disk_min_chars
+        value = self._disk_read(key) if use_disk else None
+        if value is not None:
+            with self.lock:
+                self.disk_hits += 1
+        else:
+            value = compute(text)
+            with self.lock:
+                self.misses += 1
+            if use_disk:
+                self._disk_write(key, value)
+        self._put(key, value)
+        return value
+
+    def _put(self, key, value):
+        size = _entry_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        kind, version, digest = key
+        return os.path.join(self.disk_dir, kind, version or 'default', digest[:2], f'{digest}.json')
+
+    def _disk_read(self, key):
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取分词缓存文件时发生错误：{str(e)}")
+            return None
+        # JSON 中的 (词, 词性) 元组被读成列表
+        return [tuple(item) if isinstance(item, list) else item for item in value]
+
+    def _disk_write(self, key, value):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+            # 先写临时文件再改名，其他进程不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self.lock:
+                if self.disk_bytes is None:
+                    self.disk_bytes = self._disk_usage()
+                else:
+                    self.disk_bytes += len(data)
+                over = self.disk_bytes > self.disk_max_bytes
+            if over:
+                self._disk_trim()
+        except Exception as e:
+            print(f"写入分词缓存文件时发生错误：{str(e)}")
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._disk_files())
+
+    def _disk_trim(self):
+        """磁盘层超出上限时删除最旧的文件，直到降到上限的90%"""
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self.lock:
+            self.disk_bytes = total
+
+    def clear(self):
+        """词典变化后清空内存层，磁盘层一并删除"""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+        if self.disk_dir is not None:
+            for _, _, path in list(self._disk_files()):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            with self.lock:
+                self.disk_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                'size': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'disk_enabled': self.disk_dir is not None,
+                'disk_bytes': self.disk_bytes,
+            }
+
+
+# 进程级缓存实例
+_nlp_cache = None
+_nlp_cache_lock = threading.Lock()
+
+
+def get_nlp_cache():
+    """获取分词结果缓存"""
+    global _nlp_cache
+    if _nlp_cache is None:
+        with _nlp_cache_lock:
+            if _nlp_cache is None:
+                _nlp_cache = NlpCache(settings.NLP_CACHE_MAX_BYTES,
+                                      disk_dir=settings.NLP_CACHE_DIR,
+                                      disk_max_bytes=settings.NLP_CACHE_DISK_MAX_BYTES,
+                                      disk_min_chars=settings.NLP_CACHE_DISK_MIN_CHARS)
+    return _nlp_cache
+
+
+def clear_nlp_cache():
+    """清空分词结果缓存，缓存尚未创建时忽略"""
+    if _nlp_cache is not None:
+        _nlp_cache.clear()
+
+
+def _cut(text):
+    return list(jieba.cut(text))
+
+
+def _posseg(text):
+    return [(pair.word, pair.flag) for pair in jieba.posseg.cut(text)]
+
+
+def cut(text):
+    """带缓存的 jieba.cut，返回词列表"""
+    # 先确保医疗词典已加入jieba，词典更新时会清空缓存
+    lexicon = get_lexicon()
+    return get_nlp_cache().get('cut', text, _cut, lexicon.version)
+
+
+def posseg(text):
+    """带缓存的 jieba.posseg.cut，返回 (词, 词性) 列表"""
+    lexicon = get_lexicon()
+    return get_nlp_cache().get('pos', text, _posseg, lexicon.version)
+
+
+def entity_tags(words, lexicon):
+    """带缓存的医疗实体标注，返回与 words 一一对应的实体类别"""
+    # 以分词结果为键，结果只取决于分词结果和词典
+    return get_nlp_cache().get('ent', '\n'.join(words), lambda _: lexicon.matcher.tag(words), lexicon.version)
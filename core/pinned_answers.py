@@ -0,0 +1,68 @@
+import threading
+import time
+from django.conf import settings
+from django.db.models import Count, Max
+from .answer_store import fetch_answers
+from .models import PinnedAnswer
+
+# 进程级固定答案表：归一化问题 -> 问答id
+_pinned = None
+_pinned_version = None
+_checked_at = 0.0
+_pinned_lock = threading.Lock()
+
+
+def _table_version():
+    """固定答案表的版本：记录数和最后更新时间，任一变化即需要重新加载"""
+    version = PinnedAnswer.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    return version['count'], version['latest']
+
+
+def _reload():
+    global _pinned, _pinned_version, _checked_at
+    version = _table_version()
+    if version != _pinned_version:
+        _pinned = dict(PinnedAnswer.objects.values_list('key', 'qa_id'))
+        _pinned_version = version
+    _checked_at = time.monotonic()
+
+
+def get_pinned_answers():
+    """获取固定答案表
+
+    首次调用时整表加载到内存，之后每隔 PINNED_ANSWERS_REFRESH_SECONDS 秒检查一次
+    表是否被 pin_hot_queries 更新过。检查由一个请求线程完成，其他线程继续使用旧表。
+    """
+    global _pinned, _checked_at
+    if _pinned is None:
+        with _pinned_lock:
+            if _pinned is None:
+                try:
+                    _reload()
+                    print(f"固定答案表加载完成，共 {len(_pinned)} 条")
+                except Exception as e:
+                    print(f"加载固定答案表时发生错误：{str(e)}")
+                    _pinned = {}
+                    _checked_at = time.monotonic()
+    elif time.monotonic() - _checked_at >= settings.PINNED_ANSWERS_REFRESH_SECONDS:
+        if _pinned_lock.acquire(blocking=False):
+            try:
+                _reload()
+            except Exception as e:
+                print(f"刷新固定答案表时发生错误：{str(e)}")
+                _checked_at = time.monotonic()
+            finally:
+                _pinned_lock.release()
+    return _pinned
+
+
+def fetch_pinned_answers(keys):
+    """按归一化问题取固定答案，返回 归一化问题 -> (问答id, 答案)
+
+    答案正文在这里按问答id一次查询取回，来源问答被修改后立即返回新答案，
+    已被删除的问答不在结果中，调用方按正常流程检索。
+    """
+    pinned = get_pinned_answers()
+    qa_ids = {key: pinned[key] for key in keys if key in pinned}
+    answers = fetch_answers(set(qa_ids.values())) if qa_ids else {}
+    return {key: (qa_id, answers[qa_id]) for key, qa_id in qa_ids.items() if answers.get(qa_id)}
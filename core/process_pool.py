@@ -0,0 +1,21 @@
+import multiprocessing
+import django
+from django.apps import apps
+
+
+def pool_context():
+    """工作进程池的启动方式
+
+    Web进程中有预热、索引更新等后台线程，fork会把这些线程当时持有的锁（日志、jieba、
+    数据库驱动等）原样复制到子进程，子进程可能因此死锁。所以工作进程一律用 forkserver
+    （平台不支持时用 spawn）启动，由各自的初始化函数加载所需数据。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def setup_django():
+    """在工作进程中初始化Django，配置沿用父进程的 DJANGO_SETTINGS_MODULE"""
+    if not apps.ready:
+        django.setup()
@@ -2,7 +2,9 @@ import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
-from .models import SystemStats
+from .models import SystemStats, MedicalQA
+from .data_processor import get_data_processor
+from .search_index import _identity_analyzer
 
 def evaluate_qa_performance(csv_file_path):
     """评估问答系统性能
@@ -20,12 +22,19 @@ def evaluate_qa_performance(csv_file_path):
         if 'ask' not in df.columns or 'answer' not in df.columns:
             raise ValueError('CSV文件必须包含ask和answer列')
             
-        # 初始化TF-IDF向量化器
-        vectorizer = TfidfVectorizer()
+        # 初始化TF-IDF向量化器，输入为分好词的列表
+        vectorizer = TfidfVectorizer(analyzer=_identity_analyzer)
         
         # 预处理文本，确保非空且有效
         questions = df['ask'].astype(str).apply(lambda x: x if len(x.strip()) > 0 else 'empty')
         answers = df['answer'].astype(str).apply(lambda x: x if len(x.strip()) > 0 else 'empty')
+
+        # 问题优先使用入库时保存的分词结果，库中没有的问题和答案现场分词
+        processor = get_data_processor()
+        stored = dict(MedicalQA.objects.filter(question__in=set(questions), tokens__gt='')
+                      .values_list('question', 'tokens'))
+        questions = [processor.stored_tokens(q, stored.get(q, '')) for q in questions]
+        answers = [processor.process_text(a) for a in answers]
         
         # 计算问题和答案的TF-IDF向量
         try:
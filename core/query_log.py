@@ -0,0 +1,93 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+
+class QueryLogWriter(threading.Thread):
+    """查询日志写入线程
+
+    请求线程只把记录放进有界队列，由本线程每隔 QUERY_LOG_FLUSH_SECONDS 秒
+    批量追加到日志文件，写文件不占用请求时间。队列满时丢弃新记录并计数。
+    每行一条记录：时间\\t归一化问题\\t原始问题。
+    """
+
+    def __init__(self, path, max_pending=10000, flush_seconds=1.0):
+        super().__init__(name='query-log-writer', daemon=True)
+        self.path = Path(path)
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+
+    def log(self, key, question):
+        """记录一次查询，不阻塞调用方"""
+        question = ' '.join(str(question).split())
+        try:
+            self.pending.put_nowait(f"{timezone.now().isoformat()}\t{key}\t{question}\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"写入查询日志时发生错误：{str(e)}")
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            # 多个工作进程写同一个文件：一次 O_APPEND 写入整批记录，避免行相互穿插
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, ''.join(lines).encode('utf-8'))
+            finally:
+                os.close(fd)
+
+
+def read_query_log(path, since=None):
+    """读取查询日志，返回 (时间, 归一化问题, 原始问题) 序列，since 为ISO格式的时间下限"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 3:
+                continue
+            if since is not None and parts[0] < since:
+                continue
+            yield tuple(parts)
+
+
+# 进程级写入线程
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_query_log():
+    """获取查询日志写入线程，首次调用时启动"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = QueryLogWriter(settings.QUERY_LOG_FILE, settings.QUERY_LOG_MAX_PENDING,
+                                         settings.QUERY_LOG_FLUSH_SECONDS)
+                _writer.start()
+                # 进程退出时写入队列中剩余的记录
+                atexit.register(_writer.flush)
+    return _writer
+
+
+def log_query(key, question):
+    """记录一条普通问答的查询，QUERY_LOG_ENABLED 关闭时忽略"""
+    if settings.QUERY_LOG_ENABLED:
+        get_query_log().log(key, question)
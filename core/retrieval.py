@@ -0,0 +1,183 @@
+import time
+from django.conf import settings
+from .keyword_index import get_keyword_index
+from .answer_store import fetch_answers
+
+NO_ANSWER = "抱歉，我暂时无法回答这个问题。"
+TOO_FEW_KEYWORDS = "抱歉，您的问题关键词太少，请提供更详细的描述。"
+# 最相似问题的相似度超过该值才作为答案
+SIMILARITY_THRESHOLD = 0.3
+
+# 各阶段耗时的指数滑动平均（毫秒），重排阶段为每个候选的耗时
+_stage_costs = {}
+_COST_SMOOTHING = 0.2
+
+
+def stage_cost(stage):
+    """阶段的预计耗时（毫秒），尚未执行过时为0"""
+    return _stage_costs.get(stage, 0.0)
+
+
+def record_stage_cost(stage, elapsed_ms):
+    previous = _stage_costs.get(stage)
+    _stage_costs[stage] = elapsed_ms if previous is None else previous + _COST_SMOOTHING * (elapsed_ms - previous)
+
+
+class Deadline:
+    """单个请求的时间预算，剩余时间不足以执行某个阶段时跳过该阶段并记录下来"""
+
+    def __init__(self, budget_ms=None):
+        self.started = time.perf_counter()
+        self.budget_ms = budget_ms
+        # 因预算不足而跳过的阶段
+        self.skipped = []
+
+    def remaining_ms(self):
+        if self.budget_ms is None:
+            return float('inf')
+        return self.budget_ms - (time.perf_counter() - self.started) * 1000
+
+    def allows(self, stage, estimate_ms=None):
+        """剩余时间超过该阶段的预计耗时时返回True，否则记为跳过"""
+        if estimate_ms is None:
+            estimate_ms = stage_cost(stage)
+        if self.remaining_ms() > estimate_ms:
+            return True
+        self.skipped.append(stage)
+        # 跳过时让估计值衰减，避免一次偶发的慢执行导致该阶段一直被跳过
+        record_stage_cost(stage, 0.0)
+        return False
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def retrieve(processor, tokens, keywords, top_k=1, departments=None, deadline=None):
+    """两阶段检索：关键词OR召回候选，再只对候选做向量相似度重排
+
+    第一阶段在关键词倒排索引上召回至多 RETRIEVAL_CANDIDATES 个候选，每个关键词
+    最多扫描 RETRIEVAL_POSTING_BUDGET 条倒排记录；SIMILAR_SEARCH_MODE 为 'ann' 时
+    改为在LSA向量上做近似最近邻召回。第二阶段只对这些候选计算TF-IDF或BM25相似度。
+    settings.SEARCH_SHARDED 开启时直接在科室分片上检索。
+
+    传入 deadline 时按剩余预算降级：预算只够重排部分候选时只重排召回排名靠前的
+    候选；连 RETRIEVAL_MIN_RERANK 个候选都不够时跳过重排，只给召回排名前 top_k 的
+    候选打分，调用方仍按相似度阈值取舍。
+    返回 (问答id列表, 相似度, 各阶段耗时及候选数)。
+    """
+    deadline = deadline or Deadline()
+    mode = 'bm25' if settings.SIMILAR_SEARCH_MODE == 'bm25' else 'tfidf'
+    timings = {}
+
+    if settings.SEARCH_SHARDED:
+        if not deadline.allows('shard_search'):
+            return [], [], timings
+        from .shard_search import get_shard_searcher
+        started = time.perf_counter()
+        qa_ids, similarities = get_shard_searcher(processor).search(
+            tokens, top_k=top_k, departments=departments, mode=mode)
+        timings['shard_search_ms'] = _elapsed_ms(started)
+        record_stage_cost('shard_search', timings['shard_search_ms'])
+        return qa_ids, similarities, timings
+
+    live_index = _live_index(processor)
+    if live_index is None:
+        return [], [], timings
+
+    # 召回代价很小，总是执行
+    started = time.perf_counter()
+    candidates = _recall(live_index, tokens, keywords)
+    timings['recall_ms'] = _elapsed_ms(started)
+    timings['candidates'] = len(candidates)
+    record_stage_cost('recall', timings['recall_ms'])
+    if not candidates:
+        return [], [], timings
+
+    # 按每个候选的平均重排耗时估计剩余预算能重排多少个候选
+    per_candidate = stage_cost('rerank')
+    if per_candidate > 0 and deadline.budget_ms is not None:
+        affordable = int(max(deadline.remaining_ms(), 0) / per_candidate)
+        if affordable < min(settings.RETRIEVAL_MIN_RERANK, len(candidates)):
+            deadline.skipped.append('rerank')
+            record_stage_cost('rerank', 0.0)
+            candidates = candidates[:top_k]
+        else:
+            candidates = candidates[:affordable]
+
+    started = time.perf_counter()
+    qa_ids, similarities = live_index.rerank(tokens, candidates, top_k=top_k, mode=mode)
+    timings['rerank_ms'] = _elapsed_ms(started)
+    timings['reranked'] = len(candidates)
+    if 'rerank' not in deadline.skipped:
+        record_stage_cost('rerank', timings['rerank_ms'] / len(candidates))
+    return qa_ids, similarities, timings
+
+
+def _recall(live_index, tokens, keywords):
+    """第一阶段：召回候选问答id，ANN模式下ANN快照不可用时退回关键词召回"""
+    if settings.SIMILAR_SEARCH_MODE == 'ann':
+        from .ann_index import get_ann_index
+        ann_index = get_ann_index(live_index.main)
+        if ann_index is not None:
+            return live_index.ann_candidates(ann_index, tokens, limit=settings.RETRIEVAL_CANDIDATES,
+                                             n_probe=settings.ANN_N_PROBE)
+    return get_keyword_index().recall(keywords, limit=settings.RETRIEVAL_CANDIDATES,
+                                      posting_budget=settings.RETRIEVAL_POSTING_BUDGET)
+
+
+def _live_index(processor):
+    from .live_index import get_live_index
+    try:
+        return get_live_index(processor)
+    except FileNotFoundError as e:
+        # 索引快照由 build_search_index 或启动预热生成，不在请求中构建
+        print(str(e))
+        return None
+
+
+def _best(qa_ids, similarities):
+    """取最相似的结果，相似度不超过 SIMILARITY_THRESHOLD 时视为没有答案"""
+    if len(qa_ids) > 0 and similarities[0] > SIMILARITY_THRESHOLD:
+        return qa_ids[0], float(similarities[0])
+    return None, None
+
+
+def find_answer(processor, tokens, keywords, departments=None, deadline=None):
+    """两阶段检索出最相似的问题，返回 (问答id, 相似度, 各阶段耗时)，没有答案时问答id为None"""
+    qa_ids, similarities, timings = retrieve(processor, tokens, keywords, top_k=1,
+                                             departments=departments, deadline=deadline)
+    return (*_best(qa_ids, similarities), timings)
+
+
+def find_answers(processor, token_lists, keyword_lists, departments=None):
+    """批量版的 find_answer，返回与输入一一对应的 (问答id, 相似度) 列表
+
+    各问题分别召回候选，第二阶段把全部查询堆叠起来，在候选的并集上做一次稀疏矩阵乘法。
+    按科室分片检索时逐个问题发往分片。
+    """
+    if not token_lists:
+        return []
+    if settings.SEARCH_SHARDED:
+        return [find_answer(processor, tokens, keywords, departments=departments)[:2]
+                for tokens, keywords in zip(token_lists, keyword_lists)]
+    live_index = _live_index(processor)
+    if live_index is None:
+        return [(None, None) for _ in token_lists]
+    candidate_lists = [_recall(live_index, tokens, keywords)
+                       for tokens, keywords in zip(token_lists, keyword_lists)]
+    mode = 'bm25' if settings.SIMILAR_SEARCH_MODE == 'bm25' else 'tfidf'
+    results = live_index.rerank_batch(token_lists, candidate_lists, top_k=1, mode=mode)
+    return [_best(qa_ids, similarities) for qa_ids, similarities in results]
+
+
+def answer_question(processor, tokens, keywords, departments=None, deadline=None):
+    """普通问答：两阶段检索出最相似的问题并取回其答案，返回 (答案, 各阶段耗时)"""
+    if len(keywords) < 2:
+        return TOO_FEW_KEYWORDS, {}
+    qa_id, _, timings = find_answer(processor, tokens, keywords, departments=departments, deadline=deadline)
+    if qa_id is not None:
+        answer = fetch_answers([qa_id]).get(qa_id)
+        if answer:
+            return answer, timings
+    return NO_ANSWER, timings
@@ -0,0 +1,397 @@
+import hashlib
+import json
+from datetime import datetime
+import os
+import shutil
+import threading
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from django.utils import timezone
+from .lexicon import get_lexicon
+from .models import MedicalQA
+
+
+def _identity_analyzer(tokens):
+    """文档已经是分好词的列表，去掉空白词后直接返回"""
+    return [token for token in tokens if token.strip()]
+
+
+def top_k_results(similarities, row_ids, top_k):
+    """从相似度数组中取出最大的 top_k 个，返回对应的id及相似度
+
+    先用 argpartition 在线性时间内选出 top_k 个，再只对这 top_k 个排序，
+    避免对整个相似度数组做全排序。
+    """
+    if top_k <= 0 or len(similarities) == 0:
+        return [], similarities[:0]
+    if len(similarities) > top_k:
+        top_indices = np.argpartition(-similarities, top_k - 1)[:top_k]
+    else:
+        top_indices = np.arange(len(similarities))
+    top_indices = top_indices[np.argsort(-similarities[top_indices], kind='stable')]
+    return row_ids[top_indices].tolist(), similarities[top_indices]
+
+
+def bm25_weights(counts, idf, k1, b, avgdl):
+    """把词频矩阵转换为BM25权重矩阵，查询得分即权重矩阵与查询词向量的乘积"""
+    counts = sp.csr_matrix(counts, dtype=np.float64)
+    doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+    row_lengths = np.repeat(doc_lengths, np.diff(counts.indptr))
+    tf = counts.data
+    data = idf[counts.indices] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * row_lengths / max(avgdl, 1e-9)))
+    return sp.csr_matrix((data, counts.indices.copy(), counts.indptr.copy()), shape=counts.shape)
+
+
+def _save_csr(path, prefix, matrix):
+    """把CSR矩阵的三个数组分别保存为 .npy 文件，便于只读内存映射"""
+    np.save(path / f'{prefix}_data.npy', matrix.data)
+    np.save(path / f'{prefix}_indices.npy', matrix.indices)
+    np.save(path / f'{prefix}_indptr.npy', matrix.indptr)
+
+
+def _load_csr(path, prefix, shape):
+    """以只读内存映射的方式加载CSR矩阵，数组不会被复制到进程内存"""
+    arrays = tuple(np.load(path / f'{prefix}_{name}.npy', mmap_mode='r')
+                   for name in ('data', 'indices', 'indptr'))
+    return sp.csr_matrix(arrays, shape=tuple(shape), copy=False)
+
+
+class StringPool:
+    """字符串池：全部字符串的UTF-8编码首尾相接存放，offsets[i]:offsets[i+1] 为第i个"""
+
+    DATA_FILE = 'questions.bin'
+    OFFSETS_FILE = 'question_offsets.npy'
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [str(text).encode('utf-8') for text in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def take(self, rows):
+        """按行号取出子集，返回新的字符串池"""
+        return StringPool.from_strings(self[int(i)] for i in rows)
+
+    def extend(self, strings):
+        """返回追加了 strings 的新字符串池"""
+        tail = StringPool.from_strings(strings)
+        return StringPool(np.concatenate([self.data, tail.data]),
+                          np.concatenate([self.offsets, tail.offsets[1:] + self.offsets[-1]]))
+
+    def save(self, path):
+        self.data.tofile(path / self.DATA_FILE)
+        np.save(path / self.OFFSETS_FILE, self.offsets)
+
+    @classmethod
+    def load(cls, path):
+        offsets = np.load(path / cls.OFFSETS_FILE, mmap_mode='r')
+        if offsets[-1] == 0:
+            # 空文件无法内存映射
+            return cls(np.empty(0, dtype=np.uint8), offsets)
+        return cls(np.memmap(path / cls.DATA_FILE, dtype=np.uint8, mode='r'), offsets)
+
+
+class TfidfIndex:
+    """全量问题的TF-IDF索引快照，同时保存预计算的BM25权重矩阵
+
+    快照中的矩阵、行id和问题字符串池都是扁平数组，加载时只读内存映射：
+    同一台机器上的多个Web工作进程共享操作系统页缓存中的同一份数据，
+    进程启动时也不需要把整个索引读入内存。
+    """
+
+    VOCABULARY_FILE = 'vocabulary.json'
+    IDF_FILE = 'idf.npy'
+    MATRIX_PREFIX = 'matrix'
+    ROW_IDS_FILE = 'row_ids.npy'
+    META_FILE = 'meta.json'
+    BM25_MATRIX_PREFIX = 'bm25'
+    BM25_IDF_FILE = 'bm25_idf.npy'
+
+    def __init__(self, vocabulary, idf, matrix, row_ids, built_at=None,
+                 bm25_matrix=None, bm25_idf=None, bm25_params=None, questions=None, lexicon_version=None):
+        # 词 -> 列号
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # 每行已做L2归一化，点积即余弦相似度
+        self.matrix = matrix.tocsr()
+        # 行号 -> MedicalQA的id
+        self.row_ids = row_ids
+        # 构建时间，之后更新的记录需要通过增量段补上
+        self.built_at = built_at
+        # BM25权重矩阵及参数 {'k1', 'b', 'avgdl'}，旧快照中没有时为None
+        self.bm25_matrix = bm25_matrix.tocsr() if bm25_matrix is not None else None
+        self.bm25_idf = bm25_idf
+        self.bm25_params = bm25_params
+        # 行号 -> 问题文本的字符串池，旧快照中没有时为None
+        self.questions = questions
+        # 构建时医疗词典的版本，语料的分词结果与之对应；旧快照中没有时为None
+        self.lexicon_version = lexicon_version
+        # 按问答id排序的行号，首次按id取行时再计算
+        self._id_order = None
+        # 从磁盘加载时快照的版本（见 snapshot_version），内存中构建的索引为None
+        self.version = None
+        self._vocabulary_digest = None
+
+    @classmethod
+    def fit(cls, documents, row_ids, built_at=None, k1=1.2, b=0.75, questions=None, lexicon_version=None):
+        """在分好词的文档上拟合TF-IDF和BM25，questions 为与之对应的问题原文"""
+        from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+        vectorizer = CountVectorizer(analyzer=_identity_analyzer)
+        counts = vectorizer.fit_transform(documents)
+        transformer = TfidfTransformer()
+        matrix = transformer.fit_transform(counts)
+        vocabulary = {term: int(col) for term, col in vectorizer.vocabulary_.items()}
+
+        n_docs = counts.shape[0]
+        doc_freq = np.bincount(counts.indices, minlength=counts.shape[1])
+        bm25_idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avgdl = float(counts.sum()) / max(n_docs, 1)
+        return cls(vocabulary, transformer.idf_.astype(np.float64), matrix,
+                   np.asarray(row_ids, dtype=np.int64), built_at=built_at,
+                   bm25_matrix=bm25_weights(counts, bm25_idf, k1, b, avgdl),
+                   bm25_idf=bm25_idf, bm25_params={'k1': k1, 'b': b, 'avgdl': avgdl},
+                   questions=StringPool.from_strings(questions) if questions is not None else None,
+                   lexicon_version=lexicon_version)
+
+    @classmethod
+    def build_from_database(cls, processor, department=None, **bm25_options):
+        """读取数据库中已分好词的问题拟合索引，指定 department 时只取该科室"""
+        built_at = timezone.now()
+        lexicon_version = get_lexicon().version or None
+        row_ids = []
+        documents = []
+        questions = []
+        queryset = MedicalQA.objects.order_by('id')
+        if department is not None:
+            queryset = queryset.filter(department=department)
+        rows = queryset.values_list('id', 'question', 'tokens').iterator(chunk_size=5000)
+        for qa_id, question, tokens in rows:
+            row_ids.append(qa_id)
+            documents.append(processor.stored_tokens(question, tokens))
+            questions.append(question)
+        return cls.fit(documents, row_ids, built_at=built_at, questions=questions,
+                       lexicon_version=lexicon_version, **bm25_options)
+
+    @property
+    def vocabulary_digest(self):
+        """词表摘要，增量合并不改变词表；ANN快照据此判断是否与当前快照匹配"""
+        if self._vocabulary_digest is None:
+            text = json.dumps(self.vocabulary, ensure_ascii=False)
+            self._vocabulary_digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return self._vocabulary_digest
+
+    def count_vector(self, tokens):
+        """将分好词的文本转换为词表上的词频行向量"""
+        counts = {}
+        for token in tokens:
+            col = self.vocabulary.get(token)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return sp.csr_matrix((values, (np.zeros(len(cols), dtype=np.int32), cols)),
+                             shape=(1, len(self.idf)))
+
+    def transform(self, tokens):
+        """将分好词的查询转换为归一化的TF-IDF行向量"""
+        query_vec = self.count_vector(tokens)
+        query_vec.data *= self.idf[query_vec.indices]
+        norm = np.linalg.norm(query_vec.data)
+        if norm > 0:
+            query_vec.data /= norm
+        return query_vec
+
+    def bm25_transform(self, tokens):
+        """将分好词的新文档转换为BM25权重行向量，用于增量段"""
+        return bm25_weights(self.count_vector(tokens), self.bm25_idf, **self.bm25_params)
+
+    def query_vector(self, tokens, mode='tfidf'):
+        """按检索模式构造查询向量：TF-IDF为归一化向量，BM25为查询词频向量"""
+        if mode == 'bm25':
+            if self.bm25_matrix is None:
+                raise ValueError('索引快照中没有BM25矩阵，请重新运行 build_search_index')
+            return self.count_vector(tokens)
+        return self.transform(tokens)
+
+    def bm25_upper_bounds(self, queries):
+        """每个查询的BM25参考得分，用于把得分缩放到与余弦相似度阈值可比的范围
+
+        参考得分取平均长度的文档恰好包含每个查询词一次时的得分，即查询词IDF之和，
+        完全匹配的问题得分约为1，明显更短的文档可能略高于1。
+        """
+        bounds = np.asarray(queries.multiply(self.bm25_idf).sum(axis=1)).ravel()
+        return np.maximum(bounds, 1e-9)
+
+    def score(self, query_vec, mode='tfidf'):
+        """计算查询向量与每一行的相似度：一次稀疏矩阵与向量的乘积"""
+        if mode == 'bm25':
+            scores = (self.bm25_matrix @ query_vec.T).toarray().ravel()
+            return scores / self.bm25_upper_bounds(query_vec)[0]
+        return (self.matrix @ query_vec.T).toarray().ravel()
+
+    def rows_for(self, qa_ids):
+        """问答id -> 行号，返回 (行号数组, 对应的问答id数组)，不在索引中的id被丢弃"""
+        qa_ids = np.asarray(qa_ids, dtype=np.int64)
+        if len(self.row_ids) == 0 or len(qa_ids) == 0:
+            return np.empty(0, dtype=np.int64), qa_ids[:0]
+        if self._id_order is None:
+            self._id_order = np.argsort(self.row_ids, kind='stable')
+        sorted_ids = self.row_ids[self._id_order]
+        positions = np.minimum(np.searchsorted(sorted_ids, qa_ids), len(sorted_ids) - 1)
+        found = sorted_ids[positions] == qa_ids
+        return self._id_order[positions[found]], qa_ids[found]
+
+    def question(self, qa_id):
+        """从字符串池中取出问题原文，不在索引中或快照没有字符串池时返回None"""
+        if self.questions is None:
+            return None
+        rows, _ = self.rows_for([qa_id])
+        return self.questions[rows[0]] if len(rows) else None
+
+    def search(self, tokens, top_k=5, mode='tfidf'):
+        """返回最相似的 top_k 个问答id及相似度"""
+        query_vec = self.query_vector(tokens, mode)
+        if query_vec.nnz == 0:
+            return [], []
+        return top_k_results(self.score(query_vec, mode), self.row_ids, top_k)
+
+    def save(self, path):
+        """保存快照：先写入临时目录，再整体替换旧目录"""
+        write_snapshot(path, self._write)
+
+    def _write(self, tmp_path):
+        with open(tmp_path / self.VOCABULARY_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.vocabulary, f, ensure_ascii=False)
+        np.save(tmp_path / self.IDF_FILE, self.idf)
+        _save_csr(tmp_path, self.MATRIX_PREFIX, self.matrix)
+        np.save(tmp_path / self.ROW_IDS_FILE, self.row_ids)
+        if self.bm25_matrix is not None:
+            _save_csr(tmp_path, self.BM25_MATRIX_PREFIX, self.bm25_matrix)
+            np.save(tmp_path / self.BM25_IDF_FILE, self.bm25_idf)
+        if self.questions is not None:
+            self.questions.save(tmp_path)
+        with open(tmp_path / self.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'built_at': self.built_at.isoformat() if self.built_at else None,
+                'shape': list(self.matrix.shape),
+                'bm25': self.bm25_params,
+                'questions': self.questions is not None,
+                'lexicon': self.lexicon_version,
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        """从磁盘加载快照，大数组以只读内存映射的方式打开"""
+        path = Path(path)
+        with open(path / cls.META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if 'shape' not in meta:
+            raise FileNotFoundError(f'{path} 中是旧格式的索引快照，请重新运行 build_search_index')
+        with open(path / cls.VOCABULARY_FILE, 'r', encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        idf = np.load(path / cls.IDF_FILE)
+        matrix = _load_csr(path, cls.MATRIX_PREFIX, meta['shape'])
+        row_ids = np.load(path / cls.ROW_IDS_FILE, mmap_mode='r')
+        built_at = meta.get('built_at')
+        bm25_matrix = bm25_idf = None
+        if meta.get('bm25'):
+            bm25_matrix = _load_csr(path, cls.BM25_MATRIX_PREFIX, meta['shape'])
+            bm25_idf = np.load(path / cls.BM25_IDF_FILE)
+        index = cls(vocabulary, idf, matrix, row_ids,
+                    built_at=datetime.fromisoformat(built_at) if built_at else None,
+                    bm25_matrix=bm25_matrix, bm25_idf=bm25_idf,
+                    bm25_params=meta.get('bm25') if bm25_matrix is not None else None,
+                    questions=StringPool.load(path) if meta.get('questions') else None,
+                    lexicon_version=meta.get('lexicon'))
+        index.version = snapshot_version(path)
+        return index
+
+    def __len__(self):
+        return len(self.row_ids)
+
+
+def write_snapshot(path, write):
+    """调用 write(临时目录) 写出快照，再用临时目录整体替换 path"""
+    path = Path(path)
+    # 临时目录名带进程号，管理命令与后台合并同时保存时互不干扰
+    tmp_path = path.with_name(f'{path.name}.tmp{os.getpid()}')
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    write(tmp_path)
+
+    old_path = path.with_name(f'{path.name}.old{os.getpid()}')
+    shutil.rmtree(old_path, ignore_errors=True)
+    if path.exists():
+        path.rename(old_path)
+    tmp_path.rename(path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def snapshot_version(path):
+    """快照版本：meta.json 最后写入，用它的修改时间判断快照是否被替换，不存在时返回None"""
+    try:
+        return (Path(path) / TfidfIndex.META_FILE).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_lexicon_version(path):
+    """快照构建时医疗词典的版本，快照不存在或为旧快照时返回None"""
+    try:
+        with open(Path(path) / TfidfIndex.META_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('lexicon')
+    except FileNotFoundError:
+        return None
+
+
+# 进程级索引实例
+_tfidf_index = None
+_tfidf_index_lock = threading.Lock()
+
+
+def get_tfidf_index(processor, build=False):
+    """获取TF-IDF索引快照
+
+    快照不存在时，build 为True（管理命令和启动预热）则从数据库构建并保存快照，
+    否则抛出 FileNotFoundError：从数据库构建要读取全部问答，不能放在请求里做。
+    """
+    global _tfidf_index
+    if _tfidf_index is None:
+        with _tfidf_index_lock:
+            if _tfidf_index is None:
+                index_dir = Path(settings.SEARCH_INDEX_DIR)
+                try:
+                    _tfidf_index = TfidfIndex.load(index_dir)
+                    print(f"已加载TF-IDF索引快照，共 {len(_tfidf_index)} 条记录")
+                except FileNotFoundError:
+                    if not build:
+                        raise FileNotFoundError(f"TF-IDF索引快照不存在：{index_dir}，"
+                                                f"请运行 python manage.py build_search_index")
+                    print(f"TF-IDF索引快照不存在：{index_dir}，正在从数据库构建")
+                    index = TfidfIndex.build_from_database(processor, k1=settings.BM25_K1, b=settings.BM25_B)
+                    index.save(index_dir)
+                    # 重新以内存映射的方式加载，与其他进程共享页缓存
+                    _tfidf_index = TfidfIndex.load(index_dir)
+    return _tfidf_index
+
+
+def reload_tfidf_index():
+    """重新加载磁盘上的快照（增量合并后写入的新快照），替换进程级实例并返回"""
+    global _tfidf_index
+    index = TfidfIndex.load(Path(settings.SEARCH_INDEX_DIR))
+    with _tfidf_index_lock:
+        _tfidf_index = index
+    return index
@@ -0,0 +1,153 @@
+import heapq
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from django.conf import settings
+from .process_pool import pool_context
+from .search_index import TfidfIndex
+from .shard_worker import apply_shard_changes, load_shard, search_shard
+
+
+def shard_path(department):
+    """科室分片快照所在目录"""
+    return Path(settings.SEARCH_SHARDS_DIR) / department
+
+
+class ShardedSearcher:
+    """按科室分片的检索器
+
+    每个科室的TF-IDF快照由一个独立的工作进程加载并检索。查询会发往全部分片，
+    或只发往 departments 指定的分片，各分片的 top_k 结果按相似度合并。
+    工作进程启动时补上快照构建之后的变更，之后的变更由 apply_changes 转发，
+    与单机索引一样写入增量段。某个科室的快照被重新构建后，对应的工作进程会在
+    下一次查询时重启。
+    """
+
+    def __init__(self, departments, processor):
+        self.departments = list(departments)
+        self.processor = processor
+        self.executors = {}
+        # 科室 -> 工作进程启动时快照的修改时间
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def _snapshot_version(self, department):
+        try:
+            return (shard_path(department) / TfidfIndex.ROW_IDS_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _build(self, department):
+        index = TfidfIndex.build_from_database(self.processor, department=department,
+                                               k1=settings.BM25_K1, b=settings.BM25_B)
+        index.save(shard_path(department))
+
+    def build_missing(self):
+        """为快照不存在的科室从数据库构建分片，由启动预热调用，不在请求中执行"""
+        for department in self.departments:
+            if self._snapshot_version(department) is None:
+                print(f"科室分片快照不存在：{department}，正在从数据库构建")
+                self._build(department)
+
+    def rebuild(self):
+        """从数据库重建全部科室分片，由后台合并调用"""
+        for department in self.departments:
+            self._build(department)
+
+    def _get_executor(self, department):
+        """获取科室对应的工作进程，快照变化时重启，快照不存在时抛出 FileNotFoundError"""
+        with self.lock:
+            version = self._snapshot_version(department)
+            if version is None:
+                raise FileNotFoundError(f'科室分片快照不存在：{department}，'
+                                        f'请运行 python manage.py build_search_index --shards')
+            executor = self.executors.get(department)
+            if executor is not None and self.versions.get(department) == version:
+                return executor
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=pool_context(), initializer=load_shard,
+                                           initargs=(str(shard_path(department)), department))
+            self.executors[department] = executor
+            self.versions[department] = version
+            return executor
+
+    def search(self, tokens, top_k=5, departments=None, mode='tfidf'):
+        """分发到各分片检索并合并结果，返回问答id及相似度"""
+        targets = [d for d in (departments or self.departments) if d in self.departments]
+        futures = []
+        for department in targets:
+            try:
+                executor = self._get_executor(department)
+                futures.append((department, executor.submit(search_shard, tokens, top_k, mode)))
+            except BrokenProcessPool as e:
+                print(f"科室分片 {department} 的工作进程异常退出：{str(e)}")
+                self._discard(department)
+            except Exception as e:
+                print(f"科室分片 {department} 不可用：{str(e)}")
+
+        candidates = []
+        for department, future in futures:
+            try:
+                candidates.extend(future.result())
+            except BrokenProcessPool as e:
+                print(f"科室分片 {department} 的工作进程异常退出：{str(e)}")
+                self._discard(department)
+            except Exception as e:
+                print(f"分片检索时发生错误：{str(e)}")
+
+        merged = heapq.nlargest(top_k, candidates)
+        return [qa_id for _, qa_id in merged], [score for score, _ in merged]
+
+    def apply_changes(self, rows, removed_ids=()):
+        """把变更转发给已启动的各分片工作进程，rows 为 (id, 分词结果, 问题原文, 科室) 序列
+
+        每个分片只有一个工作进程，变更与查询按提交顺序执行。
+        """
+        removed_ids = list(removed_ids)
+        with self.lock:
+            for department, executor in self.executors.items():
+                try:
+                    executor.submit(apply_shard_changes, rows, removed_ids)
+                except Exception as e:
+                    print(f"向科室分片 {department} 转发变更时发生错误：{str(e)}")
+
+    def _discard(self, department):
+        """丢弃异常退出的工作进程，下次查询时重启"""
+        with self.lock:
+            executor = self.executors.pop(department, None)
+            self.versions.pop(department, None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self):
+        with self.lock:
+            for executor in self.executors.values():
+                executor.shutdown(wait=False)
+            self.executors.clear()
+            self.versions.clear()
+
+
+# 进程级检索器实例
+_shard_searcher = None
+_shard_searcher_lock = threading.Lock()
+
+
+def get_shard_searcher(processor):
+    """获取按科室分片的检索器"""
+    global _shard_searcher
+    if _shard_searcher is None:
+        with _shard_searcher_lock:
+            if _shard_searcher is None:
+                _shard_searcher = ShardedSearcher(processor.departments.values(), processor)
+    # 后台更新线程拉取其他进程的变更和删除并转发给各分片
+    from .live_index import start_index_updater
+    start_index_updater()
+    return _shard_searcher
+
+
+def forward_shard_changes(rows, removed_ids=()):
+    """把变更转发给本进程的分片工作进程，检索器尚未创建时忽略"""
+    if _shard_searcher is not None:
+        _shard_searcher.apply_changes(rows, removed_ids)
@@ -0,0 +1,50 @@
+"""按科室分片检索的工作进程端
+
+工作进程由 forkserver/spawn 启动（见 core/process_pool.py），任务函数从本模块反序列化，
+所以模块顶层不导入模型，初始化函数先完成 django.setup() 再加载分片。
+"""
+from .process_pool import setup_django
+
+# 工作进程内的分片索引（主索引 + 增量段）及其科室
+_shard_index = None
+_department = None
+
+
+def shard_changes(rows, removed_ids, department):
+    """把变更拆分到一个科室分片
+
+    rows 为 (id, 分词结果, 问题原文, 科室) 序列：本科室的记录写入增量段，
+    其他科室的记录（可能刚从本科室改到别的科室）在本分片中屏蔽。
+    """
+    own = [(qa_id, tokens, question) for qa_id, tokens, question, dept in rows if dept == department]
+    moved = [qa_id for qa_id, _, _, dept in rows if dept != department]
+    return own, list(removed_ids) + moved
+
+
+def load_shard(path, department):
+    """工作进程初始化：加载本进程负责的科室分片，补上快照构建之后的变更和删除"""
+    global _shard_index, _department
+    setup_django()
+    from .data_processor import get_data_processor
+    from .live_index import LiveTfidfIndex, changes_since, shard_token_rows
+    from .search_index import TfidfIndex
+    main = TfidfIndex.load(path)
+    _department = department
+    _shard_index = LiveTfidfIndex(main)
+    if main.built_at is not None:
+        rows, removed_ids = changes_since(main.built_at)
+        apply_shard_changes(shard_token_rows(rows, get_data_processor()), removed_ids)
+
+
+def apply_shard_changes(rows, removed_ids):
+    """写入父进程转发的变更，rows 的格式见 shard_changes"""
+    global _shard_index
+    _shard_index = _shard_index.with_changes(*shard_changes(rows, removed_ids, _department))
+
+
+def search_shard(tokens, top_k, mode):
+    """在工作进程内检索本分片，返回 (相似度, 问答id) 列表"""
+    if mode not in ('tfidf', 'bm25'):
+        mode = 'tfidf'
+    qa_ids, similarities = _shard_index.search(tokens, top_k=top_k, mode=mode)
+    return [(float(score), qa_id) for qa_id, score in zip(qa_ids, similarities)]
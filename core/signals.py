@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import MedicalQA, MedicalQADeletion
+
+
+@receiver(pre_save, sender=MedicalQA)
+def medical_qa_segment(sender, instance, update_fields=None, **kwargs):
+    """保存前重新分词并提取关键词，保证 tokens、keywords 与问题一致（bulk_create 不触发，由调用方填写）
+
+    后台编辑的问答也因此能被关键词召回，保存后几秒内即可检索到。
+    """
+    if update_fields is None or 'question' in update_fields:
+        from .annotation import annotate
+        from .data_processor import get_data_processor
+        processor = get_data_processor()
+        annotation = annotate(instance.question)
+        instance.tokens = processor.join_tokens(processor.process_text(instance.question, annotation))
+        instance.keywords = ','.join(processor.extract_keywords(instance.question, annotation=annotation))
+
+
+@receiver(pre_save, sender=MedicalQA)
+def medical_qa_store_answer(sender, instance, **kwargs):
+    """保存前把新赋值的答案写入答案表"""
+    from .answer_store import attach_answers
+    attach_answers([instance])
+
+
+@receiver(post_save, sender=MedicalQA)
+def medical_qa_saved(sender, instance, **kwargs):
+    """问答保存后写入检索索引的增量段"""
+    from .live_index import notify_changed
+    transaction.on_commit(lambda: notify_changed(instance))
+
+
+@receiver(post_delete, sender=MedicalQA)
+def medical_qa_deleted(sender, instance, **kwargs):
+    """问答删除后从检索索引中屏蔽，并写入删除记录供其他进程拉取"""
+    from .live_index import notify_deleted
+    qa_id = instance.id
+    MedicalQADeletion.objects.create(qa_id=qa_id)
+    transaction.on_commit(lambda: notify_deleted(qa_id))
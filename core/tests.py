@@ -1,3 +1,972 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+from pathlib import Path
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from .annotation import Annotation, annotate
+from .answer_cache import AnswerCache, get_answer_cache, normalize_question
+from .answer_store import fetch_answers
+from .data_processor import DataProcessor, get_data_processor
+from .dedup import MinHashDeduplicator
+from .entity_matcher import EntityMatcher
+from .keyword_index import KeywordIndex
+from .lexicon import get_lexicon, refresh_lexicon
+from . import ann_index, bulk_annotation, keyword_index, live_index, search_index, shard_worker, warmup
+from .live_index import IndexUpdater, suspend_index_updater
+from . import pinned_answers
+from .entity_index import index_document
+from .models import AnswerText, Document, MedicalQA, PinnedAnswer
+from .nlp_cache import NlpCache, get_nlp_cache
+from . import retrieval
+from .search_index import TfidfIndex, snapshot_lexicon_version, top_k_results
+from .shard_search import ShardedSearcher, shard_path
 
-# Create your tests here.
+# 只允许在用到它们的视图或命令内导入的重型库
+HEAVY_MODULES = ('torch', 'torchvision', 'matplotlib', 'wordcloud', 'pandas', 'sklearn', 'PIL')
+
+# 在新进程中加载URL配置（导入全部视图），输出此时已导入的重型库
+IMPORT_CHECK = f"""
+import json, sys
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))
+"""
+
+# 管理命令生成的数据文件，测试时移到临时目录下，保持彼此的相对位置
+ARTIFACT_SETTINGS = ('SEARCH_INDEX_DIR', 'SEARCH_SHARDS_DIR', 'ANN_INDEX_DIR', 'NLP_DATA_DIR', 'KEYWORD_IDF_FILE',
+                     'LEXICON_SNAPSHOT')
+
+SAMPLE_QUESTIONS = [
+    ('头痛发烧怎么办', '建议多喝水，体温超过38.5度时服用退烧药'),
+    ('孩子咳嗽有痰吃什么药', '可以服用止咳化痰的药物，症状加重请就医'),
+    ('高血压患者饮食注意什么', '少盐少油，多吃蔬菜水果，按时服用降压药'),
+    ('糖尿病可以吃水果吗', '血糖控制稳定时可以适量吃低糖水果'),
+    ('胃痛拉肚子是什么原因', '可能是急性胃肠炎，注意饮食卫生'),
+    ('失眠多梦怎么调理', '规律作息，睡前避免使用手机'),
+]
+
+
+class ImportBudgetTests(SimpleTestCase):
+    def test_urlconf_does_not_import_heavy_modules(self):
+        """管理命令和工作进程启动时不应导入 torch、sklearn、pandas、matplotlib 等库"""
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '--no-imports', '-c', IMPORT_CHECK],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        leaked = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(leaked, [], f'加载URL配置时导入了重型库：{", ".join(leaked)}')
+
+
+class ArtifactTestCase(TestCase):
+    """把生成的数据文件放到临时目录，并写入几条示例问答"""
+
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        paths = {name: Path(getattr(settings, name)) for name in ARTIFACT_SETTINGS}
+        common = Path(os.path.commonpath(list(paths.values())))
+        overrides = {name: root / path.relative_to(common) for name, path in paths.items()}
+        override = override_settings(**overrides)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        for question, answer in SAMPLE_QUESTIONS:
+            MedicalQA.objects.create(title=question, question=question, answer=answer,
+                                     keywords='', department='内科')
+
+
+class ArtifactLayoutTests(ArtifactTestCase):
+    """重建检索索引时整个快照目录会被替换，其他命令生成的数据文件不能放在里面"""
+
+    def test_build_search_index_keeps_other_artifacts(self):
+        out = StringIO()
+        call_command('build_idf_table', stdout=out)
+        call_command('compile_lexicon', stdout=out)
+        call_command('build_search_index', '--ann', stdout=out)
+        call_command('build_search_index', stdout=out)
+
+        self.assertTrue(Path(settings.KEYWORD_IDF_FILE).exists(), out.getvalue())
+        self.assertTrue(Path(settings.LEXICON_SNAPSHOT).exists(), out.getvalue())
+        self.assertTrue((Path(settings.ANN_INDEX_DIR) / 'meta.json').exists(), out.getvalue())
+        self.assertTrue((Path(settings.SEARCH_INDEX_DIR) / 'meta.json').exists(), out.getvalue())
+
+
+@override_settings(QUERY_LOG_ENABLED=False, SEARCH_SHARDED=False)
+class RetrievalTestCase(ArtifactTestCase):
+    """在临时目录中构建检索索引，各进程级索引从新快照加载，不启动后台更新线程"""
+
+    build_options = ()
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(suspend_index_updater())
+        for module, name in [(live_index, '_live_index'), (search_index, '_tfidf_index'),
+                             (keyword_index, '_keyword_index'), (ann_index, '_ann_index'),
+                             (ann_index, '_ann_version'), (pinned_answers, '_pinned'),
+                             (pinned_answers, '_pinned_version')]:
+            self.enterContext(mock.patch.object(module, name, None))
+        get_answer_cache().clear()
+        self.addCleanup(get_answer_cache().clear)
+        call_command('build_search_index', *self.build_options, stdout=StringIO())
+        self.processor = get_data_processor()
+        self.qa_ids = dict(MedicalQA.objects.values_list('question', 'id'))
+
+    def find(self, question, **kwargs):
+        annotation = annotate(question)
+        return retrieval.find_answer(self.processor, self.processor.process_text(question, annotation),
+                                     self.processor.extract_keywords(question, topK=5, annotation=annotation),
+                                     **kwargs)
+
+
+class LexiconUpdateTests(ArtifactTestCase):
+    """医疗词典更新后，库中的分词结果、关键词和索引快照要跟上新词典"""
+
+    def setUp(self):
+        super().setUp()
+        words_file = Path(settings.NLP_DATA_DIR).parent / 'med_word.txt'
+        words_file.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(settings.LEXICON_WORDS_FILE, words_file)
+        override = override_settings(LEXICON_WORDS_FILE=words_file)
+        override.enable()
+        # 最后恢复原词典，新加的词从jieba中删除
+        self.addCleanup(refresh_lexicon)
+        self.addCleanup(override.disable)
+        self.words_file = words_file
+
+    def test_resegment_after_lexicon_update(self):
+        out = StringIO()
+        call_command('compile_lexicon', stdout=out)
+        refresh_lexicon()
+        call_command('build_search_index', stdout=out)
+        updater = IndexUpdater()
+        old_version = snapshot_lexicon_version(settings.SEARCH_INDEX_DIR)
+        self.assertEqual(old_version, get_lexicon().version)
+
+        with open(self.words_file, 'a', encoding='utf-8') as f:
+            f.write('\n孩子咳嗽有痰 100000 n\n')
+        get_answer_cache().set('key', 'answer')
+        # compile_lexicon 在命令进程中重新分词并重建快照，服务进程只换上新快照
+        call_command('compile_lexicon', stdout=out)
+        self.assertIsNone(get_answer_cache().get('key'))
+        updater.sync_lexicon()
+        self.assertEqual(updater.lexicon_versions, {get_lexicon().version})
+
+        new_version = get_lexicon().version
+        self.assertNotEqual(new_version, old_version)
+        self.assertEqual(snapshot_lexicon_version(settings.SEARCH_INDEX_DIR), new_version)
+        qa = MedicalQA.objects.get(question='孩子咳嗽有痰吃什么药')
+        self.assertIn('孩子咳嗽有痰', qa.tokens.split(' '))
+        self.assertIn('孩子咳嗽有痰', qa.keywords.split(','))
+
+
+class SegmentationTests(TestCase):
+    """入库保存的分词结果与查询时的分词结果必须一致，否则重排比较的是不同词表上的向量"""
+
+    QUESTIONS = [question for question, _ in SAMPLE_QUESTIONS] + ['头晕恶心想吐']
+
+    def query_tokens(self, question):
+        processor = get_data_processor()
+        return processor.join_tokens(processor.process_text(question, annotate(question)))
+
+    def test_saved_tokens_match_query_tokens(self):
+        for question in self.QUESTIONS:
+            qa = MedicalQA.objects.create(title=question, question=question, answer='答案', department='内科')
+            qa.refresh_from_db()
+            self.assertEqual(qa.tokens, self.query_tokens(question), question)
+
+    def test_saved_question_gets_keywords(self):
+        """后台新建或编辑的问答没有填写关键词，保存时从问题中提取，关键词召回才能找到它"""
+        processor = get_data_processor()
+        question = '孩子咳嗽有痰吃什么药'
+        qa = MedicalQA.objects.create(title=question, question=question, answer='答案', department='内科')
+        qa.refresh_from_db()
+        keywords = processor.extract_keywords(question)
+        self.assertTrue(keywords)
+        self.assertEqual(qa.keywords, ','.join(keywords))
+        qa.question = '高血压患者饮食注意什么'
+        qa.save()
+        qa.refresh_from_db()
+        self.assertEqual(qa.keywords, ','.join(processor.extract_keywords(qa.question)))
+
+    def test_imported_and_resegmented_tokens_match_query_tokens(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        csv_path = root / 'questions.csv'
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('department,title,ask,answer\n')
+            f.writelines(f'内科,{question},{question},答案\n' for question in self.QUESTIONS)
+        processor = get_data_processor()
+        self.assertEqual(processor.process_csv_file(csv_path, '内科'), len(self.QUESTIONS))
+        for question, tokens in MedicalQA.objects.values_list('question', 'tokens'):
+            self.assertEqual(tokens, self.query_tokens(question), question)
+
+        MedicalQA.objects.update(tokens='')
+        list(processor.resegment(MedicalQA.objects.all()))
+        for question, tokens in MedicalQA.objects.values_list('question', 'tokens'):
+            self.assertEqual(tokens, self.query_tokens(question), question)
+
+    def test_index_build_reads_stored_tokens(self):
+        for question in self.QUESTIONS:
+            MedicalQA.objects.create(title=question, question=question, answer='答案', department='内科')
+        processor = get_data_processor()
+        with mock.patch.object(DataProcessor, 'process_text', side_effect=AssertionError('不应重新分词')):
+            index = TfidfIndex.build_from_database(processor)
+        self.assertEqual(len(index), len(self.QUESTIONS))
+
+        # 没有保存分词结果的旧数据现场分词
+        MedicalQA.objects.filter(question=self.QUESTIONS[0]).update(tokens='')
+        tokens = MedicalQA.objects.values_list('tokens', flat=True).get(question=self.QUESTIONS[0])
+        self.assertEqual(processor.stored_tokens(self.QUESTIONS[0], tokens),
+                         processor.process_text(self.QUESTIONS[0]))
+
+
+class MinHashTests(SimpleTestCase):
+    def test_collapse_keeps_first_occurrence(self):
+        texts = ['孩子咳嗽有痰吃什么药', '高血压患者饮食注意什么', '孩子咳嗽有痰吃什么药？',
+                 '孩子 咳嗽 有痰 吃什么药', '糖尿病可以吃水果吗']
+        self.assertEqual(MinHashDeduplicator(threshold=0.8).collapse(texts), ([0, 1, 4], [3, 1, 1], {}))
+
+    def test_threshold(self):
+        texts = ['孩子咳嗽有痰吃什么药', '孩子咳嗽有痰吃什么药好']
+        self.assertEqual(MinHashDeduplicator(threshold=0.6).collapse(texts)[0], [0])
+        self.assertEqual(MinHashDeduplicator(threshold=1.0).collapse(texts)[0], [0, 1])
+
+    def test_state_is_kept_across_calls(self):
+        deduplicator = MinHashDeduplicator(threshold=0.8)
+        deduplicator.collapse(['孩子咳嗽有痰吃什么药', '失眠多梦怎么调理'])
+        self.assertEqual(deduplicator.collapse(['失眠多梦怎么调理？', '头痛发烧怎么办', '头痛发烧怎么办']),
+                         ([1], [2], {'失眠多梦怎么调理': 1}))
+
+
+class DedupImportTests(TestCase):
+    def write_csv(self, path, questions):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('department,title,ask,answer\n')
+            f.writelines(f'内科,{question},{question},答案\n' for question in questions)
+
+    def test_near_duplicates_collapse_across_files_of_a_department(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.write_csv(root / 'IM_内科' / 'a.csv', ['孩子咳嗽有痰吃什么药', '高血压患者饮食注意什么'])
+        self.write_csv(root / 'IM_内科' / 'b.csv', ['孩子咳嗽有痰吃什么药？', '孩子咳嗽有痰吃什么药!', '失眠多梦怎么调理'])
+        self.write_csv(root / 'Pediatric_儿科' / 'a.csv', ['孩子咳嗽有痰吃什么药'])
+        processor = DataProcessor()
+        processor.data_dir = root
+
+        self.assertEqual(processor.process_all_data(dedup_threshold=0.8), 4)
+        counts = dict(MedicalQA.objects.filter(question='孩子咳嗽有痰吃什么药')
+                      .values_list('department', 'duplicate_count'))
+        self.assertEqual(counts, {'内科': 3, '儿科': 1})
+        self.assertEqual(processor.dedup_stats['rows_saved'], 2)
+
+
+class NlpCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.disk_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.disk_dir, ignore_errors=True)
+
+    def test_disk_entries_are_keyed_by_lexicon_version(self):
+        """重新编译词典并重启后，磁盘层不能返回按旧词典切分的结果"""
+        calls = []
+
+        def compute(text):
+            calls.append(text)
+            return [(text, 'n')]
+
+        NlpCache(1 << 20, disk_dir=self.disk_dir, disk_max_bytes=1 << 20).get('pos', '头痛', compute, 'v1')
+        # 新的缓存实例相当于重启后的进程，内存层为空
+        restarted = NlpCache(1 << 20, disk_dir=self.disk_dir, disk_max_bytes=1 << 20)
+        self.assertEqual(restarted.get('pos', '头痛', compute, 'v1'), [('头痛', 'n')])
+        self.assertEqual(restarted.disk_hits, 1)
+        restarted.get('pos', '头痛', compute, 'v2')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(restarted.misses, 1)
+
+    def test_entity_tags_are_cached(self):
+        text = '孩子发烧咳嗽，头痛得厉害'
+        annotate(text).entities
+        misses = get_nlp_cache().stats()['misses']
+        annotation = annotate(text)
+        self.assertEqual(annotation.entities, annotation._lexicon.matcher.tag(annotation.words))
+        self.assertEqual(get_nlp_cache().stats()['misses'], misses)
+
+
+class PinnedAnswerTests(TestCase):
+    def setUp(self):
+        # 每个测试从数据库重新加载固定答案表
+        self.enterContext(mock.patch.object(pinned_answers, '_pinned', None))
+        self.enterContext(mock.patch.object(pinned_answers, '_pinned_version', None))
+        self.qa = MedicalQA.objects.create(title='头痛发烧怎么办', question='头痛发烧怎么办',
+                                           answer='多喝水，注意休息', department='内科')
+        PinnedAnswer.objects.create(key='头痛 发烧', question='头痛发烧怎么办', qa=self.qa, hits=10)
+
+    def test_pinned_answer_follows_source_question(self):
+        self.assertEqual(pinned_answers.fetch_pinned_answers(['头痛 发烧', '咳嗽']),
+                         {'头痛 发烧': (self.qa.id, '多喝水，注意休息')})
+        # 来源问答的答案被修正后立即返回新答案
+        self.qa.answer = '体温超过38.5度时服用退烧药'
+        self.qa.save()
+        self.assertEqual(pinned_answers.fetch_pinned_answers(['头痛 发烧'])['头痛 发烧'][1],
+                         '体温超过38.5度时服用退烧药')
+
+    def test_deleted_source_question_is_not_served(self):
+        pinned_answers.get_pinned_answers()
+        self.qa.delete()
+        self.assertFalse(PinnedAnswer.objects.exists())
+        # 表刷新之前也不会返回已删除问答的答案
+        self.assertEqual(pinned_answers.fetch_pinned_answers(['头痛 发烧']), {})
+
+
+class AdminAnswerSearchTests(TestCase):
+    @override_settings(ANSWER_COMPRESSION=True, ANSWER_COMPRESS_MIN_BYTES=16)
+    def test_search_matches_compressed_answer_text(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        for question, answer in SAMPLE_QUESTIONS:
+            MedicalQA.objects.create(title=question, question=question, answer=answer * 4, department='内科')
+
+        response = self.client.get('/admin/core/medicalqa/', {'q': '止咳化痰'})
+        self.assertEqual([qa.question for qa in response.context['cl'].result_list], ['孩子咳嗽有痰吃什么药'])
+
+
+class KeywordIndexTests(SimpleTestCase):
+    def setUp(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.created = [now - timedelta(days=day) for day in range(4)]
+        # 按创建时间倒序
+        self.index = KeywordIndex().build([
+            (4, '咳嗽,发烧', self.created[0]),
+            (3, '咳嗽', self.created[1]),
+            (2, '咳嗽,发烧,头痛', self.created[2]),
+            (1, '头痛', self.created[3]),
+        ])
+
+    def test_recall_orders_by_hits_then_recency(self):
+        self.assertEqual(self.index.recall(['咳嗽', '发烧', '头痛']), [2, 4, 3, 1])
+        self.assertEqual(self.index.recall(['咳嗽']), [4, 3, 2])
+        self.assertEqual(self.index.recall(['咳嗽'], limit=2), [4, 3])
+        self.assertEqual(self.index.recall(['失眠']), [])
+
+    def test_posting_budget_keeps_newest_postings(self):
+        self.assertEqual(self.index.recall(['咳嗽'], posting_budget=2), [4, 3])
+
+    def test_changes_override_main_postings(self):
+        newest = self.created[0] + timedelta(days=1)
+        index = self.index.with_changes([(3, '失眠', self.created[1]), (5, '咳嗽,发烧', newest)], removed_ids=[2])
+        self.assertEqual(index.recall(['咳嗽', '发烧']), [5, 4])
+        self.assertEqual(index.recall(['失眠']), [3])
+        # 原索引不受影响
+        self.assertEqual(self.index.recall(['咳嗽', '发烧']), [4, 2, 3])
+
+
+class TfidfIndexTests(SimpleTestCase):
+    DOCUMENTS = [
+        ['头痛', '发烧', '怎么办'],
+        ['孩子', '咳嗽', '有痰', '吃', '什么', '药'],
+        ['高血压', '患者', '饮食', '注意'],
+        ['咳嗽', '发烧', '头痛'],
+        ['糖尿病', '吃', '水果'],
+    ]
+
+    def setUp(self):
+        self.index = TfidfIndex.fit(self.DOCUMENTS, [10, 20, 30, 40, 50],
+                                    questions=[''.join(tokens) for tokens in self.DOCUMENTS])
+
+    def test_search_matches_brute_force_cosine(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from .search_index import _identity_analyzer
+        vectorizer = TfidfVectorizer(analyzer=_identity_analyzer)
+        matrix = vectorizer.fit_transform(self.DOCUMENTS)
+        query = ['咳嗽', '发烧']
+        expected = (matrix @ vectorizer.transform([query]).T).toarray().ravel()
+
+        # 只比较得分非零的三条，得分为0的行之间没有确定的顺序
+        qa_ids, sims = self.index.search(query, top_k=3)
+        self.assertEqual(qa_ids, [[10, 20, 30, 40, 50][i] for i in np.argsort(-expected)[:3]])
+        np.testing.assert_allclose(sims, np.sort(expected)[::-1][:3])
+        self.assertEqual(self.index.search(['失眠'], top_k=5), ([], []))
+
+    def test_snapshot_round_trip(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.index.save(root / 'index')
+        loaded = TfidfIndex.load(root / 'index')
+
+        self.assertIsNotNone(loaded.version)
+        self.assertEqual(loaded.row_ids.tolist(), [10, 20, 30, 40, 50])
+        self.assertEqual(loaded.question(40), '咳嗽发烧头痛')
+        for mode in ('tfidf', 'bm25'):
+            expected_ids, expected_sims = self.index.search(['头痛', '发烧'], top_k=3, mode=mode)
+            qa_ids, sims = loaded.search(['头痛', '发烧'], top_k=3, mode=mode)
+            self.assertEqual(qa_ids, expected_ids)
+            np.testing.assert_allclose(sims, expected_sims)
+
+
+class RankingTests(SimpleTestCase):
+    def test_top_k_results_matches_full_sort(self):
+        rng = np.random.default_rng(0)
+        similarities = rng.random(1000)
+        row_ids = np.arange(1000, 2000)
+        for top_k in (1, 5, 1000, 2000):
+            qa_ids, sims = top_k_results(similarities, row_ids, top_k)
+            order = np.argsort(-similarities)[:top_k]
+            self.assertEqual(qa_ids, row_ids[order].tolist())
+            np.testing.assert_array_equal(sims, similarities[order])
+        self.assertEqual(top_k_results(similarities, row_ids, 0)[0], [])
+
+    def test_bm25_scores_match_reference_formula(self):
+        documents = TfidfIndexTests.DOCUMENTS
+        index = TfidfIndex.fit(documents, list(range(len(documents))), k1=1.5, b=0.75)
+        query = ['咳嗽', '发烧', '吃']
+
+        avgdl = sum(len(doc) for doc in documents) / len(documents)
+        def idf(term):
+            df = sum(term in doc for doc in documents)
+            return np.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        expected = np.array([
+            sum(idf(term) * doc.count(term) * 2.5 / (doc.count(term) + 1.5 * (0.25 + 0.75 * len(doc) / avgdl))
+                for term in query)
+            for doc in documents
+        ]) / sum(idf(term) for term in query)
+
+        scores = index.score(index.query_vector(query, mode='bm25'), mode='bm25')
+        np.testing.assert_allclose(scores, expected)
+
+
+class EntityMatcherTests(SimpleTestCase):
+    @staticmethod
+    def substring_scan(rules, word):
+        # 改造前逐类别 any(kw in word) 的做法
+        for type_name, rule in rules.items():
+            if any(kw in word for kw in rule['keywords']):
+                return type_name
+        return None
+
+    def test_matches_substring_scan(self):
+        # 关键词互相包含、跨类别重叠，检验失败链上的输出和类别优先级
+        rules = {
+            'disease': {'keywords': ['炎', '肺炎', '糖尿病']},
+            'symptom': {'keywords': ['咳嗽', '嗽', '发烧', '尿']},
+            'medicine': {'keywords': ['阿莫西林', '西林', '病毒灵']},
+        }
+        words = ['肺炎', '咳嗽', '尿频', '糖尿病', '阿莫西林', '青霉西林', '病毒灵', '发烧咳嗽', '头痛', '', '炎症']
+        matcher = EntityMatcher(rules)
+        self.assertEqual(matcher.tag(words), [self.substring_scan(rules, word) for word in words])
+
+    def test_matches_substring_scan_on_lexicon(self):
+        rules = get_lexicon().rules
+        matcher = EntityMatcher(rules)
+        text = ''.join(question + answer for question, answer in SAMPLE_QUESTIONS) + '慢性支气管炎引起的咳嗽发热和胸痛'
+        words = annotate(text).words + [keyword for rule in rules.values() for keyword in rule['keywords']]
+        self.assertEqual(matcher.tag(words), [self.substring_scan(rules, word) for word in words])
+
+
+@override_settings(SEARCH_SHARDED=False, SIMILAR_SEARCH_MODE='tfidf', RETRIEVAL_MIN_RERANK=20)
+class DeadlineTests(SimpleTestCase):
+    CANDIDATES = list(range(1, 101))
+
+    def setUp(self):
+        # 预计每个候选重排耗时1毫秒
+        patcher = mock.patch.dict(retrieval._stage_costs, {'recall': 0.0, 'rerank': 1.0}, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.live_index = mock.Mock()
+        self.live_index.rerank.side_effect = lambda tokens, qa_ids, top_k, mode: (qa_ids[:top_k], [1.0] * top_k)
+        for target, value in [('_live_index', self.live_index), ('_recall', self.CANDIDATES)]:
+            patcher = mock.patch.object(retrieval, target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reranked(self):
+        return self.live_index.rerank.call_args.args[1]
+
+    def test_unlimited_budget_reranks_all_candidates(self):
+        deadline = retrieval.Deadline()
+        retrieval.retrieve(None, ['咳嗽'], ['咳嗽'], deadline=deadline)
+        self.assertEqual(self.reranked(), self.CANDIDATES)
+        self.assertEqual(deadline.skipped, [])
+
+    def test_partial_budget_reranks_top_recalled_candidates(self):
+        deadline = retrieval.Deadline(50)
+        _, _, timings = retrieval.retrieve(None, ['咳嗽'], ['咳嗽'], deadline=deadline)
+        self.assertLessEqual(len(self.reranked()), 50)
+        self.assertGreaterEqual(len(self.reranked()), 20)
+        self.assertEqual(self.reranked(), self.CANDIDATES[:len(self.reranked())])
+        self.assertEqual(timings['reranked'], len(self.reranked()))
+        self.assertEqual(deadline.skipped, [])
+
+    def test_exhausted_budget_skips_rerank(self):
+        deadline = retrieval.Deadline(5)
+        qa_ids, _, _ = retrieval.retrieve(None, ['咳嗽'], ['咳嗽'], deadline=deadline)
+        self.assertEqual(self.reranked(), [1])
+        self.assertEqual(qa_ids, [1])
+        self.assertEqual(deadline.skipped, ['rerank'])
+        # 跳过后预计耗时衰减，之后的请求不会一直被跳过
+        self.assertEqual(retrieval.stage_cost('rerank'), 0.8)
+
+    def test_allows_skips_stage_over_budget(self):
+        deadline = retrieval.Deadline(10)
+        self.assertTrue(deadline.allows('pos_tagging', estimate_ms=1))
+        self.assertFalse(deadline.allows('entity_tagging', estimate_ms=1000))
+        self.assertEqual(deadline.skipped, ['entity_tagging'])
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def test_normalized_key_ignores_word_order_and_repeats(self):
+        self.assertEqual(normalize_question(['发烧', '头痛', '发烧', ' ']), normalize_question(['头痛', '发烧']))
+        self.assertNotEqual(normalize_question(['头痛', '发烧'], '内科'), normalize_question(['头痛', '发烧'], '儿科'))
+
+    def test_entries_expire_after_ttl(self):
+        cache = AnswerCache(max_size=10, ttl=60)
+        with mock.patch('core.answer_cache.time.monotonic', return_value=1000.0):
+            cache.set('key', 'answer')
+        with mock.patch('core.answer_cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(cache.get('key'), 'answer')
+        with mock.patch('core.answer_cache.time.monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = AnswerCache(max_size=2, ttl=60)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), ('1', None, '3'))
+
+
+@override_settings(SEARCH_SHARDED=False)
+class AnswerCacheInvalidationTests(TestCase):
+    def setUp(self):
+        # 模拟本进程已启动后台更新线程，保存和删除时直接写入增量段
+        for target, value in [('_updater', mock.Mock(processor=get_data_processor())), ('_live_index', None)]:
+            patcher = mock.patch.object(live_index, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = get_answer_cache()
+        self.addCleanup(self.cache.clear)
+
+    def test_save_and_delete_clear_cache(self):
+        self.cache.set('key', 'answer')
+        with self.captureOnCommitCallbacks(execute=True):
+            qa = MedicalQA.objects.create(title='头痛发烧', question='头痛发烧怎么办', answer='多喝水', department='内科')
+        self.assertIsNone(self.cache.get('key'))
+
+        self.cache.set('key', 'answer')
+        with self.captureOnCommitCallbacks(execute=True):
+            qa.delete()
+        self.assertIsNone(self.cache.get('key'))
+
+
+class TwoStageRetrievalTests(RetrievalTestCase):
+    def test_paraphrase_finds_source_question(self):
+        qa_id, similarity, timings = self.find('孩子咳嗽有痰应该吃什么药')
+        self.assertEqual(qa_id, self.qa_ids['孩子咳嗽有痰吃什么药'])
+        self.assertGreater(similarity, retrieval.SIMILARITY_THRESHOLD)
+        # 只有与问题共享关键词的候选参与重排
+        self.assertLess(timings['candidates'], len(SAMPLE_QUESTIONS))
+        self.assertEqual(timings['reranked'], timings['candidates'])
+
+    def test_question_without_recalled_candidates_has_no_answer(self):
+        qa_id, _, timings = self.find('骨折以后多久能拆石膏')
+        self.assertIsNone(qa_id)
+        self.assertEqual(timings['candidates'], 0)
+
+    def test_rerank_is_limited_to_recall_candidates(self):
+        with override_settings(RETRIEVAL_CANDIDATES=1):
+            _, _, timings = self.find('头痛发烧怎么办')
+        self.assertEqual((timings['candidates'], timings['reranked']), (1, 1))
+
+
+class AnnRecallTests(RetrievalTestCase):
+    build_options = ('--ann',)
+
+    @override_settings(SIMILAR_SEARCH_MODE='ann')
+    def test_ann_recall_feeds_rerank(self):
+        with mock.patch.object(keyword_index.KeywordIndex, 'recall', side_effect=AssertionError):
+            qa_id, _, timings = self.find('孩子咳嗽有痰应该吃什么药')
+        self.assertEqual(qa_id, self.qa_ids['孩子咳嗽有痰吃什么药'])
+        self.assertGreater(timings['candidates'], 0)
+
+
+class ChatBatchTests(RetrievalTestCase):
+    QUESTIONS = ['孩子咳嗽有痰应该吃什么药', '头痛发烧怎么办', '骨折以后多久能拆石膏', '你好']
+
+    def post(self, url, payload):
+        response = self.client.post(url, json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_batch_matches_single_questions(self):
+        singles = [self.post('/api/chat/', {'message': question})['response'] for question in self.QUESTIONS]
+        get_answer_cache().clear()
+        results = self.post('/api/chat/batch/', {'messages': self.QUESTIONS})['results']
+        self.assertEqual([result['response'] for result in results], singles)
+        self.assertEqual(results[0]['qa_id'], self.qa_ids['孩子咳嗽有痰吃什么药'])
+        self.assertEqual([result['source'] for result in results], ['retrieval', 'retrieval', None, None])
+
+    def test_repeated_batch_is_served_from_cache(self):
+        self.post('/api/chat/batch/', {'messages': self.QUESTIONS[:2]})
+        with mock.patch.object(retrieval, 'find_answers', side_effect=AssertionError):
+            results = self.post('/api/chat/batch/', {'messages': self.QUESTIONS[:2]})['results']
+        self.assertEqual([result['source'] for result in results], ['cache', 'cache'])
+
+    def test_rejects_empty_batch(self):
+        response = self.client.post('/api/chat/batch/', json.dumps({'messages': []}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DeltaIndexTests(RetrievalTestCase):
+    # 增量段沿用主索引的词表，新问题只用词表中已有的词
+    QUESTION = '糖尿病患者失眠怎么办'
+
+    def setUp(self):
+        super().setUp()
+        # 先加载索引，之后的变更写入增量段
+        self.find('头痛发烧怎么办')
+        self.updater = IndexUpdater()
+        self.enterContext(mock.patch.object(live_index, '_updater', self.updater))
+
+    def test_saved_and_deleted_questions_are_searchable_immediately(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            qa = MedicalQA.objects.create(title=self.QUESTION, question=self.QUESTION, answer='规律作息，控制血糖',
+                                          department='内科')
+        self.assertEqual(self.find(self.QUESTION)[0], qa.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            qa.delete()
+        self.assertNotEqual(self.find(self.QUESTION)[0], qa.id)
+
+    def test_poll_picks_up_changes_from_other_processes(self):
+        # 其他进程写入的变更不经过本进程的信号，由后台线程拉取
+        qa = MedicalQA.objects.create(title=self.QUESTION, question=self.QUESTION, answer='规律作息，控制血糖',
+                                      department='内科')
+        self.assertNotEqual(self.find(self.QUESTION)[0], qa.id)
+        self.updater.poll()
+        self.assertEqual(self.find(self.QUESTION)[0], qa.id)
+
+    def test_merge_writes_changes_into_new_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            qa = MedicalQA.objects.create(title=self.QUESTION, question=self.QUESTION, answer='规律作息，控制血糖',
+                                          department='内科')
+            MedicalQA.objects.get(question='失眠多梦怎么调理').delete()
+        version = search_index.snapshot_version(settings.SEARCH_INDEX_DIR)
+        self.updater.merge()
+
+        self.assertNotEqual(search_index.snapshot_version(settings.SEARCH_INDEX_DIR), version)
+        merged = live_index.get_live_index(self.processor)
+        self.assertEqual((len(merged.delta_ids), len(merged.masked_ids)), (0, 0))
+        self.assertEqual(sorted(merged.main.row_ids.tolist()), sorted(MedicalQA.objects.values_list('id', flat=True)))
+        self.assertEqual(self.find(self.QUESTION)[0], qa.id)
+
+
+class SnapshotMmapTests(SimpleTestCase):
+    def test_snapshot_arrays_are_memory_mapped(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        documents = TfidfIndexTests.DOCUMENTS
+        TfidfIndex.fit(documents, range(len(documents)), questions=[''.join(d) for d in documents]).save(root / 'index')
+        index = TfidfIndex.load(root / 'index')
+
+        def mapped(array):
+            while array is not None and not isinstance(array, np.memmap):
+                array = array.base
+            return array is not None
+
+        for array in (index.row_ids, index.matrix.data, index.matrix.indices, index.matrix.indptr,
+                      index.bm25_matrix.data, index.questions.data, index.questions.offsets):
+            self.assertTrue(mapped(array))
+            self.assertFalse(array.flags.writeable)
+
+
+class CompactAnnotationTests(SimpleTestCase):
+    @staticmethod
+    def decode(text, compact):
+        """与 static/js/annotation.js 相同的解码：按词长切分原文，取回词性和实体类别"""
+        width = compact['length_width']
+        lengths = np.frombuffer(base64.b64decode(compact['lengths']), dtype=f'<u{width}')
+        tags = np.frombuffer(base64.b64decode(compact['tags']), dtype=np.uint8)
+        offsets = [0] + np.cumsum(lengths, dtype=np.int64).tolist()
+        pairs = [(text[offsets[i]:offsets[i + 1]], compact['tag_names'][tag]) for i, tag in enumerate(tags)]
+        entities = [None] * len(pairs)
+        for i, type_id in compact['entities']:
+            entities[i] = compact['entity_types'][type_id]
+        return pairs, entities
+
+    def test_round_trip(self):
+        text = '患者头痛发烧三天，服用阿莫西林后咳嗽减轻，既往有高血压和糖尿病史。'
+        annotation = annotate(text)
+        pairs, entities = self.decode(text, annotation.compact())
+        self.assertEqual(pairs, annotation.pairs)
+        self.assertEqual(entities, annotation.entities)
+        self.assertTrue(any(entities))
+        json.dumps(annotation.compact())
+
+    def test_length_width_grows_with_longest_word(self):
+        for length, width in [(255, 1), (256, 2), (70000, 4)]:
+            word = '咳' * length
+            annotation = Annotation(word + '。', [(word, 'n'), ('。', 'x')])
+            compact = annotation.compact()
+            self.assertEqual(compact['length_width'], width)
+            self.assertEqual(self.decode(annotation.text, compact)[0], annotation.pairs)
+
+    def test_empty_text(self):
+        compact = annotate('').compact()
+        self.assertEqual((compact['lengths'], compact['tags'], compact['entities']), ('', '', []))
+
+
+@override_settings(BULK_ANNOTATION_WORKERS=2, BULK_ANNOTATION_CHUNK_SIZE=2)
+class BulkAnnotationTests(SimpleTestCase):
+    TEXTS = ['头痛发烧怎么办', '孩子咳嗽有痰吃什么药', '高血压患者饮食注意什么', '糖尿病可以吃水果吗', '失眠多梦怎么调理']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 各测试共用一个进程池，工作进程只启动一次
+        cls.enterClassContext(mock.patch.object(bulk_annotation, '_pool', None))
+        cls.addClassCleanup(lambda: bulk_annotation._pool and bulk_annotation._pool.shutdown())
+
+    def post(self, name, content, **data):
+        return self.client.post('/api/annotate/bulk/', {'file': SimpleUploadedFile(name, content.encode('utf-8')), **data})
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+
+    def test_results_stream_in_input_order(self):
+        content = ''.join(json.dumps({'id': f'q{i}', 'text': text}, ensure_ascii=False) + '\n'
+                          for i, text in enumerate(self.TEXTS))
+        results = self.lines(self.post('texts.jsonl', content, top_k='3'))
+        self.assertEqual([result['id'] for result in results], [f'q{i}' for i in range(len(self.TEXTS))])
+        for text, result in zip(self.TEXTS, results):
+            annotation = annotate(text)
+            self.assertEqual(result['annotation'], annotation.compact())
+            self.assertEqual(result['keywords'], annotation.keywords(topK=3))
+
+    def test_csv_input(self):
+        content = 'id,content\n' + ''.join(f'{i},{text}\n' for i, text in enumerate(self.TEXTS[:3]))
+        results = self.lines(self.post('texts.csv', content))
+        self.assertEqual([result['id'] for result in results], ['0', '1', '2'])
+
+    def test_bad_input(self):
+        self.assertEqual(self.post('texts.csv', 'id,body\n1,头痛\n').status_code, 400)
+        self.assertEqual(self.post('texts.jsonl', '').status_code, 400)
+        # 中途格式错误时已读到的文本照常输出，最后一行说明错误
+        results = self.lines(self.post('texts.jsonl', '"头痛发烧"\n{not json}\n'))
+        self.assertEqual(results[0]['id'], 0)
+        self.assertIn('error', results[-1])
+
+
+class EntitySearchTests(TestCase):
+    TEXTS = {
+        'a': '患者有糖尿病，注射胰岛素控制血糖。',
+        'b': '高血压患者服用阿司匹林。',
+        'c': '糖尿病合并高血压，服用阿司匹林。',
+        'd': '患者咳嗽发烧。',
+    }
+
+    def setUp(self):
+        self.ids = {}
+        for title, text in self.TEXTS.items():
+            document = Document.objects.create(title=title, file_type='txt', content=text)
+            index_document(document, annotate(text))
+            self.ids[title] = document.id
+
+    def search(self, **params):
+        response = self.client.get('/api/documents/search/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return [result['title'] for result in data['results']], data
+
+    def test_boolean_terms(self):
+        self.assertEqual(self.search(all='糖尿病')[0], ['c', 'a'])
+        self.assertEqual(self.search(all=['糖尿病', '阿司匹林'])[0], ['c'])
+        self.assertEqual(self.search(all='糖尿病,阿司匹林')[0], ['c'])
+        self.assertEqual(self.search(any=['胰岛素', '咳嗽'])[0], ['d', 'a'])
+        self.assertEqual(self.search(all='阿司匹林', **{'not': '糖尿病'})[0], ['b'])
+        # 限定类别
+        self.assertEqual(self.search(all='medicine:阿司匹林')[0], ['c', 'b'])
+        self.assertEqual(self.search(all='symptom:阿司匹林')[0], [])
+
+    def test_matches_report_positions(self):
+        _, data = self.search(all='阿司匹林', any='高血压')
+        matches = sorted(data['results'][0]['matches'], key=lambda match: match['surface'])
+        self.assertEqual(matches, [
+            {'entity_type': 'medicine', 'surface': '阿司匹林', 'positions': [11]},
+            {'entity_type': 'disease', 'surface': '高血压', 'positions': [5]},
+        ])
+
+    def test_keyset_pagination(self):
+        titles, data = self.search(any=['糖尿病', '阿司匹林'], limit=2)
+        self.assertEqual(titles, ['c', 'b'])
+        self.assertEqual(data['next_after'], self.ids['b'])
+        titles, data = self.search(any=['糖尿病', '阿司匹林'], limit=2, after=data['next_after'])
+        self.assertEqual(titles, ['a'])
+        self.assertIsNone(data['next_after'])
+
+    def test_invalid_queries(self):
+        self.assertEqual(self.client.get('/api/documents/search/', {'not': '糖尿病'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/documents/search/', {'all': '糖尿病', 'limit': 'x'}).status_code, 400)
+
+    def test_reindexing_replaces_postings(self):
+        document = Document.objects.get(id=self.ids['a'])
+        index_document(document, annotate('患者咳嗽。'))
+        self.assertEqual(self.search(all='糖尿病')[0], ['c'])
+        self.assertEqual(self.search(all='咳嗽')[0], ['d', 'a'])
+
+
+class ReadinessTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(warmup, '_status', {'state': 'pending', 'steps': {}, 'elapsed_ms': None}))
+        self.retry = self.enterContext(mock.patch('core.views.status.retry_warm_up_in_background'))
+
+    def ready(self):
+        response = self.client.get('/api/ready/')
+        return response.status_code, response.json()
+
+    def steps(self, fail=None, required=True):
+        def load(name):
+            def step():
+                if name == fail:
+                    raise RuntimeError(f'{name} 加载失败')
+            return step
+        return mock.patch.object(warmup, 'STEPS', [('lexicon', load('lexicon'), True),
+                                                   ('pinned_answers', load('pinned_answers'), required)])
+
+    @override_settings(WARMUP_ON_STARTUP=False)
+    def test_disabled_warm_up_is_ready(self):
+        self.assertEqual(self.ready()[1]['state'], 'disabled')
+        self.assertEqual(self.ready()[0], 200)
+
+    @override_settings(WARMUP_ON_STARTUP=True)
+    def test_not_ready_until_warmed_up(self):
+        self.assertEqual(self.ready()[0], 503)
+        with self.steps():
+            self.assertTrue(warmup.warm_up())
+        status, data = self.ready()
+        self.assertEqual((status, data['state']), (200, 'ready'))
+        self.assertEqual(set(data['steps']), {'lexicon', 'pinned_answers'})
+        self.retry.assert_not_called()
+
+    @override_settings(WARMUP_ON_STARTUP=True)
+    def test_optional_step_failure_is_still_ready(self):
+        with self.steps(fail='pinned_answers', required=False):
+            self.assertTrue(warmup.warm_up())
+        status, data = self.ready()
+        self.assertEqual(status, 200)
+        self.assertFalse(data['steps']['pinned_answers']['ok'])
+
+    @override_settings(WARMUP_ON_STARTUP=True)
+    def test_required_step_failure_retries_in_background(self):
+        with self.steps(fail='lexicon'):
+            self.assertFalse(warmup.warm_up())
+        status, data = self.ready()
+        self.assertEqual((status, data['state']), (503, 'failed'))
+        self.assertIn('lexicon 加载失败', data['steps']['lexicon']['error'])
+        self.retry.assert_called_once()
+
+
+@override_settings(ANSWER_COMPRESSION=True, ANSWER_COMPRESS_MIN_BYTES=64)
+class AnswerStoreTests(TestCase):
+    LONG_ANSWER = '建议多喝水，注意休息，体温超过38.5度时服用退烧药。' * 10
+
+    def create(self, question, answer):
+        return MedicalQA.objects.create(title=question, question=question, answer=answer, department='内科')
+
+    def test_identical_answers_are_stored_once(self):
+        first = self.create('头痛发烧怎么办', self.LONG_ANSWER)
+        second = self.create('发烧头痛怎么处理', self.LONG_ANSWER)
+        self.create('失眠多梦怎么调理', '规律作息')
+        self.assertEqual(first.answer_ref_id, second.answer_ref_id)
+        self.assertEqual(AnswerText.objects.count(), 2)
+
+    def test_long_answers_are_compressed(self):
+        long_qa = self.create('头痛发烧怎么办', self.LONG_ANSWER)
+        short_qa = self.create('失眠多梦怎么调理', '规律作息')
+        stored = AnswerText.objects.get(digest=long_qa.answer_ref_id)
+        self.assertTrue(stored.compressed)
+        self.assertLess(len(bytes(stored.content)), len(self.LONG_ANSWER.encode('utf-8')))
+        self.assertFalse(AnswerText.objects.get(digest=short_qa.answer_ref_id).compressed)
+        self.assertEqual(fetch_answers([long_qa.id, short_qa.id]),
+                         {long_qa.id: self.LONG_ANSWER, short_qa.id: '规律作息'})
+        self.assertEqual(MedicalQA.objects.get(id=long_qa.id).answer, self.LONG_ANSWER)
+
+    def test_bulk_import_shares_answers(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        csv_path = root / 'questions.csv'
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('department,title,ask,answer\n')
+            f.writelines(f'内科,{question},{question},{self.LONG_ANSWER}\n' for question, _ in SAMPLE_QUESTIONS)
+        self.assertEqual(get_data_processor().process_csv_file(csv_path, '内科'), len(SAMPLE_QUESTIONS))
+        self.assertEqual(AnswerText.objects.count(), 1)
+        self.assertEqual(set(fetch_answers(MedicalQA.objects.values_list('id', flat=True)).values()),
+                         {self.LONG_ANSWER})
+
+
+class ShardWorkerTests(ArtifactTestCase):
+    """分片工作进程端的加载、检索和增量变更，在本进程内调用"""
+
+    def setUp(self):
+        super().setUp()
+        MedicalQA.objects.create(title='骨折', question='骨折以后多久能拆石膏', answer='一般需要6到8周', department='外科')
+        call_command('build_search_index', '--shards', '--department', '内科', '--department', '外科',
+                     stdout=StringIO())
+        for name in ('_shard_index', '_department'):
+            self.enterContext(mock.patch.object(shard_worker, name, None))
+        self.qa_ids = dict(MedicalQA.objects.values_list('question', 'id'))
+
+    def search(self, question):
+        processor = get_data_processor()
+        return shard_worker.search_shard(processor.process_text(question), 3, 'tfidf')
+
+    def test_shard_only_contains_its_department(self):
+        shard_worker.load_shard(str(shard_path('内科')), '内科')
+        self.assertEqual(self.search('孩子咳嗽有痰吃什么药')[0][1], self.qa_ids['孩子咳嗽有痰吃什么药'])
+        self.assertNotIn(self.qa_ids['骨折以后多久能拆石膏'], [qa_id for _, qa_id in self.search('骨折多久拆石膏')])
+
+    def test_question_moved_to_other_department_is_masked(self):
+        shard_worker.load_shard(str(shard_path('内科')), '内科')
+        qa_id = self.qa_ids['孩子咳嗽有痰吃什么药']
+        shard_worker.apply_shard_changes([(qa_id, ['孩子', '咳嗽'], '孩子咳嗽有痰吃什么药', '儿科')], [])
+        self.assertNotIn(qa_id, [found for _, found in self.search('孩子咳嗽有痰吃什么药')])
+
+
+class ShardedSearcherTests(SimpleTestCase):
+    """各分片的结果按相似度合并，单个分片失败不影响其他分片"""
+
+    RESULTS = {'内科': [(0.9, 1), (0.4, 2)], '外科': [(0.7, 3)], '儿科': RuntimeError('分片不可用')}
+
+    def setUp(self):
+        self.searcher = ShardedSearcher(['内科', '外科', '儿科'], processor=None)
+
+        def executor(department):
+            future = Future()
+            result = self.RESULTS[department]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+            return mock.Mock(submit=mock.Mock(return_value=future))
+        self.enterContext(mock.patch.object(self.searcher, '_get_executor', side_effect=executor))
+
+    def test_results_are_merged_by_score(self):
+        self.assertEqual(self.searcher.search(['咳嗽'], top_k=2), ([1, 3], [0.9, 0.7]))
+
+    def test_departments_limit_the_shards_queried(self):
+        self.assertEqual(self.searcher.search(['咳嗽'], top_k=5, departments=['外科', '眼科']), ([3], [0.7]))
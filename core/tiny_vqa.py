@@ -5,7 +5,9 @@ import torchvision.transforms as transforms
 from torchvision.models import mobilenet_v2
 import re
 import os
+import threading
 from PIL import Image
+from django.conf import settings
 
 class MedicalVQAModel(nn.Module):
     """与RAD训练代码保持一致的模型定义"""
@@ -184,4 +186,28 @@ class VQAProcessor:
         if answer and not answer[0].isupper():
             answer = answer.capitalize()
             
-        return answer
\ No newline at end of file
+        return answer
+
+
+# 进程级VQA处理器
+_vqa_processor = None
+_vqa_processor_lock = threading.Lock()
+
+
+def get_vqa_processor():
+    """获取或初始化 VQA 处理器，并发的首次调用只加载一次模型；模型不可用时返回None"""
+    global _vqa_processor
+    if _vqa_processor is None:
+        with _vqa_processor_lock:
+            if _vqa_processor is None:
+                try:
+                    # 使用新的RAD模型路径
+                    model_path = os.path.join(settings.BASE_DIR, 'static/refs/rad_vqa_model.pth')
+                    if os.path.exists(model_path):
+                        _vqa_processor = VQAProcessor(model_path)
+                        print("RAD VQA模型初始化成功")
+                    else:
+                        print(f"RAD模型文件未找到: {model_path}")
+                except Exception as e:
+                    print(f"初始化RAD VQA处理器时出错: {e}")
+    return _vqa_processor
@@ -11,9 +11,15 @@ urlpatterns = [
     
     # API endpoints
     path('api/chat/', views.chat_api, name='chat_api'),
+    path('api/chat/batch/', views.chat_batch_api, name='chat_batch_api'),
+    path('api/ready/', views.readiness, name='readiness'),
+    path('api/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('api/nlp-cache-stats/', views.nlp_cache_stats, name='nlp_cache_stats'),
     path('api/visual_qa/', views.visual_qa_api, name='visual_qa_api'), 
     path('api/analyze-document/', views.analyze_document, name='analyze_document'),
     path('api/analyze-batch/', views.analyze_batch, name='analyze_batch'),
+    path('api/annotate/bulk/', views.annotate_bulk_api, name='annotate_bulk_api'),
     path('api/upload/', views.upload_file, name='upload_file'),
+    path('api/documents/search/', views.search_documents_api, name='search_documents_api'),
     path('api/download-results/', views.download_results, name='download_results'),
 ]
\ No newline at end of file
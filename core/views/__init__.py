@@ -0,0 +1,13 @@
+"""视图按功能拆分为多个模块
+
+torch、sklearn、pandas、matplotlib、wordcloud 等较重的库只在用到它们的视图函数内导入，
+加载URL配置、执行管理命令和启动工作进程时不需要导入它们（core/tests.py 中有导入检查）。
+"""
+from .pages import home, chat, document_analysis, about
+from .qa import chat_api, chat_batch_api
+from .status import cache_stats, nlp_cache_stats, readiness
+from .documents import (analyze_document, upload_file, search_documents_api, annotate_bulk_api,
+                        download_results)
+from .clustering import analyze_batch
+from .vqa import visual_qa_api
+from .evaluation import evaluate_qa, evaluate_vqa
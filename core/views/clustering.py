@@ -0,0 +1,270 @@
+import base64
+from io import BytesIO
+import numpy as np
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..nlp_cache import cut
+from .documents import analysis_results
+
+# pandas、sklearn、matplotlib和wordcloud只在聚类分析的请求中导入
+@csrf_exempt
+def analyze_batch(request):
+    """批量文本分析API接口 - 修复编码问题版本"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+
+    try:
+        import pandas as pd
+
+        file = request.FILES.get('file')
+        if not file:
+            return JsonResponse({'error': '未上传文件'}, status=400)
+
+        # 尝试多种编码格式读取CSV文件
+        def read_csv_with_encoding(file_obj):
+            # 常见的编码格式列表
+            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig', 'latin1', 'cp1252']
+            
+            for encoding in encodings:
+                try:
+                    # 重置文件指针
+                    file_obj.seek(0)
+                    # 读取文件内容并解码
+                    content = file_obj.read().decode(encoding)
+                    # 使用StringIO创建文件对象供pandas读取
+                    from io import StringIO
+                    return pd.read_csv(StringIO(content)), encoding
+                except (UnicodeDecodeError, UnicodeError):
+                    continue
+                except Exception as e:
+                    # 如果不是编码错误，记录但继续尝试下一个编码
+                    print(f"使用编码 {encoding} 读取失败: {str(e)}")
+                    continue
+            
+            # 如果所有编码都失败，抛出异常
+            raise ValueError("无法识别文件编码格式，请确保文件是有效的CSV文件")
+
+        # 读取数据集
+        try:
+            df, used_encoding = read_csv_with_encoding(file)
+            print(f"成功使用编码 {used_encoding} 读取文件")
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        # 检查是否包含content列
+        if 'content' not in df.columns:
+            available_columns = ', '.join(df.columns.tolist())
+            return JsonResponse({
+                'error': f'CSV文件必须包含content列。当前可用列: {available_columns}'
+            }, status=400)
+            
+        # 获取有效文本数据
+        texts = df['content'].dropna().astype(str).tolist()
+        if not texts:
+            return JsonResponse({'error': 'content列为空或没有有效数据'}, status=400)
+        
+        # 过滤掉空字符串和过短的文本
+        texts = [text.strip() for text in texts if text.strip() and len(text.strip()) > 5]
+        if not texts:
+            return JsonResponse({'error': 'content列中没有有效的文本数据（文本长度需大于5个字符）'}, status=400)
+
+        print(f"有效文本数量: {len(texts)}")
+
+        # 文本预处理和向量化
+        try:
+            # 使用jieba分词处理中文文本
+            processed_texts = []
+            for text in texts:
+                # 分词
+                words = cut(text)
+                processed_text = ' '.join(words)
+                processed_texts.append(processed_text)
+
+            # TF-IDF向量化
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            vectorizer = TfidfVectorizer(
+                max_features=min(1000, len(texts) * 10),  # 动态调整特征数量
+                stop_words=None,
+                min_df=1,  # 最小文档频率
+                max_df=0.95  # 最大文档频率
+            )
+            X = vectorizer.fit_transform(processed_texts)
+            
+            if X.shape[1] == 0:
+                return JsonResponse({'error': '文本向量化失败，可能是文本内容过于简单或重复'}, status=400)
+            
+            print(f"向量化完成，特征维度: {X.shape}")
+
+        except Exception as e:
+            return JsonResponse({'error': f'文本向量化失败: {str(e)}'}, status=500)
+
+        # t-SNE降维
+        try:
+            from sklearn.manifold import TSNE
+            # 根据数据量调整参数
+            n_samples = len(texts)
+            perplexity = min(30, max(5, n_samples // 3))  # 动态调整perplexity
+            
+            tsne = TSNE(
+                n_components=2, 
+                random_state=42, 
+                perplexity=perplexity,
+                n_iter=1000,
+                learning_rate='auto'
+            )
+            X_tsne = tsne.fit_transform(X.toarray())
+            print("t-SNE降维完成")
+        except Exception as e:
+            return JsonResponse({'error': f't-SNE降维失败: {str(e)}'}, status=500)
+
+        # 聚类分析
+        try:
+            from sklearn.cluster import KMeans
+            n_clusters = min(5, max(2, len(texts) // 10))  # 动态调整聚类数量
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+            clusters = kmeans.fit_predict(X.toarray())
+            print(f"聚类完成，聚类数量: {n_clusters}")
+        except Exception as e:
+            return JsonResponse({'error': f'聚类分析失败: {str(e)}'}, status=500)
+
+        # 生成t-SNE可视化
+        try:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            # 设置中文字体
+            plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
+            plt.rcParams['axes.unicode_minus'] = False
+            
+            plt.figure(figsize=(12, 8))
+            scatter = plt.scatter(
+                X_tsne[:, 0], X_tsne[:, 1], 
+                alpha=0.7, 
+                c=clusters, 
+                cmap='tab10',
+                s=50
+            )
+            plt.title('t-SNE Text Clustering Visualization', fontsize=16)
+            plt.xlabel('t-SNE Component 1')
+            plt.ylabel('t-SNE Component 2')
+            plt.colorbar(scatter, label='Cluster')
+            plt.grid(True, alpha=0.3)
+
+            # 保存t-SNE图像
+            tsne_buffer = BytesIO()
+            plt.savefig(tsne_buffer, format='png', dpi=300, bbox_inches='tight')
+            tsne_buffer.seek(0)
+            tsne_base64 = base64.b64encode(tsne_buffer.read()).decode('utf-8')
+            plt.close()
+            print("t-SNE可视化生成完成")
+        except Exception as e:
+            print(f"t-SNE可视化生成失败: {str(e)}")
+            tsne_base64 = None
+
+        # 生成词云图
+        try:
+            from wordcloud import WordCloud
+            
+            text_combined = ' '.join(processed_texts)
+            
+            # 加载背景图像
+            background_image = process_image_mask('static/refs/R-C.jpg')
+            # 定义字体路径变量
+            font_path = 'static/refs/simsun.ttc'
+            # 定义颜色列表
+            colors = ['#000000', '#FF0080', '#00FF80', '#8000FF', '#FF8000']  # 霓虹配色
+    
+            # 自定义颜色函数
+            def color_func(*args, **kwargs):
+                return colors[np.random.randint(0, len(colors))]
+
+            wordcloud = WordCloud(
+                width=800,  # 与mask尺寸保持一致
+                height=600,  # 与mask尺寸保持一致
+                background_color='white',
+                max_words=150,  # 减少词数，避免拥挤
+                prefer_horizontal=0.9,  # 调整水平偏好
+                color_func=color_func,  # 使用自定义颜色函数
+                font_path=font_path,
+                collocations=False,
+                mask=background_image,  # 使用处理后的mask
+                max_font_size=100,  # 限制最大字体大小
+                # min_font_size=10,  # 设置最小字体大小
+                relative_scaling=0.5,  # 调整字体大小的相对缩放
+                scale=2,  # 提高清晰度
+                margin=10  # 设置边距
+            ).generate(text_combined)
+        
+            # 保存词云图像
+            wordcloud_buffer = BytesIO()
+            wordcloud.to_image().save(wordcloud_buffer, format='PNG')
+            wordcloud_buffer.seek(0)
+            wordcloud_base64 = base64.b64encode(wordcloud_buffer.read()).decode('utf-8')
+            print("词云图生成完成")
+        except Exception as e:
+            print(f"词云图生成失败: {str(e)}")
+            wordcloud_base64 = None
+
+        # 保存聚类结果到全局变量
+        analysis_results['clustering_results'] = {
+            'dataset_name': file.name,
+            'total_texts': len(texts),
+            'n_clusters': n_clusters,
+            'tsne_coordinates': X_tsne.tolist(),
+            'cluster_labels': clusters.tolist(),
+            'texts': texts,
+            'tsne_image': tsne_base64,
+            'wordcloud_image': wordcloud_base64,
+            'encoding_used': used_encoding,
+            'created_at': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        # 准备返回结果
+        results = {}
+        if tsne_base64:
+            results['tsne'] = f'<img src="data:image/png;base64,{tsne_base64}" alt="t-SNE Visualization" style="max-width: 100%;">'
+        else:
+            results['tsne'] = '<div class="error">t-SNE可视化生成失败</div>'
+            
+        if wordcloud_base64:
+            results['wordcloud'] = f'<img src="data:image/png;base64,{wordcloud_base64}" alt="Word Cloud" style="max-width: 100%;">'
+        else:
+            results['wordcloud'] = '<div class="error">词云图生成失败</div>'
+
+        return JsonResponse({
+            'success': True,
+            'results': results,
+            'info': {
+                'total_texts': len(texts),
+                'n_clusters': n_clusters,
+                'encoding_used': used_encoding
+            }
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': f'批量分析失败: {str(e)}'}, status=500)
+
+def process_image_mask(image_path):
+        """处理图片作为mask"""
+        from PIL import Image
+
+        # 加载背景图像
+        background_image = Image.open(image_path)
+        
+        # 转换为灰度图
+        background_gray = background_image.convert('L')
+        
+        # 调整大小
+        background_gray = background_gray.resize((800, 600))
+        
+        # 转换为numpy数组
+        mask_array = np.array(background_gray)
+        
+        # 二值化处理：将图像转换为黑白两色
+        # 白色区域(值大的区域)用于放置文字，黑色区域(值小的区域)不放置文字
+        threshold = 128  # 阈值，可以调整
+        mask_array = np.where(mask_array > threshold, 255, 0).astype(np.uint8)
+        
+        return mask_array
@@ -0,0 +1,377 @@
+import base64
+import csv
+import itertools
+import os
+import zipfile
+from datetime import datetime
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..models import Document, SystemStats
+from ..annotation import annotate, annotation_legend
+from ..bulk_annotation import read_items, annotate_stream
+from ..entity_index import index_document, search_documents, matched_positions
+
+# 添加一个全局变量来存储分析结果
+analysis_results = {
+    'text_analysis': {},
+    'clustering_results': {},
+    'latest_document': None
+}
+
+@csrf_exempt
+def analyze_document(request):
+    """文档分析API接口"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+
+    try:
+        file = request.FILES.get('file')
+        if not file:
+            return JsonResponse({'error': '未上传文件'}, status=400)
+
+        # 读取文件内容
+        content = file.read().decode('utf-8')
+
+        # 创建文档记录
+        document = Document.objects.create(
+            title=file.name,
+            file_type='txt',  # 这里简化处理，假设都是文本文件
+            content=content
+        )
+
+        # 一次分词和词性标注，关键词和词性共用
+        annotation = annotate(content)
+        keywords = annotation.keywords(topK=10)
+        pos_tags = annotation.pos_plain()
+
+        # 更新文档分析结果
+        document.keywords = ','.join(keywords)
+        document.pos_tags = ' '.join(pos_tags[:100])  # 只保存前100个结果
+        document.save()
+
+        # 更新系统统计
+        stats = SystemStats.objects.first() or SystemStats.objects.create()
+        stats.doc_count += 1
+        stats.save()
+
+        return JsonResponse({
+            'success': True,
+            'results': {
+                'keywords': keywords,
+                'pos_tagging': pos_tags[:50],  # 只返回前50个结果
+            }
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def upload_file(request):
+    """文件上传API接口 - 修改版本"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+
+    try:
+        file = request.FILES.get('file')
+        if not file:
+            return JsonResponse({'error': '未上传文件'}, status=400)
+
+        # 读取文件内容
+        content = file.read().decode('utf-8')
+
+        # 创建文档记录
+        document = Document.objects.create(
+            title=file.name,
+            file_type=file.name.split('.')[-1].lower(),
+            content=content
+        )
+
+        # 一次分词和词性标注，关键词、词性、实体和摘要都复用这份结果
+        annotation = annotate(content)
+        keywords = annotation.keywords(topK=10)
+
+        # 词性标注和实体识别的紧凑结果，带颜色的HTML由前端按颜色表渲染
+        compact = annotation.compact()
+
+        # 生成文档摘要
+        summary = annotation.summary(keywords)
+
+        # 文本分析结果
+        text_analysis = {
+            'text': content,
+            'annotation': compact,
+            'legend': annotation_legend(),
+            'summary': summary
+        }
+
+        # 保存分析结果到全局变量
+        global analysis_results
+        analysis_results['text_analysis'] = {
+            'document_title': file.name,
+            'keywords': keywords,
+            'pos_tagging_plain': ' '.join(annotation.pos_plain()),
+            'named_entities_plain': ' '.join(annotation.entity_plain()),
+            'summary': summary,
+            'original_content': content,
+            'created_at': document.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        analysis_results['latest_document'] = document
+
+        # 更新数据库记录
+        document.keywords = ','.join(keywords)
+        document.annotation = compact
+        document.save()
+        # 实体写入倒排索引，供按实体检索文档
+        index_document(document, annotation)
+
+        # 更新系统统计
+        stats = SystemStats.objects.first() or SystemStats.objects.create()
+        stats.doc_count += 1
+        stats.save()
+
+        # 原文中的中文不转义为 \uXXXX，响应体积约减半
+        return JsonResponse({
+            'success': True,
+            'results': {
+                'text_analysis': text_analysis
+            }
+        }, json_dumps_params={'ensure_ascii': False})
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def search_documents_api(request):
+    """按实体检索已分析的文档
+
+    参数 all / any / not 为实体查询词（可重复或用逗号分隔，'类别:原文' 可限定类别），
+    after 为上一页返回的 next_after，limit 为每页条数。
+    """
+    def terms(name):
+        return [term for value in request.GET.getlist(name) for term in value.split(',') if term.strip()]
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+        after = request.GET.get('after')
+        after = int(after) if after else None
+    except ValueError:
+        return JsonResponse({'error': 'limit 和 after 必须是整数'}, status=400)
+
+    all_terms, any_terms = terms('all'), terms('any')
+    try:
+        documents, next_after = search_documents(all_terms, any_terms, terms('not'),
+                                                 after=after, limit=limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    matches = matched_positions(documents, all_terms + any_terms)
+    return JsonResponse({
+        'results': [{
+            'id': document.id,
+            'title': document.title,
+            'file_type': document.file_type,
+            'created_at': document.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'matches': matches.get(document.id, []),
+        } for document in documents],
+        'next_after': next_after,
+    }, json_dumps_params={'ensure_ascii': False})
+
+@csrf_exempt
+def annotate_bulk_api(request):
+    """批量标注API接口：上传JSONL或CSV文本，由进程池并行标注，按输入顺序以JSONL流式返回"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+
+    file = request.FILES.get('file')
+    if not file:
+        return JsonResponse({'error': '未上传文件'}, status=400)
+    fmt = request.POST.get('format') or ('csv' if file.name.lower().endswith('.csv') else 'jsonl')
+    if fmt not in ('jsonl', 'csv'):
+        return JsonResponse({'error': 'format 只支持 jsonl 或 csv'}, status=400)
+    try:
+        top_k = int(request.POST.get('top_k', 10))
+    except ValueError:
+        return JsonResponse({'error': 'top_k 必须是整数'}, status=400)
+
+    items = read_items(file, fmt)
+    # 先读第一条，表头或首行格式错误时直接返回400
+    try:
+        first = next(items, None)
+    except (ValueError, csv.Error) as e:
+        return JsonResponse({'error': f'输入格式错误：{str(e)}'}, status=400)
+    if first is None:
+        return JsonResponse({'error': '文件中没有文本'}, status=400)
+
+    return StreamingHttpResponse(annotate_stream(itertools.chain([first], items), top_k=top_k),
+                                 content_type='application/x-ndjson; charset=utf-8')
+
+@csrf_exempt
+def download_results(request):
+    """下载分析结果API接口"""
+    if request.method != 'GET':
+        return JsonResponse({'error': '只支持GET请求'}, status=405)
+
+    try:
+        global analysis_results
+        
+        # 检查是否有分析结果
+        if not analysis_results['text_analysis'] and not analysis_results['clustering_results']:
+            return JsonResponse({'error': '没有可下载的分析结果，请先进行文本分析或聚类分析'}, status=404)
+
+        # 创建临时文件 - 修复delete参数问题
+        import tempfile
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
+        temp_file.close()
+
+        # 创建ZIP文件
+        with zipfile.ZipFile(temp_file.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            
+            # 添加文本分析结果
+            if analysis_results['text_analysis']:
+                text_data = analysis_results['text_analysis']
+                
+                # 原始文档
+                if 'original_content' in text_data:
+                    zipf.writestr('text_analysis/original_document.txt', text_data['original_content'])
+                
+                # 关键词
+                if 'keywords' in text_data:
+                    keywords_content = '\n'.join(text_data['keywords'])
+                    zipf.writestr('text_analysis/keywords.txt', keywords_content)
+                
+                # 词性标注结果（纯文本版本）
+                if 'pos_tagging_plain' in text_data:
+                    zipf.writestr('text_analysis/pos_tagging.txt', text_data['pos_tagging_plain'])
+                
+                # 实体识别结果（纯文本版本）
+                if 'named_entities_plain' in text_data:
+                    zipf.writestr('text_analysis/named_entities.txt', text_data['named_entities_plain'])
+                
+                # 文档摘要
+                if 'summary' in text_data:
+                    zipf.writestr('text_analysis/summary.txt', text_data['summary'])
+                
+                # 分析报告
+                report_content = f"""文本分析报告
+================
+
+文档名称: {text_data.get('document_title', 'Unknown')}
+分析时间: {text_data.get('created_at', 'Unknown')}
+
+关键词数量: {len(text_data.get('keywords', []))}
+主要关键词: {', '.join(text_data.get('keywords', [])[:5])}
+
+文档摘要:
+{text_data.get('summary', '无摘要')}
+
+详细分析结果请查看其他文件。
+"""
+                zipf.writestr('text_analysis/analysis_report.txt', report_content)
+
+            # 添加聚类分析结果
+            if analysis_results['clustering_results']:
+                cluster_data = analysis_results['clustering_results']
+                
+                # 聚类结果统计
+                cluster_summary = f"""聚类分析报告
+================
+
+数据集名称: {cluster_data.get('dataset_name', 'Unknown')}
+分析时间: {cluster_data.get('created_at', 'Unknown')}
+文本总数: {cluster_data.get('total_texts', 0)}
+聚类数量: {cluster_data.get('n_clusters', 0)}
+
+聚类分布:
+"""
+                # 统计每个聚类的文本数量
+                cluster_labels = cluster_data.get('cluster_labels', [])
+                if cluster_labels:
+                    from collections import Counter
+                    cluster_counts = Counter(cluster_labels)
+                    for cluster_id, count in sorted(cluster_counts.items()):
+                        cluster_summary += f"聚类 {cluster_id}: {count} 个文本\n"
+                
+                zipf.writestr('clustering_analysis/clustering_report.txt', cluster_summary)
+                
+                # 详细聚类结果
+                if 'texts' in cluster_data and 'cluster_labels' in cluster_data:
+                    detailed_results = "详细聚类结果\n" + "="*50 + "\n\n"
+                    for i, (text, label) in enumerate(zip(cluster_data['texts'], cluster_data['cluster_labels'])):
+                        detailed_results += f"文本 {i+1} (聚类 {label}):\n{text[:200]}...\n\n"
+                    
+                    zipf.writestr('clustering_analysis/detailed_results.txt', detailed_results)
+                
+                # t-SNE坐标数据
+                if 'tsne_coordinates' in cluster_data:
+                    import json
+                    tsne_data = {
+                        'coordinates': cluster_data['tsne_coordinates'],
+                        'cluster_labels': cluster_data.get('cluster_labels', [])
+                    }
+                    zipf.writestr('clustering_analysis/tsne_coordinates.json', json.dumps(tsne_data, indent=2))
+                
+                # 保存图像文件
+                if 'tsne_image' in cluster_data:
+                    tsne_image_data = base64.b64decode(cluster_data['tsne_image'])
+                    zipf.writestr('clustering_analysis/tsne_visualization.png', tsne_image_data)
+                
+                if 'wordcloud_image' in cluster_data:
+                    wordcloud_image_data = base64.b64decode(cluster_data['wordcloud_image'])
+                    zipf.writestr('clustering_analysis/wordcloud.png', wordcloud_image_data)
+
+            # 添加README文件
+            readme_content = """分析结果包说明
+==================
+
+本压缩包包含以下分析结果：
+
+1. text_analysis/ - 文本分析结果
+   - original_document.txt: 原始文档内容
+   - keywords.txt: 提取的关键词
+   - pos_tagging.txt: 词性标注结果
+   - named_entities.txt: 命名实体识别结果
+   - summary.txt: 文档摘要
+   - analysis_report.txt: 分析报告
+
+2. clustering_analysis/ - 聚类分析结果
+   - clustering_report.txt: 聚类分析报告
+   - detailed_results.txt: 详细聚类结果
+   - tsne_coordinates.json: t-SNE降维坐标数据
+   - tsne_visualization.png: t-SNE可视化图像
+   - wordcloud.png: 词云图
+
+生成时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + """
+
+使用说明：
+- 所有文本文件使用UTF-8编码
+- JSON文件可以用于进一步的数据分析
+- PNG图像文件可以直接查看或用于报告
+"""
+            zipf.writestr('README.txt', readme_content)
+
+        # 读取文件内容并返回响应
+        with open(temp_file.name, 'rb') as f:
+            file_data = f.read()
+        
+        # 创建HTTP响应
+        response = HttpResponse(
+            file_data,
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = 'attachment; filename="analysis_results.zip"'
+        response['Content-Length'] = len(file_data)
+        
+        # 清理临时文件
+        try:
+            os.unlink(temp_file.name)
+        except:
+            pass
+        
+        return response
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': f'生成下载文件时发生错误: {str(e)}'}, status=500)
@@ -0,0 +1,29 @@
+from django.shortcuts import render
+from ..models import SystemStats
+
+def home(request):
+    """首页视图"""
+    stats = SystemStats.objects.first()
+    if not stats:
+        stats = SystemStats.objects.create()
+    
+    context = {
+        'qa_count': stats.qa_count,
+        'doc_count': stats.doc_count,
+        'accuracy': round(stats.accuracy, 2),
+        'vqa_accuracy': round(stats.vqa_accuracy, 2),
+        'overall_accuracy': round(stats.overall_accuracy, 2)
+    }
+    return render(request, 'home.html', context)
+
+def chat(request):
+    """聊天页面视图"""
+    return render(request, 'chat.html')
+
+def document_analysis(request):
+    """文档分析页面视图"""
+    return render(request, 'document_analysis.html')
+
+def about(request):
+    """关于页面视图"""
+    return render(request, 'about.html')
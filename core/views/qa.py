@@ -0,0 +1,229 @@
+import json
+import time
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..models import SystemStats
+from ..retrieval import answer_question, find_answers, Deadline, NO_ANSWER, TOO_FEW_KEYWORDS, record_stage_cost
+from ..answer_cache import get_answer_cache, normalize_question
+from ..data_processor import get_data_processor
+from ..pinned_answers import fetch_pinned_answers
+from ..answer_store import fetch_answers
+from ..query_log import log_query
+from ..annotation import annotate
+
+@csrf_exempt
+def chat_api(request):
+    """聊天API接口"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+
+    # 本次请求的时间预算，快用完时跳过耗时的阶段
+    deadline = Deadline(settings.CHAT_TIME_BUDGET_MS)
+    try:
+        data = json.loads(request.body)
+        question = data.get('message', '')
+        # 可选的科室提示，分片检索时只查询该科室
+        department = data.get('department')
+        
+        # 判断操作类型
+        op_type = 'normal'  # 默认为普通问答
+        if '词性标注' in question:
+            op_type = 'pos'
+            question = question.replace('词性标注：', '').strip()
+        elif '实体识别' in question:
+            op_type = 'entity'
+            question = question.replace('实体识别：', '').strip()
+        elif '文本摘要' in question:
+            op_type = 'summary'
+            question = question.replace('文本摘要：', '').strip()
+        elif '文本分析' in question:
+            op_type = 'analysis'
+            question = question.replace('文本分析：', '').strip()
+
+        # 共享的数据处理器（停用词表只加载一次）
+        processor = get_data_processor()
+
+        # 一次分词和词性标注，检索用的分词、关键词、词性、实体和摘要都复用这份结果
+        annotation = annotate(question)
+
+        # 普通问答先查固定答案表和答案缓存，命中时跳过关键词提取和检索
+        if op_type == 'normal':
+            # 对问题进行预处理（去停用词）
+            processed_text = processor.process_text(question, annotation)
+            cache_key = normalize_question(processed_text, department)
+            log_query(cache_key, question)
+            pinned = fetch_pinned_answers([cache_key]).get(cache_key)
+            cached_response = pinned[1] if pinned is not None else None
+            if cached_response is None:
+                cached_response = get_answer_cache().get(cache_key)
+            if cached_response is not None:
+                stats = SystemStats.objects.first() or SystemStats.objects.create()
+                stats.qa_count += 1
+                stats.save()
+                return JsonResponse({
+                    'response': cached_response,
+                    'results': {
+                        'op_type': op_type,
+                        'text_analysis': {}
+                    }
+                })
+
+        # 提取关键词（已去除停用词）
+        keywords = processor.extract_keywords(question, topK=5, annotation=annotation)
+
+        # 根据操作类型设置响应内容
+        response = ""
+        retrieval_timings = {}
+        if op_type == 'normal':
+            # 两阶段检索：关键词召回候选，再对候选按相似度重排
+            response, retrieval_timings = answer_question(
+                processor, processed_text, keywords,
+                departments=[department] if department else None, deadline=deadline)
+            # 预算不足降级得到的结果和兜底回复不缓存，下一次请求重新完整检索
+            if not deadline.skipped and response not in (NO_ANSWER, TOO_FEW_KEYWORDS):
+                get_answer_cache().set(cache_key, response)
+
+            # 更新系统统计数据
+            stats = SystemStats.objects.first() or SystemStats.objects.create()
+            stats.qa_count += 1
+            stats.save()
+
+        elif op_type == 'pos':
+            response = "词性标注已完成，请查看下方标注结果。"
+        elif op_type == 'entity':
+            response = "实体识别已完成，请查看下方识别结果。"
+        elif op_type == 'summary':
+            response = "文本摘要已生成，请查看下方摘要内容。"
+        elif op_type == 'analysis':
+            response = "文本分析已完成，请查看下方分析结果。"
+
+        # 根据操作类型返回不同的结果
+        text_analysis = {}
+        if op_type == 'pos':
+            # 只进行词性标注
+            text_analysis['pos_tagging'] = annotation.pos_html()
+        elif op_type == 'entity':
+            # 只进行实体识别
+            text_analysis['entity_tagging'] = annotation.entity_html()
+        elif op_type == 'summary':
+            # 只生成文本摘要
+            text_analysis['summary'] = annotation.summary(keywords)
+        elif op_type == 'analysis':
+            # 进行完整的文本分析，预算不足时跳过词性标注和实体识别的渲染
+            # 词性标注
+            if deadline.allows('pos_tagging'):
+                started = time.perf_counter()
+                text_analysis['pos_tagging'] = annotation.pos_html()
+                record_stage_cost('pos_tagging', (time.perf_counter() - started) * 1000)
+            
+            # 实体识别
+            if deadline.allows('entity_tagging'):
+                started = time.perf_counter()
+                text_analysis['entity_tagging'] = annotation.entity_html()
+                record_stage_cost('entity_tagging', (time.perf_counter() - started) * 1000)
+            
+            # 文本摘要
+            text_analysis['summary'] = annotation.summary(keywords)
+
+        return JsonResponse({
+            'response': response,
+            'results': {
+                'op_type': op_type,
+                'text_analysis': text_analysis,
+                'retrieval': retrieval_timings,
+                'skipped_stages': deadline.skipped
+            }
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def chat_batch_api(request):
+    """批量问答API接口：一次请求回答多个问题
+
+    每个问题与 chat_api 的普通问答相同：先查固定答案表和答案缓存，再按科室提示做两阶段检索。
+    未命中缓存的问题各自召回候选后一起重排（一次稀疏矩阵乘法），答案一次查询取回。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        questions = data.get('messages')
+        department = data.get('department')
+        if not isinstance(questions, list) or not questions:
+            return JsonResponse({'error': 'messages 必须是非空的问题列表'}, status=400)
+        if len(questions) > settings.CHAT_BATCH_MAX_QUESTIONS:
+            return JsonResponse({'error': f'单次最多提交 {settings.CHAT_BATCH_MAX_QUESTIONS} 个问题'}, status=400)
+
+        processor = get_data_processor()
+        answer_cache = get_answer_cache()
+        departments = [department] if department else None
+
+        results = []
+        cache_keys = []
+        items = []
+        for question in questions:
+            question = str(question)
+            annotation = annotate(question)
+            processed_text = processor.process_text(question, annotation)
+            cache_keys.append(normalize_question(processed_text, department))
+            items.append((question, annotation, processed_text))
+            results.append({'question': question, 'response': None, 'qa_id': None, 'score': None, 'source': None})
+        # 固定答案的正文一次查询取回
+        pinned_answers = fetch_pinned_answers(cache_keys)
+
+        # 需要检索的问题：(结果下标, 分词结果, 关键词)
+        pending = []
+        for i, (question, annotation, processed_text) in enumerate(items):
+            result = results[i]
+            log_query(cache_keys[i], question)
+            pinned = pinned_answers.get(cache_keys[i])
+            if pinned is not None:
+                result['qa_id'], result['response'] = pinned
+                result['source'] = 'pinned'
+                continue
+            cached_response = answer_cache.get(cache_keys[i])
+            if cached_response is not None:
+                result['response'] = cached_response
+                result['source'] = 'cache'
+                continue
+
+            keywords = processor.extract_keywords(question, topK=5, annotation=annotation)
+            if len(keywords) < 2:
+                result['response'] = TOO_FEW_KEYWORDS
+                continue
+
+            pending.append((i, processed_text, keywords))
+
+        found = find_answers(processor, [tokens for _, tokens, _ in pending],
+                             [keywords for _, _, keywords in pending], departments=departments)
+        for (i, _, _), (qa_id, score) in zip(pending, found):
+            if qa_id is not None:
+                results[i]['qa_id'] = qa_id
+                results[i]['score'] = round(score, 4)
+                results[i]['source'] = 'retrieval'
+
+        # 一次查询取回所有命中的答案，只缓存真正的答案
+        answers = fetch_answers(r['qa_id'] for r in results if r['qa_id'] is not None)
+        for i, result in enumerate(results):
+            if result['response'] is not None:
+                continue
+            answer = answers.get(result['qa_id'])
+            if answer:
+                result['response'] = answer
+                answer_cache.set(cache_keys[i], answer)
+            else:
+                result['response'] = NO_ANSWER
+
+        # 更新系统统计数据
+        stats = SystemStats.objects.first() or SystemStats.objects.create()
+        stats.qa_count += len(results)
+        stats.save()
+
+        return JsonResponse({'results': results})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
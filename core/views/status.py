@@ -0,0 +1,22 @@
+from django.http import JsonResponse
+from ..answer_cache import get_answer_cache
+from ..nlp_cache import get_nlp_cache
+from ..warmup import retry_warm_up_in_background, warmup_status
+
+def cache_stats(request):
+    """答案缓存命中统计"""
+    return JsonResponse(get_answer_cache().stats())
+
+def readiness(request):
+    """就绪检查：只报告预热状态，预热完成或未开启启动预热时返回200，否则返回503
+
+    预热失败时在后台线程中重试，检查本身立即返回。
+    """
+    status = warmup_status()
+    if status['state'] == 'failed':
+        retry_warm_up_in_background()
+    return JsonResponse(status, status=200 if status['state'] in ('ready', 'disabled') else 503)
+
+def nlp_cache_stats(request):
+    """分词结果缓存命中统计"""
+    return JsonResponse(get_nlp_cache().stats())
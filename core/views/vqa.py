@@ -0,0 +1,75 @@
+from io import BytesIO
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+#视觉问答
+@csrf_exempt
+def visual_qa_api(request):
+    """处理视觉问答请求"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST请求'}, status=405)
+    
+    try:
+        # 检查图片和问题是否提供
+        if 'image' not in request.FILES or 'question' not in request.POST:
+            return JsonResponse({
+                'success': False,
+                'error': '请提供图片和问题'
+            })
+        
+        image_file = request.FILES['image']
+        question = request.POST['question'].strip()
+        
+        if not question:
+            return JsonResponse({
+                'success': False,
+                'error': '问题不能为空'
+            })
+        
+        # 验证图片文件
+        if not image_file.content_type.startswith('image/'):
+            return JsonResponse({
+                'success': False,
+                'error': '请上传有效的图片文件'
+            })
+        
+        # 获取VQA处理器，torch和torchvision在首次调用时才导入
+        from ..tiny_vqa import get_vqa_processor
+        processor = get_vqa_processor()
+        if processor is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'VQA模型未加载，请检查模型文件'
+            })
+        
+        # 处理图片
+        try:
+            # 打开并预处理图片
+            from PIL import Image
+            image = Image.open(BytesIO(image_file.read())).convert('RGB')
+            
+            # 应用图片变换
+            image_tensor = processor.image_transform(image)
+            
+            # 从VQA模型获取答案
+            answer = processor.predict(image_tensor, question)
+            
+            return JsonResponse({
+                'success': True,
+                'answer': answer,
+                'question': question
+            })
+            
+        except Exception as e:
+            print(f"处理VQA请求时出错: {e}")
+            return JsonResponse({
+                'success': False,
+                'error': f'处理图片或问题时发生错误: {str(e)}'
+            })
+    
+    except Exception as e:
+        print(f"VQA API错误: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': '服务器内部错误，请稍后重试'
+        })
@@ -0,0 +1,139 @@
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+
+# 预热状态：pending 尚未开始，running 进行中，ready 完成，failed 有必需的步骤失败
+_status = {'state': 'pending', 'steps': {}, 'elapsed_ms': None}
+_warmup_lock = threading.Lock()
+
+
+def _load_lexicon():
+    # 加载词典时会初始化jieba的前缀词典并加入医学词汇
+    from .lexicon import get_lexicon
+    get_lexicon()
+    import jieba.posseg
+    jieba.posseg.dt.initialize()
+
+
+def _load_stopwords():
+    from .data_processor import get_data_processor
+    get_data_processor()
+
+
+def _load_keyword_idf():
+    from .idf_table import keyword_idf
+    keyword_idf()
+
+
+def _load_keyword_index():
+    from .keyword_index import get_keyword_index
+    get_keyword_index()
+
+
+def _load_search_index():
+    from .data_processor import get_data_processor
+    if settings.SEARCH_SHARDED:
+        # 分片索引由各自的工作进程加载，这里只补建缺失的分片快照
+        from .shard_search import get_shard_searcher
+        get_shard_searcher(get_data_processor()).build_missing()
+        return
+    from .live_index import get_live_index
+    # 快照不存在时在这里构建，请求中不再构建
+    get_live_index(get_data_processor(), build=True)
+
+
+def _load_pinned_answers():
+    from .pinned_answers import get_pinned_answers
+    get_pinned_answers()
+
+
+def _load_vqa_model():
+    from .tiny_vqa import get_vqa_processor
+    if get_vqa_processor() is None:
+        raise RuntimeError('VQA模型不可用')
+
+
+def _load_urls():
+    # 导入URL配置及视图模块，首个请求不再付出导入开销
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+
+# (步骤名, 加载函数, 是否必需)；非必需的步骤失败时仍视为就绪
+STEPS = [
+    ('lexicon', _load_lexicon, True),
+    ('stopwords', _load_stopwords, True),
+    ('keyword_idf', _load_keyword_idf, True),
+    ('keyword_index', _load_keyword_index, True),
+    ('search_index', _load_search_index, True),
+    ('pinned_answers', _load_pinned_answers, False),
+    ('vqa_model', _load_vqa_model, False),
+    ('urls', _load_urls, True),
+]
+
+
+def warm_up():
+    """依次加载jieba和医疗词典、停用词、检索索引、固定答案表、VQA模型和视图模块
+
+    在fork出工作进程之前调用时，这些只读数据由各工作进程以写时复制的方式共享。
+    多次调用只执行一次；另一个线程正在预热时立即返回。返回是否已就绪。
+    """
+    if not _warmup_lock.acquire(blocking=False):
+        return False
+    try:
+        if _status['state'] == 'ready':
+            return True
+        from .live_index import suspend_index_updater
+        _status['state'] = 'running'
+        started = time.perf_counter()
+        failed = False
+        with suspend_index_updater():
+            for name, load, required in STEPS:
+                if name == 'vqa_model' and not settings.WARMUP_VQA:
+                    continue
+                step_started = time.perf_counter()
+                try:
+                    load()
+                    _status['steps'][name] = {'ok': True}
+                except Exception as e:
+                    print(f"预热 {name} 时发生错误：{str(e)}")
+                    _status['steps'][name] = {'ok': False, 'error': str(e)}
+                    failed = failed or required
+                _status['steps'][name]['elapsed_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+        _status['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        _status['state'] = 'failed' if failed else 'ready'
+        print(f"预热完成，耗时 {_status['elapsed_ms']} ms，状态 {_status['state']}")
+        return not failed
+    finally:
+        # fork前关闭数据库连接，避免工作进程共用父进程的连接
+        connections.close_all()
+        _warmup_lock.release()
+
+
+def warmup_status():
+    state = _status['state']
+    if state == 'pending' and not settings.WARMUP_ON_STARTUP:
+        # 未开启启动预热，各项数据在首次使用时加载
+        state = 'disabled'
+    return {
+        'state': state,
+        'elapsed_ms': _status['elapsed_ms'],
+        'steps': {name: dict(step) for name, step in _status['steps'].items()},
+    }
+
+
+def warm_up_on_startup():
+    """由服务入口 medintellect/wsgi.py、asgi.py 在加载应用后调用
+
+    只有服务进程经过这里；管理命令、脚本以及其他导入Django的进程不会预热，
+    也不会在 AppConfig.ready 中访问数据库。
+    """
+    if settings.WARMUP_ON_STARTUP:
+        warm_up()
+
+
+def retry_warm_up_in_background():
+    """预热失败后在后台线程中重试，调用方（就绪检查）不等待"""
+    if _status['state'] == 'failed' and not _warmup_lock.locked():
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
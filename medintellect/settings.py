@@ -140,3 +140,88 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# 相似问题检索的TF-IDF索引快照目录（由 python manage.py build_search_index 生成）
+SEARCH_INDEX_DIR = BASE_DIR / 'search_index'
+
+# 分词相关的数据文件目录（关键词IDF表、医疗词典快照），与检索索引快照分开：索引快照保存时整个目录会被替换
+NLP_DATA_DIR = BASE_DIR / 'nlp_data'
+
+# 关键词提取用的语料IDF表（由 python manage.py build_idf_table 生成），不存在时使用 jieba 自带的通用IDF
+KEYWORD_IDF_FILE = NLP_DATA_DIR / 'keyword_idf.bin'
+
+# 相似问题检索模式：'tfidf' 为余弦相似度重排，'bm25' 为BM25重排，'ann' 为用LSA向量上的近似最近邻召回候选、余弦相似度重排
+SIMILAR_SEARCH_MODE = 'tfidf'
+# LSA降维后的维数
+ANN_COMPONENTS = 128
+# ANN检索时扫描的桶数，越大召回越高、延迟越大
+ANN_N_PROBE = 8
+# ANN索引快照目录（由 python manage.py build_search_index --ann 生成）
+ANN_INDEX_DIR = BASE_DIR / 'search_ann'
+
+# 是否按科室分片检索：每个科室的索引由独立的工作进程加载，查询并行分发后合并
+SEARCH_SHARDED = False
+# 科室分片快照目录（由 python manage.py build_search_index --shards 生成）
+SEARCH_SHARDS_DIR = BASE_DIR / 'search_shards'
+
+# 两阶段检索：关键词召回的候选数上限，以及每个关键词最多扫描的倒排记录数
+RETRIEVAL_CANDIDATES = 300
+RETRIEVAL_POSTING_BUDGET = 20000
+# 重排的候选数下限，剩余预算连这么多候选都重排不完时跳过重排
+RETRIEVAL_MIN_RERANK = 20
+
+# 问答请求的时间预算（毫秒），预算快用完时跳过或缩减相似度重排、完整的词性标注和实体识别
+CHAT_TIME_BUDGET_MS = 300
+
+# 增量索引：每隔多少秒拉取一次变更和删除的问答
+SEARCH_DELTA_POLL_SECONDS = 2
+# 增量段超过多少条、或存在超过多少秒后合并成新的主索引快照（写入 SEARCH_INDEX_DIR，各进程随后重新加载）
+SEARCH_DELTA_MERGE_ROWS = 1000
+SEARCH_DELTA_MERGE_SECONDS = 300
+
+# 答案缓存：最多缓存的问题数及过期秒数
+ANSWER_CACHE_SIZE = 10000
+ANSWER_CACHE_TTL = 600
+
+# 服务进程启动时（medintellect/wsgi.py、asgi.py）预热jieba、医疗词典、停用词、检索索引、固定答案表和VQA模型
+# （见 core/warmup.py），配合 gunicorn --preload 在fork工作进程之前完成，各进程共享这部分内存
+WARMUP_ON_STARTUP = True
+WARMUP_VQA = True
+
+# 医疗词典：实体类别文件、jieba用户词典，以及 python manage.py compile_lexicon 编译出的快照；
+# 工作进程每隔 LEXICON_CHECK_SECONDS 秒检查快照是否更新，更新后无需重启即生效
+LEXICON_RULES_FILE = BASE_DIR / 'static' / 'refs' / 'medical_entities.json'
+LEXICON_WORDS_FILE = BASE_DIR / 'static' / 'refs' / 'med_word.txt'
+LEXICON_SNAPSHOT = NLP_DATA_DIR / 'lexicon.pkl'
+LEXICON_CHECK_SECONDS = 5
+
+# 分词结果缓存：内存层的字节上限；NLP_CACHE_DIR 不为空时启用磁盘层，
+# 只有不短于 NLP_CACHE_DISK_MIN_CHARS 个字符的文本（如上传的文档）才写入磁盘
+NLP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+NLP_CACHE_DIR = None
+NLP_CACHE_DISK_MAX_BYTES = 1024 * 1024 * 1024
+NLP_CACHE_DISK_MIN_CHARS = 200
+
+# 查询日志：普通问答的归一化问题由后台线程批量追加到日志文件，供 pin_hot_queries 统计热门问题
+QUERY_LOG_ENABLED = True
+QUERY_LOG_FILE = BASE_DIR / 'logs' / 'queries.log'
+QUERY_LOG_FLUSH_SECONDS = 1
+# 等待写入的记录超过此数时丢弃新记录
+QUERY_LOG_MAX_PENDING = 10000
+# 每隔多少秒检查一次固定答案表是否更新
+PINNED_ANSWERS_REFRESH_SECONDS = 60
+
+# 答案表：是否用zlib压缩答案正文，以及参与压缩的最小字节数
+ANSWER_COMPRESSION = True
+ANSWER_COMPRESS_MIN_BYTES = 256
+
+# 批量问答接口单次最多接受的问题数
+CHAT_BATCH_MAX_QUESTIONS = 1000
+
+# 批量标注接口：进程池的进程数（None 表示CPU核数）和每次分发给一个进程的文本条数
+BULK_ANNOTATION_WORKERS = None
+BULK_ANNOTATION_CHUNK_SIZE = 64
+
+# BM25参数：k1 控制词频饱和速度，b 控制文档长度归一化强度（修改后需重新构建索引）
+BM25_K1 = 1.2
+BM25_B = 0.75
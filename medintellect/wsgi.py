@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medintellect.settings')
 
 application = get_wsgi_application()
+
+# 服务进程启动时预热（见 core/warmup.py），使用 --preload 启动的gunicorn在fork工作进程之前完成
+from core.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup()
@@ -0,0 +1,67 @@
+// 紧凑标注结果的渲染
+// 接口返回原文、词长、词性/实体编号和一份颜色表，在这里拼成带颜色的HTML
+
+function escapeHtml(text) {
+    return text
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+// 解码base64编码的小端整数数组
+function decodeIntArray(encoded, width) {
+    const binary = atob(encoded);
+    const view = new DataView(new ArrayBuffer(binary.length));
+    for (let i = 0; i < binary.length; i++) {
+        view.setUint8(i, binary.charCodeAt(i));
+    }
+    const values = new Array(binary.length / width);
+    for (let i = 0; i < values.length; i++) {
+        if (width === 1) {
+            values[i] = view.getUint8(i);
+        } else if (width === 2) {
+            values[i] = view.getUint16(i * 2, true);
+        } else {
+            values[i] = view.getUint32(i * 4, true);
+        }
+    }
+    return values;
+}
+
+// 按词长把原文切成词（按字符计，用 Array.from 处理代理对）
+function annotationWords(text, annotation) {
+    const chars = Array.from(text);
+    const lengths = decodeIntArray(annotation.lengths, annotation.length_width);
+    const words = [];
+    let start = 0;
+    for (const length of lengths) {
+        words.push(chars.slice(start, start + length).join(''));
+        start += length;
+    }
+    return words;
+}
+
+// 词性标注：按词性首字母取颜色
+function renderPosTagging(text, annotation, legend) {
+    const words = annotationWords(text, annotation);
+    const tags = decodeIntArray(annotation.tags, 1);
+    return words.map((word, i) => {
+        const flag = annotation.tag_names[tags[i]];
+        const color = legend.pos_colors[flag[0]] || '#212529';
+        return `<span style="color: ${color}" title="${flag}">${escapeHtml(word)}</span>`;
+    }).join(' ');
+}
+
+// 实体识别：实体词按类型着色，其余词原样输出
+function renderEntities(text, annotation, legend) {
+    const words = annotationWords(text, annotation);
+    const types = new Map(annotation.entities.map(([index, typeId]) => [index, annotation.entity_types[typeId]]));
+    return words.map((word, i) => {
+        const type = types.get(i);
+        if (!type) {
+            return escapeHtml(word);
+        }
+        return `<span style="color: ${legend.entity_colors[type]}" title="${type}">${escapeHtml(word)}</span>`;
+    }).join(' ');
+}
@@ -78,13 +78,15 @@ function displayAnalysisResults(results) {
     const textAnalysis = results.text_analysis || results;
     
     // 显示词性标注结果
-    if (textAnalysis.pos_tagging) {
-        document.querySelector('.pos-tagging-results .result-content').innerHTML = textAnalysis.pos_tagging;
+    if (textAnalysis.annotation) {
+        document.querySelector('.pos-tagging-results .result-content').innerHTML =
+            renderPosTagging(textAnalysis.text, textAnalysis.annotation, textAnalysis.legend);
     }
 
     // 显示实体识别结果
-    if (textAnalysis.named_entities) {
-        document.querySelector('.ner-results .result-content').innerHTML = textAnalysis.named_entities;
+    if (textAnalysis.annotation) {
+        document.querySelector('.ner-results .result-content').innerHTML =
+            renderEntities(textAnalysis.text, textAnalysis.annotation, textAnalysis.legend);
     }
 
     // 显示文档摘要
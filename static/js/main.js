@@ -310,16 +310,19 @@ function displayResults(results) {
 
     // 显示文本分析结果
     if (results.text_analysis) {
+        const textAnalysis = results.text_analysis;
+        const posTagging = renderPosTagging(textAnalysis.text, textAnalysis.annotation, textAnalysis.legend);
+        const namedEntities = renderEntities(textAnalysis.text, textAnalysis.annotation, textAnalysis.legend);
         resultsContainer.innerHTML = `
                 <div class="analysis-results">
                     <h3>文本分析结果</h3>
                     <div class="pos-tagging-results">
                         <h4>词性标注 <i class="fas fa-info-circle" title="名词-红色&#10;动词-绿色&#10;形容词-蓝色&#10;副词-黄色&#10;代词-紫色&#10;数词-棕色&#10;量词-灰色&#10;介词-棕色&#10;连词-灰色&#10;助词-深灰色&#10;标点-黑色"></i></h4>
-                        <div class="result-content">${results.text_analysis.pos_tagging}</div>
+                        <div class="result-content">${posTagging}</div>
                     </div>
                     <div class="named-entities-results">
                         <h4>实体识别 <i class="fas fa-info-circle" title="疾病-红色&#10;症状-绿色&#10;药品-蓝色&#10;器官-黄色&#10;治疗-紫色&#10;科室-棕色&#10;检查-灰色"></i></h4>
-                        <div class="result-content">${results.text_analysis.named_entities}</div>
+                        <div class="result-content">${namedEntities}</div>
                     </div>
                     <div class="summary-results">
                         <h4>文本摘要</h4>